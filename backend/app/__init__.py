@@ -13,6 +13,9 @@ def create_app():
     if app.debug or app.config.get("FLASK_DEBUG"):
         app.logger.setLevel(logging.DEBUG)
 
+    from app.services import metrics
+    metrics.set_enabled(app.config["METRICS_ENABLED"])
+
     # Allow cross-origin requests in development (frontend demo, Next.js, etc.)
     CORS(app)
 
@@ -21,11 +24,16 @@ def create_app():
     from app.routes.routing import routing_bp
     from app.routes.amenities import amenities_bp
     from app.routes.score import score_bp
+    from app.routes.metrics import metrics_bp
 
     app.register_blueprint(geocode_bp, url_prefix="/api/geocode")
     app.register_blueprint(routing_bp, url_prefix="/api/route")
     app.register_blueprint(amenities_bp, url_prefix="/api/amenities")
     app.register_blueprint(score_bp, url_prefix="/api/score")
+    app.register_blueprint(metrics_bp, url_prefix="/api")
+
+    from app.cli import register_cli
+    register_cli(app)
 
     @app.route("/api/health")
     def health():
@@ -0,0 +1,118 @@
+"""Flask CLI commands for offline data preparation (``flask --app run <command>``)."""
+
+import zipfile
+
+import click
+from flask import Flask, current_app
+
+
+def register_cli(app: Flask) -> None:
+    app.cli.add_command(build_poi_index_command)
+    app.cli.add_command(build_distance_fields_command)
+    app.cli.add_command(build_walk_graph_command)
+    app.cli.add_command(build_gtfs_timetable_command)
+    app.cli.add_command(build_stop_index_command)
+
+
+@click.command("build-poi-index")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", default=None, help="Defaults to POI_INDEX_PATH.")
+def build_poi_index_command(source: str, output: str | None) -> None:
+    """Index amenities and transit stops from an OSM extract (.pbf or Overpass .json)."""
+    from app.services.poi_index import build_poi_index
+
+    output = output or current_app.config["POI_INDEX_PATH"]
+    try:
+        index = build_poi_index(source, output)
+    except (RuntimeError, ValueError) as exc:
+        raise click.ClickException(str(exc)) from exc
+    click.echo(f"Indexed {len(index)} POIs into {output}")
+
+
+@click.command("build-distance-fields")
+@click.argument("name")
+@click.option("--bbox", required=True, help="south,west,north,east in degrees.")
+def build_distance_fields_command(name: str, bbox: str) -> None:
+    """Precompute nearest-amenity walking distances for region NAME (needs the POI index)."""
+    from app.services.distance_fields import build_distance_fields
+
+    try:
+        south, west, north, east = (float(v) for v in bbox.split(","))
+    except ValueError as exc:
+        raise click.BadParameter("expected four comma-separated numbers", param_hint="--bbox") from exc
+    try:
+        meta = build_distance_fields(name, (south, west, north, east))
+    except (RuntimeError, ValueError) as exc:
+        raise click.ClickException(str(exc)) from exc
+    rows, cols = meta["shape"]
+    click.echo(f"Built {len(meta['types'])} amenity fields on a {rows}x{cols} grid for {name}")
+
+
+@click.command("build-walk-graph")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", default=None, help="Defaults to WALK_GRAPH_PATH.")
+@click.option("--landmarks", default=8, show_default=True,
+              help="ALT landmarks to precompute (0 = plain A*).")
+def build_walk_graph_command(source: str, output: str | None, landmarks: int) -> None:
+    """Build the local pedestrian routing graph from an OSM extract (.pbf or Overpass .json)."""
+    from app.services.walk_graph import build_walk_graph
+
+    output = output or current_app.config["WALK_GRAPH_PATH"]
+    try:
+        graph = build_walk_graph(source, output, landmarks=landmarks)
+    except (RuntimeError, ValueError) as exc:
+        raise click.ClickException(str(exc)) from exc
+    click.echo(f"Built a {len(graph)}-node walking graph into {output}")
+    if landmarks:
+        coverage = graph.landmark_coverage()
+        click.echo(f"Landmarks reach {coverage:.0%} of nodes")
+        if coverage < 0.5:
+            click.echo(
+                "Warning: most nodes are outside the largest connected component; "
+                "check that the extract covers a connected street network",
+                err=True,
+            )
+
+
+@click.command("build-gtfs-timetable")
+@click.argument("feeds", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", default=None, help="Defaults to GTFS_TIMETABLE_PATH.")
+def build_gtfs_timetable_command(feeds: tuple[str, ...], output: str | None) -> None:
+    """Compile GTFS feed zips into the local transit timetable."""
+    from app.services.gtfs_router import build_gtfs_timetable
+
+    output = output or current_app.config["GTFS_TIMETABLE_PATH"]
+    try:
+        tt = build_gtfs_timetable(list(feeds), output)
+    except KeyError as exc:
+        raise click.ClickException(f"GTFS feed is missing required column {exc}") from exc
+    except (ValueError, zipfile.BadZipFile) as exc:
+        raise click.ClickException(str(exc)) from exc
+    click.echo(
+        f"Compiled {len(tt)} stops and {tt.pattern_count()} route patterns into {output}"
+    )
+
+
+@click.command("build-stop-index")
+@click.option("--gtfs", multiple=True, type=click.Path(exists=True, dir_okay=False),
+              help="GTFS feed zip (repeatable, at least one).")
+@click.option("--osm", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="OSM extract (.pbf or Overpass .json) for stops the feeds lack.")
+@click.option("--output", default=None, help="Defaults to STOP_INDEX_PATH.")
+def build_stop_index_command(gtfs: tuple[str, ...], osm: str | None, output: str | None) -> None:
+    """Index transit stops from GTFS feeds, topped up from an OSM extract."""
+    from app.services.stop_index import build_stop_index
+
+    if not gtfs:
+        raise click.UsageError(
+            "Give at least one --gtfs feed; for OSM stops alone, build the POI index "
+            "(flask build-poi-index) and set POI_SOURCE=index"
+        )
+    output = output or current_app.config["STOP_INDEX_PATH"]
+    try:
+        index = build_stop_index(list(gtfs), osm, output)
+    except KeyError as exc:
+        raise click.ClickException(f"GTFS feed is missing required column {exc}") from exc
+    except (RuntimeError, ValueError, zipfile.BadZipFile) as exc:
+        raise click.ClickException(str(exc)) from exc
+    click.echo(f"Indexed {len(index)} transit stops into {output}")
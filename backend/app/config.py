@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class Config:
     """Central config — values come from .env or fall back to free public endpoints."""
@@ -24,6 +26,54 @@ class Config:
     ORS_API_KEY = os.getenv("ORS_API_KEY", "")
     GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 
+    # --- Outbound HTTP (one pooled keep-alive session per upstream) ---
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    HTTP_TIMEOUTS = {
+        "nominatim": float(os.getenv("NOMINATIM_TIMEOUT_S", "10")),
+        "overpass": float(os.getenv("OVERPASS_TIMEOUT_S", "15")),
+        "osrm": float(os.getenv("OSRM_TIMEOUT_S", "10")),
+        "ors": float(os.getenv("ORS_TIMEOUT_S", "15")),
+        "google": float(os.getenv("GOOGLE_TIMEOUT_S", "15")),
+    }
+    # Retries for 429 / 502-504 / connection errors, exponential back-off
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF_S = float(os.getenv("HTTP_BACKOFF_S", "2.0"))
+
+    # Max concurrent in-flight requests per upstream (per process)
+    UPSTREAM_CONCURRENCY = {
+        "nominatim": int(os.getenv("NOMINATIM_CONCURRENCY", "1")),
+        "overpass": int(os.getenv("OVERPASS_CONCURRENCY", "2")),
+        "osrm": int(os.getenv("OSRM_CONCURRENCY", "8")),
+        "ors": int(os.getenv("ORS_CONCURRENCY", "4")),
+        "google": int(os.getenv("GOOGLE_CONCURRENCY", "4")),
+    }
+    # Worker threads used to fan out independent calls within a request
+    EXECUTOR_MAX_WORKERS = int(os.getenv("EXECUTOR_MAX_WORKERS", "16"))
+
+    # --- Metrics: GET /api/metrics in the Prometheus text format (metrics.py) ---
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # --- Upstream rate limits: (requests per second, burst) ---
+    # Shared by all threads and worker processes (see rate_limit.py).
+    # Upstreams without an entry are not limited.
+    RATE_LIMITS = {
+        # Nominatim usage policy: max 1 request/second
+        "nominatim": (
+            float(os.getenv("NOMINATIM_RATE_PER_S", "1.0")),
+            float(os.getenv("NOMINATIM_BURST", "1")),
+        ),
+        # Public Overpass server: one request every 2 s
+        "overpass": (
+            float(os.getenv("OVERPASS_RATE_PER_S", "0.5")),
+            float(os.getenv("OVERPASS_BURST", "1")),
+        ),
+        # ORS free tier: 40 requests/minute
+        "ors": (
+            float(os.getenv("ORS_RATE_PER_S", str(40 / 60))),
+            float(os.getenv("ORS_BURST", "40")),
+        ),
+    }
+
     # --- Score calculation defaults ---
     # Average walking speed in km/h (brisk walk)
     WALKING_SPEED_KMH = float(os.getenv("WALKING_SPEED_KMH", "5.0"))
@@ -33,3 +83,101 @@ class Config:
     )
     # WHO recommended moderate-exercise minutes per week
     WHO_WEEKLY_MINUTES = 150
+    # Nearest-by-air candidates per amenity type compared by walking distance
+    AMENITY_CANDIDATES = int(os.getenv("AMENITY_CANDIDATES", "5"))
+    # /api/score/batch: max homes per request, and homes within the same
+    # SCORE_BATCH_GROUP_M grid cell share one POI lookup and matrix call
+    SCORE_BATCH_MAX_HOMES = int(os.getenv("SCORE_BATCH_MAX_HOMES", "200"))
+    SCORE_BATCH_GROUP_M = float(os.getenv("SCORE_BATCH_GROUP_M", "1000"))
+    # How the score turns amenity candidates into walks: "matrix" routes the
+    # top AMENITY_CANDIDATES per type, "isochrone" estimates every candidate
+    # from one walk isochrone around the home (see isochrone.py)
+    SCORE_AMENITY_ROUTING = os.getenv("SCORE_AMENITY_ROUTING", "matrix")
+
+    # --- Walk isochrones (/api/route/isochrone) ---
+    # Sampled on this many rays × rings with one walking-table call
+    ISOCHRONE_BEARINGS = int(os.getenv("ISOCHRONE_BEARINGS", "16"))
+    ISOCHRONE_RINGS = int(os.getenv("ISOCHRONE_RINGS", "4"))
+    ISOCHRONE_MAX_MIN = float(os.getenv("ISOCHRONE_MAX_MIN", "60"))
+
+    # --- On-disk caches (SQLite, shared by all worker processes) ---
+    CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(_BACKEND_DIR, ".cache"))
+    # Geocoding results rarely change — keep hits for 30 days, misses for 1 day
+    GEOCODE_CACHE_TTL_S = int(os.getenv("GEOCODE_CACHE_TTL_S", str(30 * 86400)))
+    GEOCODE_CACHE_NEGATIVE_TTL_S = int(
+        os.getenv("GEOCODE_CACHE_NEGATIVE_TTL_S", "86400")
+    )
+    GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "50000"))
+    # Reverse lookups are keyed by coordinates rounded to this many decimals
+    # (4 decimals ≈ 11 m)
+    GEOCODE_REVERSE_PRECISION = int(os.getenv("GEOCODE_REVERSE_PRECISION", "4"))
+
+    # Walking routes: A→B and B→A share an entry; endpoints rounded to
+    # ROUTE_CACHE_PRECISION decimals (4 ≈ 11 m)
+    ROUTE_CACHE_TTL_S = int(os.getenv("ROUTE_CACHE_TTL_S", str(30 * 86400)))
+    ROUTE_CACHE_NEGATIVE_TTL_S = int(os.getenv("ROUTE_CACHE_NEGATIVE_TTL_S", "3600"))
+    ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "100000"))
+    ROUTE_CACHE_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", "4"))
+
+    # Google transit results: keyed by rounded endpoints and a departure
+    # bucket (weekday + TRANSIT_CACHE_BUCKET_MIN slot); timetables change,
+    # so entries expire sooner than walking routes
+    TRANSIT_CACHE_TTL_S = int(os.getenv("TRANSIT_CACHE_TTL_S", str(7 * 86400)))
+    TRANSIT_CACHE_NEGATIVE_TTL_S = int(os.getenv("TRANSIT_CACHE_NEGATIVE_TTL_S", "3600"))
+    TRANSIT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSIT_CACHE_MAX_ENTRIES", "50000"))
+    TRANSIT_CACHE_PRECISION = int(os.getenv("TRANSIT_CACHE_PRECISION", "3"))
+    TRANSIT_CACHE_BUCKET_MIN = int(os.getenv("TRANSIT_CACHE_BUCKET_MIN", "60"))
+
+    # --- POI lookups (amenities + transit stops) ---
+    # "tiles" = cached map tiles with every tag we use, "overpass" = live queries,
+    # "index" = offline index built with `flask build-poi-index <extract>`
+    POI_SOURCE = os.getenv("POI_SOURCE", "tiles")
+    POI_INDEX_PATH = os.getenv(
+        "POI_INDEX_PATH", os.path.join(_BACKEND_DIR, "data", "poi_index.npz")
+    )
+    # Tile edge in degrees (0.02° ≈ 2.2 km north-south)
+    POI_TILE_DEG = float(os.getenv("POI_TILE_DEG", "0.02"))
+    # Tiles older than this are served but refreshed in the background
+    POI_TILE_TTL_S = int(os.getenv("POI_TILE_TTL_S", str(7 * 86400)))
+    POI_TILE_MAX_TILES = int(os.getenv("POI_TILE_MAX_TILES", "5000"))
+
+    # --- Local pedestrian graph (flask build-walk-graph, see walk_graph.py) ---
+    WALK_GRAPH_PATH = os.getenv(
+        "WALK_GRAPH_PATH", os.path.join(_BACKEND_DIR, "data", "walk_graph.npz")
+    )
+    # Points farther than this from any graph node use the remote routers
+    WALK_GRAPH_SNAP_M = float(os.getenv("WALK_GRAPH_SNAP_M", "150"))
+    # Searches give up beyond this multiple of the straight-line distance
+    WALK_GRAPH_MAX_DETOUR = float(os.getenv("WALK_GRAPH_MAX_DETOUR", "3.0"))
+    # /api/route/many: max destinations per request
+    WALK_MANY_MAX_DESTINATIONS = int(os.getenv("WALK_MANY_MAX_DESTINATIONS", "200"))
+
+    # --- Local transit-stop index (flask build-stop-index, see stop_index.py) ---
+    STOP_INDEX_PATH = os.getenv(
+        "STOP_INDEX_PATH", os.path.join(_BACKEND_DIR, "data", "stop_index.npz")
+    )
+
+    # --- Local GTFS transit timetable (flask build-gtfs-timetable, see gtfs_router.py) ---
+    GTFS_TIMETABLE_PATH = os.getenv(
+        "GTFS_TIMETABLE_PATH", os.path.join(_BACKEND_DIR, "data", "gtfs_timetable.npz")
+    )
+    # Stops considered for the walk from home / to work
+    GTFS_ACCESS_M = float(os.getenv("GTFS_ACCESS_M", "1000"))
+    GTFS_ACCESS_MAX_STOPS = int(os.getenv("GTFS_ACCESS_MAX_STOPS", "15"))
+    # Build time: stops this close are linked by walking transfers
+    GTFS_TRANSFER_M = float(os.getenv("GTFS_TRANSFER_M", "300"))
+    GTFS_MAX_TRANSFERS = int(os.getenv("GTFS_MAX_TRANSFERS", "3"))
+    GTFS_MIN_TRANSFER_S = int(os.getenv("GTFS_MIN_TRANSFER_S", "60"))
+    # Commutes are planned for the next weekday at this feed-local time
+    GTFS_DEFAULT_DEPARTURE = os.getenv("GTFS_DEFAULT_DEPARTURE", "08:30")
+
+    # --- Precomputed nearest-amenity distance fields (distance_fields.py) ---
+    DISTANCE_FIELDS_DIR = os.getenv(
+        "DISTANCE_FIELDS_DIR", os.path.join(_BACKEND_DIR, "data", "distance_fields")
+    )
+    DISTANCE_FIELD_CELL_M = float(os.getenv("DISTANCE_FIELD_CELL_M", "50"))
+    # Same reach as the live amenity search used by the score
+    DISTANCE_FIELD_MAX_M = float(os.getenv("DISTANCE_FIELD_MAX_M", "3000"))
+    # Detour factor: bounds walks on the walk graph to MAX_M × this, and
+    # without a graph, walking distance ≈ straight-line distance × this
+    DISTANCE_FIELD_CIRCUITY = float(os.getenv("DISTANCE_FIELD_CIRCUITY", "1.3"))
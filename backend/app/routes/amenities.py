@@ -13,6 +13,7 @@ def search():
       "location":     {"lat": ..., "lng": ...},
       "amenity_type": "gym",
       "radius_m":     2000          (optional, default 2000)
+      "limit":        10            (optional, nearest N only; default all)
     }
     → {"results": [{name, lat, lng, amenity_type, distance_m}, ...]}
     """
@@ -32,8 +33,17 @@ def search():
     radius_m = int(body.get("radius_m", 2000))
     radius_m = max(100, min(radius_m, 10000))
 
+    limit = body.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer"}), 400
+        if limit < 1:
+            return jsonify({"error": "limit must be at least 1"}), 400
+
     try:
-        results = search_amenities(lat, lng, amenity_type, radius_m)
+        results = search_amenities(lat, lng, amenity_type, radius_m, limit)
     except Exception as exc:
         return jsonify({"error": str(exc)}), 502
 
@@ -0,0 +1,42 @@
+"""Metrics endpoint — Prometheus text format, plus per-endpoint request timing."""
+
+import time
+
+from flask import Blueprint, Response, current_app, g, request
+from app.services import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.before_app_request
+def _start_timer():
+    if current_app.config["METRICS_ENABLED"]:
+        g.request_started = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def _record_latency(response):
+    started = g.pop("request_started", None)
+    if started is None or request.endpoint == "metrics.scrape":
+        return response
+    labels = {
+        "endpoint": request.endpoint or "unmatched",
+        "method": request.method,
+        "status": response.status_code,
+    }
+
+    # Recorded when the server closes the response, so streamed bodies
+    # (/api/score/stream) are timed until their last chunk, not their headers
+    def record():
+        metrics.observe("hackuri_http_request_seconds", time.perf_counter() - started, **labels)
+
+    response.call_on_close(record)
+    return response
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def scrape():
+    """GET → every metric of this process (see services/metrics.py)."""
+    if not current_app.config["METRICS_ENABLED"]:
+        return {"error": "Metrics are disabled"}, 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -1,7 +1,13 @@
 """Routing API endpoints — walking directions between two points."""
 
-from flask import Blueprint, jsonify, request
-from app.services.routing_service import get_walking_route
+from datetime import datetime
+
+from flask import Blueprint, current_app, jsonify, request
+from app.services.amenities_service import search_amenities
+from app.services.fields import parse_fields, select_fields
+from app.services.geometry import parse_geometry_options, shape_geometries
+from app.services.isochrone import classify_points, get_walk_isochrone
+from app.services.routing_service import get_walking_route, get_walking_routes
 from app.services.transit_service import get_commute_walk_legs, find_nearest_transit_stops
 
 routing_bp = Blueprint("routing", __name__)
@@ -12,7 +18,11 @@ def walk():
     """
     POST {
       "origin":      {"lat": ..., "lng": ...},
-      "destination": {"lat": ..., "lng": ...}
+      "destination": {"lat": ..., "lng": ...},
+      "geometry_format": "raw" | "polyline",   (optional, default raw)
+      "zoom": 15,                              (optional, simplify for this zoom)
+      "tolerance_m": 5,                        (optional, overrides zoom)
+      "include_geometry": true                 (optional, false = no geometry)
     }
     → {distance_km, duration_min, geometry}
     """
@@ -28,13 +38,64 @@ def walk():
         return jsonify({"error": "origin and destination must have lat/lng"}), 400
 
     try:
-        route = get_walking_route(o_lat, o_lng, d_lat, d_lng)
+        geometry = parse_geometry_options(body)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    try:
+        route = get_walking_route(
+            o_lat, o_lng, d_lat, d_lng, geometry=geometry["include"]
+        )
     except Exception as exc:
         return jsonify({"error": str(exc)}), 502
 
     if route is None:
         return jsonify({"error": "No walking route found"}), 404
-    return jsonify(route)
+    return jsonify(shape_geometries(route, geometry))
+
+
+@routing_bp.route("/many", methods=["POST"])
+def many():
+    """
+    Walking routes from one origin to many destinations with one search.
+
+    POST {
+      "origin":       {"lat": ..., "lng": ...},
+      "destinations": [{"lat": ..., "lng": ...}, ...],
+      "geometry_format", "zoom", "tolerance_m",
+      "include_geometry": false                  (optional, default false here)
+    }
+    → {"routes": [{distance_km, duration_min, source, geometry?} | null, ...]}
+    One entry per destination, in order; null where no route exists.
+    """
+    body = request.get_json(force=True)
+    origin = body.get("origin", {})
+    destinations = body.get("destinations")
+    max_dest = current_app.config["WALK_MANY_MAX_DESTINATIONS"]
+
+    try:
+        o_lat, o_lng = float(origin["lat"]), float(origin["lng"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "origin must have lat/lng"}), 400
+    if not isinstance(destinations, list) or not destinations:
+        return jsonify({"error": "destinations must be a non-empty list"}), 400
+    if len(destinations) > max_dest:
+        return jsonify({"error": f"at most {max_dest} destinations per request"}), 400
+    try:
+        points = [(float(d["lat"]), float(d["lng"])) for d in destinations]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "destinations must be a list of {lat, lng}"}), 400
+    try:
+        geometry = parse_geometry_options({"include_geometry": False, **body})
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    try:
+        routes = get_walking_routes(o_lat, o_lng, points, geometry=geometry["include"])
+    except Exception as exc:
+        return jsonify({"error": str(exc)}), 502
+
+    return jsonify({"routes": shape_geometries(routes, geometry)})
 
 
 @routing_bp.route("/commute", methods=["POST"])
@@ -45,7 +106,12 @@ def commute():
     POST {
       "origin":      {"lat": ..., "lng": ...},
       "destination": {"lat": ..., "lng": ...},
-      "transit_radius_m": 2000   (optional)
+      "transit_radius_m": 2000   (optional),
+      "departure_time": "2026-10-19T08:30:00-04:00"  (optional, ISO 8601
+                                                     with a UTC offset),
+      "geometry_format", "zoom", "tolerance_m",
+      "include_geometry"                         (optional, as for /walk),
+      "fields": ["mode", "total_walk_min"]       (optional, see services/fields.py)
     }
     → {
         "mode": "transit" | "direct_walk",
@@ -68,16 +134,113 @@ def commute():
     except (KeyError, TypeError, ValueError):
         return jsonify({"error": "origin and destination must have lat/lng"}), 400
 
+    try:
+        geometry = parse_geometry_options(body)
+        fields = parse_fields(body)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
     radius = int(body.get("transit_radius_m", 2000))
 
+    departure = None
+    if body.get("departure_time") is not None:
+        try:
+            departure = datetime.fromisoformat(str(body["departure_time"]))
+        except ValueError:
+            return jsonify({"error": "departure_time must be an ISO 8601 date-time"}), 400
+        if departure.tzinfo is None:
+            # Server-local or feed-local would both be guesses
+            return jsonify({
+                "error": "departure_time must include a UTC offset, e.g. 2026-10-19T08:30:00-04:00"
+            }), 400
+
     try:
-        result = get_commute_walk_legs(o_lat, o_lng, d_lat, d_lng, radius)
+        result = get_commute_walk_legs(
+            o_lat, o_lng, d_lat, d_lng, radius, geometry=geometry["include"],
+            departure=departure,
+        )
     except Exception as exc:
         return jsonify({"error": str(exc)}), 502
 
     if result is None:
         return jsonify({"error": "Could not compute commute"}), 404
-    return jsonify(result)
+    return jsonify(select_fields(shape_geometries(result, geometry), fields))
+
+
+@routing_bp.route("/isochrone", methods=["POST"])
+def isochrone():
+    """
+    Area reachable on foot within N minutes, optionally classifying points.
+
+    POST {
+      "origin":  {"lat": ..., "lng": ...},
+      "minutes": 15,
+      "points":  [{"lat": ..., "lng": ...}, ...]   (optional),
+      "amenity_type": "gym"                       (optional, classify every
+                                                  POI of this type in reach),
+      "geometry_format", "zoom", "tolerance_m",
+      "include_geometry"                          (optional, as for /walk)
+    }
+    → {
+        "center": {"lat", "lng"}, "minutes": 15, "source": "osrm_estimated",
+        "geometry": [[lat, lng], ...]   (closed polygon ring),
+        "points":    [{lat, lng, reachable, distance_km, duration_min}, ...],
+        "amenities": [{name, lat, lng, amenity_type, distance_m,
+                       reachable, distance_km, duration_min}, ...]
+      }
+    Walk times are estimates interpolated from the isochrone samples.
+    """
+    body = request.get_json(force=True)
+    origin = body.get("origin", {})
+    max_min = current_app.config["ISOCHRONE_MAX_MIN"]
+
+    try:
+        lat, lng = float(origin["lat"]), float(origin["lng"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "origin must have lat/lng"}), 400
+    try:
+        minutes = float(body.get("minutes", 15))
+        if not 0 < minutes <= max_min:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"error": f"minutes must be between 0 and {max_min:g}"}), 400
+    try:
+        points = [(float(p["lat"]), float(p["lng"])) for p in body.get("points", [])]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "points must be a list of {lat, lng}"}), 400
+
+    try:
+        geometry = parse_geometry_options(body)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    amenity_type = body.get("amenity_type")
+    try:
+        iso = get_walk_isochrone(lat, lng, minutes)
+        pois = []
+        if amenity_type:
+            # Nothing beyond the straight-line reach can be within the budget
+            reach_m = iso["radii_m"][-1]
+            pois = search_amenities(lat, lng, amenity_type, radius_m=int(reach_m))
+    except Exception as exc:
+        return jsonify({"error": str(exc)}), 502
+
+    result = {
+        "center": iso["center"],
+        "minutes": minutes,
+        "source": iso["source"],
+        "geometry": iso["geometry"],
+        "points": [
+            {"lat": p[0], "lng": p[1], **est}
+            for p, est in zip(points, classify_points(iso, points))
+        ],
+    }
+    if amenity_type:
+        poi_coords = [(p["lat"], p["lng"]) for p in pois]
+        result["amenities"] = [
+            {**p, **est} for p, est in zip(pois, classify_points(iso, poi_coords))
+        ]
+    return jsonify(shape_geometries(result, geometry))
 
 
 @routing_bp.route("/debug", methods=["POST"])
@@ -86,7 +249,7 @@ def debug():
     Debug endpoint — returns the raw OSRM response so you can inspect
     what profile is being used and whether times make sense.
     """
-    import requests as _req
+    from app.services import http_client
     body = request.get_json(force=True)
     origin = body.get("origin", {})
     dest = body.get("destination", {})
@@ -106,7 +269,7 @@ def debug():
 
     # Try foot profile
     try:
-        r = _req.get(foot_url, params={"overview": "false"}, timeout=10)
+        r = http_client.get("osrm", foot_url, params={"overview": "false"})
         foot_data = r.json()
         results["foot"] = {
             "url": foot_url,
@@ -125,7 +288,7 @@ def debug():
 
     # Try car profile for comparison
     try:
-        r = _req.get(car_url, params={"overview": "false"}, timeout=10)
+        r = http_client.get("osrm", car_url, params={"overview": "false"})
         car_data = r.json()
         results["car"] = {
             "url": car_url,
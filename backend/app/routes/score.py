@@ -1,11 +1,53 @@
-"""Score calculation endpoint — the main aggregation API."""
+"""Score calculation endpoints — the main aggregation API."""
 
-from flask import Blueprint, jsonify, request
-from app.services.score_service import calculate_score
+import json
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from app.services.fields import parse_fields, select_fields
+from app.services.geometry import parse_geometry_options, shape_geometries
+from app.services.score_service import calculate_score, score_batch, score_events
 
 score_bp = Blueprint("score", __name__)
 
 
+def _point(value, message: str) -> tuple[float, float]:
+    """(lat, lng) from a {"lat", "lng"} object, or ValueError(*message*)."""
+    try:
+        return float(value["lat"]), float(value["lng"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(message)
+
+
+def _score_args(body: dict, with_home: bool = True) -> dict:
+    """calculate_score keyword arguments from a request body.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    args = {}
+
+    # --- Home (required) ---
+    if with_home:
+        args["home_lat"], args["home_lng"] = _point(
+            body.get("home", {}), "home.lat and home.lng are required"
+        )
+
+    # --- Work (optional) ---
+    work = body.get("work")
+    work_lat = work_lng = None
+    if work:
+        work_lat, work_lng = _point(work, "work must have lat and lng")
+
+    # --- Amenities list (optional) ---
+    return {
+        **args,
+        "work_lat": work_lat,
+        "work_lng": work_lng,
+        "amenities": body.get("amenities", []),
+        "work_days_per_week": int(body.get("work_days_per_week", 5)),
+        "commute_mode": body.get("commute_mode", "transit"),  # "transit" or "walk"
+    }
+
+
 @score_bp.route("/calculate", methods=["POST"])
 def calculate():
     """
@@ -13,7 +55,12 @@ def calculate():
       "home":               {"lat": ..., "lng": ...},
       "work":               {"lat": ..., "lng": ...}   (optional),
       "amenities":          [{"amenity_type": "gym", "visits_per_week": 3}, ...],
-      "work_days_per_week": 5
+      "work_days_per_week": 5,
+      "geometry_format": "raw" | "polyline",   (optional, default raw)
+      "zoom": 15,                              (optional, simplify for this zoom)
+      "tolerance_m": 5,                        (optional, overrides zoom)
+      "include_geometry": false,               (optional, default true)
+      "fields": ["grade", "breakdown.label"]   (optional, see services/fields.py)
     }
     → {
         "total_weekly_walk_min": ...,
@@ -25,40 +72,124 @@ def calculate():
     """
     body = request.get_json(force=True)
 
-    # --- Home (required) ---
-    home = body.get("home", {})
     try:
-        home_lat = float(home["lat"])
-        home_lng = float(home["lng"])
-    except (KeyError, TypeError, ValueError):
-        return jsonify({"error": "home.lat and home.lng are required"}), 400
+        args = _score_args(body)
+        geometry = parse_geometry_options(body)
+        fields = parse_fields(body)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    # --- Work (optional) ---
-    work = body.get("work")
-    work_lat = work_lng = None
-    if work:
+    try:
+        result = calculate_score(**args, include_geometry=geometry["include"])
+    except Exception as exc:
+        return jsonify({"error": str(exc)}), 500
+
+    return jsonify(select_fields(shape_geometries(result, geometry), fields))
+
+
+@score_bp.route("/stream", methods=["POST"])
+def stream():
+    """
+    Same body as /calculate (without "fields"); the score is streamed as
+    it is computed, one event per line (NDJSON), or as Server-Sent Events
+    when the request sends ``Accept: text/event-stream``:
+
+      {"event": "item",   "index": 0, "item": {...breakdown entry}}
+      {"event": "totals", "total_weekly_walk_min": ..., ...}   (after each item)
+      ...
+      {"event": "grade",  "total_weekly_walk_min": ..., ..., "grade": "B"}
+
+    Items arrive in the order they finish; "index" is the entry's position
+    in /calculate's breakdown. A failure after the stream has started is
+    reported as {"event": "error", "error": "..."}.
+    """
+    body = request.get_json(force=True)
+
+    try:
+        args = _score_args(body)
+        geometry = parse_geometry_options(body)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    sse = request.accept_mimetypes.best == "text/event-stream"
+
+    def encode(event: str, data: dict) -> str:
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": event, **data}) + "\n"
+
+    def generate():
         try:
-            work_lat = float(work["lat"])
-            work_lng = float(work["lng"])
-        except (KeyError, TypeError, ValueError):
-            return jsonify({"error": "work must have lat and lng"}), 400
+            for event, data in score_events(**args, include_geometry=geometry["include"]):
+                if event == "item":
+                    data = {**data, "item": shape_geometries(data["item"], geometry)}
+                yield encode(event, data)
+        except Exception as exc:
+            current_app.logger.warning("Score stream failed: %s", exc)
+            yield encode("error", {"error": str(exc)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    # --- Amenities list (optional) ---
-    amenities = body.get("amenities", [])
-    work_days = int(body.get("work_days_per_week", 5))
-    commute_mode = body.get("commute_mode", "transit")  # "transit" or "walk"
+
+@score_bp.route("/batch", methods=["POST"])
+def batch():
+    """
+    Score many candidate homes against one work location and amenity list.
+
+    POST {
+      "homes": [{"id": "listing-1", "lat": ..., "lng": ...}, ...],
+      "work", "amenities", "work_days_per_week", "commute_mode",
+      "geometry_format", "zoom", "tolerance_m", "fields"   (as for /calculate),
+      "include_geometry": false                 (optional, default false here)
+    }
+    → {"results": [
+        {"id": "listing-1", "total_weekly_walk_min": ..., "grade": ...,
+         "breakdown": [...], "errors": [{"item": "commute", "error": "..."}]},
+        {"id": "listing-2", "error": "home must have lat and lng"},
+        ...
+      ]}
+
+    One result per home, in request order; "id" is echoed back if given.
+    """
+    body = request.get_json(force=True)
+
+    homes = body.get("homes")
+    max_homes = current_app.config["SCORE_BATCH_MAX_HOMES"]
+    if not isinstance(homes, list) or not homes:
+        return jsonify({"error": "homes must be a non-empty list"}), 400
+    if len(homes) > max_homes:
+        return jsonify({"error": f"at most {max_homes} homes per batch"}), 400
 
     try:
-        result = calculate_score(
-            home_lat=home_lat,
-            home_lng=home_lng,
-            work_lat=work_lat,
-            work_lng=work_lng,
-            amenities=amenities,
-            work_days_per_week=work_days,
-            commute_mode=commute_mode,
-        )
+        args = _score_args(body, with_home=False)
+        geometry = parse_geometry_options({"include_geometry": False, **body})
+        fields = parse_fields(body)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    # Invalid homes get an error entry instead of failing the batch
+    points, results = [], []
+    for home in homes:
+        result = {"id": home.get("id")} if isinstance(home, dict) and "id" in home else {}
+        try:
+            points.append(_point(home, "home must have lat and lng"))
+        except ValueError as exc:
+            result["error"] = str(exc)
+        results.append(result)
+
+    try:
+        scores = iter(score_batch(points, **args, include_geometry=geometry["include"]))
     except Exception as exc:
         return jsonify({"error": str(exc)}), 500
 
-    return jsonify(result)
+    for result in results:
+        if "error" not in result:
+            score = next(scores)
+            if "error" not in score:
+                score = select_fields(shape_geometries(score, geometry), fields)
+            result.update(score)
+    return jsonify({"results": results})
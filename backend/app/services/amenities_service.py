@@ -1,22 +1,12 @@
 """Amenities service — finds nearby points of interest via Overpass (OSM)."""
 
 import math
-import time
-import requests
-from flask import current_app
+import re
 
-# Throttle Overpass requests — the public server rate-limits aggressively.
-_last_overpass_time: float = 0.0
-_OVERPASS_MIN_INTERVAL = 2.0  # seconds between requests
+import numpy as np
 
-
-def _throttle_overpass():
-    """Ensure a minimum gap between Overpass API calls."""
-    global _last_overpass_time
-    elapsed = time.time() - _last_overpass_time
-    if elapsed < _OVERPASS_MIN_INTERVAL:
-        time.sleep(_OVERPASS_MIN_INTERVAL - elapsed)
-    _last_overpass_time = time.time()
+from app.services.overpass_service import lookup
+from app.services.poi_service import fetch_nearest_pois, fetch_pois
 
 # Map user-friendly names → OSM Overpass tag filters.
 # Each value is one or more Overpass tag clauses. For more precise results,
@@ -76,6 +66,32 @@ def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
+def haversine_many(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """Vectorized _haversine from one point to arrays of points (metres)."""
+    R = 6_371_000
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlam = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def nearest_order(dists: np.ndarray, limit: int | None = None) -> np.ndarray:
+    """Indices of *dists* in ascending order, only the first *limit* if given.
+
+    Uses a partial selection (argpartition) so only the kept slice is sorted.
+    Ties keep their original relative order, as a stable sort would.
+    """
+    n = len(dists)
+    if limit is not None and limit < n:
+        if limit <= 0:
+            return np.empty(0, dtype=np.intp)
+        idx = np.sort(np.argpartition(dists, limit - 1)[:limit])
+        return idx[np.argsort(dists[idx], kind="stable")]
+    return np.argsort(dists, kind="stable")
+
+
 def _resolve_tag(amenity_type: str) -> list[list[str]]:
     """Resolve a user-friendly amenity name to Overpass tag filter groups.
 
@@ -90,48 +106,54 @@ def _resolve_tag(amenity_type: str) -> list[list[str]]:
 
 
 def search_amenities(
-    lat: float, lng: float, amenity_type: str, radius_m: int = 2000
+    lat: float,
+    lng: float,
+    amenity_type: str,
+    radius_m: int = 2000,
+    limit: int | None = None,
 ) -> list[dict]:
-    """Search for amenities near a location using the Overpass API.
+    """Search for amenities near a location (POI tiles or Overpass, see poi_service).
 
-    Returns a list of dicts with: name, lat, lng, amenity_type, distance_m
-    """
-    tag_groups = _resolve_tag(amenity_type)
-
-    # Build Overpass union query — each tag group becomes a node+way pair
-    union_parts = []
-    for group in tag_groups:
-        tag_filter = "".join(f"[{clause}]" for clause in group)
-        union_parts.append(f"node{tag_filter}(around:{radius_m},{lat},{lng});")
-        union_parts.append(f"way{tag_filter}(around:{radius_m},{lat},{lng});")
-
-    query = f"""
-    [out:json][timeout:10];
-    (
-      {chr(10).join('      ' + p for p in union_parts)}
-    );
-    out center body;
+    Returns a list of dicts with: name, lat, lng, amenity_type, distance_m —
+    the nearest *limit* of them, or all if *limit* is None.
     """
+    lk = amenity_lookup(lat, lng, amenity_type, radius_m)
+    if limit is not None:
+        return fetch_nearest_pois(
+            lk, limit, lambda elements: amenity_results(lat, lng, amenity_type, elements, limit)
+        )
+    [elements] = fetch_pois([lk])
+    return amenity_results(lat, lng, amenity_type, elements, limit)
 
-    overpass_url = current_app.config["OVERPASS_BASE_URL"]
 
-    # Throttle + retry with back-off on 429
-    max_retries = 3
-    for attempt in range(max_retries):
-        _throttle_overpass()
-        resp = requests.post(overpass_url, data={"data": query}, timeout=15)
-        if resp.status_code == 429:
-            wait = _OVERPASS_MIN_INTERVAL * (attempt + 2)
-            time.sleep(wait)
-            continue
-        resp.raise_for_status()
-        break
-    else:
-        resp.raise_for_status()  # raise the last 429 if all retries failed
+def amenity_lookup(lat: float, lng: float, amenity_type: str, radius_m: int) -> dict:
+    """Overpass lookup (see overpass_service.lookup) for one amenity type."""
+    return lookup(lat, lng, radius_m, _resolve_tag(amenity_type))
 
-    elements = resp.json().get("elements", [])
 
-    results = []
+def _exclude_pattern(amenity_type: str) -> re.Pattern | None:
+    """One case-insensitive regex for the type's EXCLUDE_KEYWORDS, if any."""
+    excludes = EXCLUDE_KEYWORDS.get(amenity_type.lower(), [])
+    if not excludes:
+        return None
+    return re.compile("|".join(re.escape(kw) for kw in excludes), re.IGNORECASE)
+
+
+def amenity_results(
+    lat: float,
+    lng: float,
+    amenity_type: str,
+    elements: list[dict],
+    limit: int | None = None,
+) -> list[dict]:
+    """Turn raw Overpass elements into amenity dicts sorted by distance.
+
+    Distances are computed over coordinate arrays in one pass and only the
+    nearest *limit* results (all if None) are sorted and built.
+    """
+    exclude = _exclude_pattern(amenity_type)
+
+    kept, lats, lngs = [], [], []
     for el in elements:
         # Ways use 'center' for lat/lon
         el_lat = el.get("lat") or el.get("center", {}).get("lat")
@@ -139,24 +161,25 @@ def search_amenities(
         if el_lat is None or el_lng is None:
             continue
 
-        name = el.get("tags", {}).get("name", "Unnamed")
-
         # Keyword exclusion filter
-        excludes = EXCLUDE_KEYWORDS.get(amenity_type.lower(), [])
-        if any(kw.lower() in name.lower() for kw in excludes):
+        if exclude is not None and exclude.search(el.get("tags", {}).get("name", "Unnamed")):
             continue
 
-        dist = _haversine(lat, lng, el_lat, el_lng)
-        results.append(
-            {
-                "name": name,
-                "lat": el_lat,
-                "lng": el_lng,
-                "amenity_type": amenity_type,
-                "distance_m": round(dist, 0),
-            }
-        )
-
-    # Sort by distance
-    results.sort(key=lambda r: r["distance_m"])
-    return results
+        kept.append(el)
+        lats.append(el_lat)
+        lngs.append(el_lng)
+
+    if not kept:
+        return []
+
+    dists = np.round(haversine_many(lat, lng, lats, lngs))
+    return [
+        {
+            "name": kept[i].get("tags", {}).get("name", "Unnamed"),
+            "lat": lats[i],
+            "lng": lngs[i],
+            "amenity_type": amenity_type,
+            "distance_m": float(dists[i]),
+        }
+        for i in nearest_order(dists, limit)
+    ]
@@ -0,0 +1,185 @@
+"""Persistent key/value cache — one SQLite file (WAL mode) per cache name.
+
+The files live under ``CACHE_DIR`` so entries survive restarts and are shared
+by every worker process. Each entry has its own expiry; once a cache grows
+past ``max_entries`` the least-recently-used rows are evicted.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+
+# Returned by SqliteCache.get() when there is no live entry. A stored value of
+# None is a *negative* entry ("we asked upstream and it had nothing").
+MISSING = object()
+
+# Refreshing accessed_at is a write; skip it if the row was touched recently.
+_TOUCH_INTERVAL_S = 60.0
+# Run LRU eviction every N writes instead of on every put().
+_EVICT_EVERY = 32
+
+
+class SqliteCache:
+    """TTL + LRU cache backed by a SQLite file.
+
+    Values are JSON-encoded by default; pass ``dumps``/``loads`` to store
+    another representation (they must round-trip to/from ``bytes`` or ``str``).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10_000,
+        ttl_s: float = 86_400,
+        dumps=json.dumps,
+        loads=json.loads,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._dumps = dumps
+        self._loads = loads
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shareable)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """Return the cached value, None for a negative entry, or MISSING."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self._count("misses")
+                return MISSING
+            if now - row[2] > _TOUCH_INTERVAL_S:
+                conn.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        except sqlite3.Error as exc:
+            _log_error("read", self.path, exc)
+            self._count("misses")
+            return MISSING
+
+        if row[0] is None:
+            self._count("negative_hits")
+            return None
+        self._count("hits")
+        return self._loads(row[0])
+
+    def put(self, key: str, value, ttl_s: float | None = None) -> None:
+        """Store *value* (None stores a negative entry) for *ttl_s* seconds."""
+        now = time.time()
+        ttl = self.ttl_s if ttl_s is None else ttl_s
+        blob = None if value is None else self._dumps(value)
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, blob, now + ttl, now),
+            )
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % _EVICT_EVERY == 0
+            if evict:
+                self._evict(conn, now)
+        except sqlite3.Error as exc:
+            _log_error("write", self.path, exc)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then the least-recently-used overflow."""
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process since startup."""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": (
+                    round((self.hits + self.negative_hits) / lookups, 3)
+                    if lookups else 0.0
+                ),
+            }
+
+
+def _log_error(action: str, path: str, exc: Exception) -> None:
+    """A broken cache must never break the request — log and carry on."""
+    try:
+        current_app.logger.warning("Cache %s failed (%s): %s", action, path, exc)
+    except RuntimeError:
+        pass  # outside an app context
+
+
+_caches: dict[str, SqliteCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, **options) -> SqliteCache:
+    """Return the process-wide cache stored at ``CACHE_DIR/<name>.sqlite3``.
+
+    *options* are passed to SqliteCache the first time the cache is opened.
+    """
+    path = os.path.join(current_app.config["CACHE_DIR"], f"{name}.sqlite3")
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = SqliteCache(path, **options)
+        return cache
+
+
+def cache_stats() -> dict[str, dict]:
+    """Counters for every cache opened by this process, keyed by file name."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {
+        os.path.splitext(os.path.basename(path))[0]: cache.stats()
+        for path, cache in caches.items()
+    }
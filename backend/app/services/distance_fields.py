@@ -0,0 +1,349 @@
+"""Precomputed nearest-amenity distance fields.
+
+``flask build-distance-fields NAME --bbox S,W,N,E`` rasterizes a region into
+DISTANCE_FIELD_CELL_M cells and, for every AMENITY_TAG_MAP type, stores the
+walking distance from each cell centre to the nearest POI of that type (POIs
+come from the offline POI index, see poi_index.py) and which POI that is.
+calculate_score reads these with two array lookups per amenity and only
+falls back to the live search + routing outside covered regions.
+
+Walking distances come from a multi-source Dijkstra over the local walk
+graph (walk_graph.py): every POI of the type is a source, snapped to the
+graph like a live route's endpoints, and each cell centre is snapped too.
+Walks longer than DISTANCE_FIELD_MAX_M × DISTANCE_FIELD_CIRCUITY (the live
+search radius plus the detour its routes may take) count as out of range.
+Cells with no graph node within WALK_GRAPH_SNAP_M are left uncovered, so
+those homes take the live path.
+
+Without a walk graph the fields fall back to straight-line distance ×
+DISTANCE_FIELD_CIRCUITY, with POIs farther than DISTANCE_FIELD_MAX_M in a
+straight line ignored, as the live search does beyond its radius.
+
+Layout of DISTANCE_FIELDS_DIR/<region>/:
+    meta.json          grid origin, cell size, shape, and per type the .npy
+                       file stem and the list of POIs [name, lat, lng]
+    <stem>.dist.npy    uint16 metres per cell (NO_POI = nothing in range)
+    <stem>.poi.npy     int32 index into that type's POI list (-1 = none,
+                       UNCOVERED = cell not on the walk graph)
+Arrays are opened memory-mapped, so worker processes share the pages.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+
+from app.services.amenities_service import AMENITY_TAG_MAP, _exclude_pattern, _haversine
+
+_M_PER_DEG_LAT = 111_320
+NO_POI = np.iinfo(np.uint16).max
+UNCOVERED = -2
+# Seconds between re-scans of DISTANCE_FIELDS_DIR for new or rebuilt regions
+_RESCAN_S = 5.0
+
+# Returned by nearest_amenity when no region covers the point / type
+NOT_COVERED = object()
+
+
+# ── Building ─────────────────────────────────────────────────────────
+
+
+def _grid(bbox: tuple[float, float, float, float], cell_m: float) -> dict:
+    south, west, north, east = bbox
+    dlat = cell_m / _M_PER_DEG_LAT
+    dlng = cell_m / (_M_PER_DEG_LAT * math.cos(math.radians((south + north) / 2)))
+    return {
+        "bbox": [south, west, north, east],
+        "cell_m": cell_m,
+        "dlat": dlat,
+        "dlng": dlng,
+        "shape": [math.ceil((north - south) / dlat), math.ceil((east - west) / dlng)],
+    }
+
+
+def _type_pois(index, amenity_type: str, bbox, max_m: float) -> list[int] | None:
+    """Index POIs of *amenity_type* in *bbox* widened by *max_m*, or None if unindexed."""
+    mask = index.mask_for(AMENITY_TAG_MAP[amenity_type])
+    if mask is None:
+        return None
+    south, west, north, east = bbox
+    pad_lat = max_m / _M_PER_DEG_LAT
+    pad_lng = max_m / (_M_PER_DEG_LAT * math.cos(math.radians((south + north) / 2)))
+
+    masks = np.frombuffer(index.masks, dtype=np.uint64)
+    lats = np.frombuffer(index.lat, dtype=np.float64)
+    lngs = np.frombuffer(index.lng, dtype=np.float64)
+    hit = (
+        (masks & np.uint64(mask) != 0)
+        & (lats >= south - pad_lat) & (lats <= north + pad_lat)
+        & (lngs >= west - pad_lng) & (lngs <= east + pad_lng)
+    )
+    pois = np.flatnonzero(hit).tolist()
+    exclude = _exclude_pattern(amenity_type)
+    if exclude is not None:
+        pois = [i for i in pois if not exclude.search(index.names[i] or "Unnamed")]
+    return pois
+
+
+def _cell_centres(grid: dict) -> tuple[np.ndarray, np.ndarray]:
+    rows, cols = grid["shape"]
+    south, west = grid["bbox"][0], grid["bbox"][1]
+    return (
+        south + (np.arange(rows) + 0.5) * grid["dlat"],
+        west + (np.arange(cols) + 0.5) * grid["dlng"],
+    )
+
+
+def _snap_cells(grid: dict, graph, snap_m: float) -> tuple[np.ndarray, np.ndarray]:
+    """(nearest graph node, metres to it) per cell centre; node -1 = none in reach."""
+    rows, cols = grid["shape"]
+    nodes = np.full((rows, cols), -1, dtype=np.int64)
+    offsets = np.zeros((rows, cols), dtype=np.float64)
+    centre_lat, centre_lng = _cell_centres(grid)
+    for y, lat in enumerate(centre_lat.tolist()):
+        for x, lng in enumerate(centre_lng.tolist()):
+            snapped = graph.snap(lat, lng, snap_m)
+            if snapped is not None:
+                nodes[y, x], offsets[y, x] = snapped
+    return nodes, offsets
+
+
+def _graph_field(
+    cells: tuple[np.ndarray, np.ndarray],
+    graph,
+    points: list[tuple[float, float]],
+    max_walk_m: float,
+    snap_m: float,
+):
+    """(uint16 distance field, int32 nearest-point field) by walking on *graph*.
+
+    *cells* is _snap_cells' output for the grid. Points off the graph are
+    skipped, as a live route to them would not be found either.
+    """
+    cell_nodes, cell_offsets = cells
+    seeds, seed_points = [], []
+    for j, (lat, lng) in enumerate(points):
+        snapped = graph.snap(lat, lng, snap_m)
+        if snapped is not None:
+            seeds.append(snapped)
+            seed_points.append(j)
+
+    on_graph = cell_nodes >= 0
+    walk = np.full(cell_nodes.shape, np.inf)
+    nearest = np.where(on_graph, -1, UNCOVERED).astype(np.int32)
+    if seeds:
+        node_dist, node_seed = graph.nearest_sources(seeds, max_walk_m)
+        nodes = cell_nodes[on_graph]
+        walk[on_graph] = node_dist[nodes] + cell_offsets[on_graph]
+        reached = on_graph & (walk <= max_walk_m)
+        nearest[reached] = np.asarray(seed_points, dtype=np.int32)[node_seed[cell_nodes[reached]]]
+    walk = np.where(nearest >= 0, np.rint(walk), NO_POI)
+    return np.minimum(walk, NO_POI).astype(np.uint16), nearest
+
+
+def _nearest_field(grid: dict, points: list[tuple[float, float]], max_m: float, circuity: float):
+    """(uint16 distance field, int32 nearest-point field) over *grid*, by straight line.
+
+    Each point only updates the window of cells within *max_m*, so the cost
+    is points × window rather than points × grid.
+    """
+    rows, cols = grid["shape"]
+    south, west = grid["bbox"][0], grid["bbox"][1]
+    dlat, dlng, cell_m = grid["dlat"], grid["dlng"], grid["cell_m"]
+    kx = _M_PER_DEG_LAT * math.cos(math.radians(south + rows * dlat / 2))
+
+    best = np.full((rows, cols), np.inf, dtype=np.float32)
+    nearest = np.full((rows, cols), -1, dtype=np.int32)
+    reach = math.ceil(max_m / cell_m) + 1
+    centre_lat, centre_lng = _cell_centres(grid)
+
+    for j, (lat, lng) in enumerate(points):
+        y = math.floor((lat - south) / dlat)
+        x = math.floor((lng - west) / dlng)
+        y0, y1 = max(0, y - reach), min(rows, y + reach + 1)
+        x0, x1 = max(0, x - reach), min(cols, x + reach + 1)
+        if y0 >= y1 or x0 >= x1:
+            continue
+        dy = (centre_lat[y0:y1, None] - lat) * _M_PER_DEG_LAT
+        dx = (centre_lng[None, x0:x1] - lng) * kx
+        dist = np.hypot(dy, dx)
+        dist[dist > max_m] = np.inf
+        window = best[y0:y1, x0:x1]
+        closer = dist < window
+        window[closer] = dist[closer]
+        nearest[y0:y1, x0:x1][closer] = j
+
+    walk = np.where(np.isfinite(best), np.rint(best * circuity), NO_POI)
+    return np.minimum(walk, NO_POI).astype(np.uint16), nearest
+
+
+def build_distance_fields(name: str, bbox: tuple[float, float, float, float]) -> dict:
+    """Compute and write every type's fields for region *name*; returns its meta."""
+    from app.services.poi_index import get_index
+    from app.services.walk_graph import get_walk_graph
+
+    cfg = current_app.config
+    index = get_index()
+    if index is None:
+        raise RuntimeError(
+            f"No POI index at {cfg['POI_INDEX_PATH']}; run `flask build-poi-index` first"
+        )
+    south, west, north, east = bbox
+    if not (south < north and west < east):
+        raise ValueError("bbox must be south,west,north,east with south < north, west < east")
+
+    max_m = cfg["DISTANCE_FIELD_MAX_M"]
+    circuity = cfg["DISTANCE_FIELD_CIRCUITY"]
+    grid = _grid(bbox, cfg["DISTANCE_FIELD_CELL_M"])
+    graph = get_walk_graph()
+    snap_m = cfg["WALK_GRAPH_SNAP_M"]
+    cells = _snap_cells(grid, graph, snap_m) if graph is not None else None
+    meta = {
+        **grid,
+        "max_m": max_m,
+        "circuity": circuity,
+        "method": "walk_graph" if graph is not None else "circuity",
+        "types": {},
+    }
+
+    out_dir = os.path.join(cfg["DISTANCE_FIELDS_DIR"], name)
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    built: dict[tuple, str] = {}  # aliases with identical filters share files
+    for amenity_type, groups in AMENITY_TAG_MAP.items():
+        pois = _type_pois(index, amenity_type, bbox, max_m)
+        if pois is None:
+            continue
+        excludes = _exclude_pattern(amenity_type)
+        signature = (repr(groups), excludes.pattern if excludes else None)
+        stem = built.get(signature)
+        if stem is None:
+            stem = built[signature] = re.sub(r"\W+", "_", amenity_type)
+            points = [(index.lat[i], index.lng[i]) for i in pois]
+            if graph is not None:
+                dist, nearest = _graph_field(cells, graph, points, max_m * circuity, snap_m)
+            else:
+                dist, nearest = _nearest_field(grid, points, max_m, circuity)
+            np.save(os.path.join(tmp_dir, f"{stem}.dist.npy"), dist)
+            np.save(os.path.join(tmp_dir, f"{stem}.poi.npy"), nearest)
+        meta["types"][amenity_type] = {
+            "stem": stem,
+            "pois": [[index.names[i], index.lat[i], index.lng[i]] for i in pois],
+        }
+
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return meta
+
+
+# ── Lookups ──────────────────────────────────────────────────────────
+
+_regions: dict[str, tuple[float, dict]] = {}  # dir -> (meta mtime, region)
+_region_list: list[dict] = []
+_region_scan: tuple[str, float] = ("", -math.inf)  # (root, monotonic time of last scan)
+_regions_lock = threading.Lock()
+
+
+def _load_region(path: str) -> dict:
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {}
+    for info in meta["types"].values():
+        stem = info["stem"]
+        if stem not in arrays:
+            arrays[stem] = (
+                np.load(os.path.join(path, f"{stem}.dist.npy"), mmap_mode="r"),
+                np.load(os.path.join(path, f"{stem}.poi.npy"), mmap_mode="r"),
+            )
+    return {"meta": meta, "arrays": arrays}
+
+
+def _loaded_regions() -> list[dict]:
+    """Every region under DISTANCE_FIELDS_DIR (rescanned every _RESCAN_S seconds)."""
+    global _region_list, _region_scan
+    root = current_app.config["DISTANCE_FIELDS_DIR"]
+    now = time.monotonic()
+    with _regions_lock:
+        if _region_scan[0] != root or now - _region_scan[1] >= _RESCAN_S:
+            _region_list = _scan_regions(root)
+            _region_scan = (root, now)
+        return _region_list
+
+
+def _scan_regions(root: str) -> list[dict]:
+    """Regions under *root*, reusing loaded ones whose meta.json is unchanged."""
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return []
+    regions = []
+    for name in names:
+        if name.endswith(".tmp"):  # being built
+            continue
+        path = os.path.join(root, name)
+        try:
+            mtime = os.path.getmtime(os.path.join(path, "meta.json"))
+        except OSError:
+            continue
+        cached = _regions.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _regions[path] = (mtime, _load_region(path))
+        regions.append(cached[1])
+    return regions
+
+
+def nearest_amenity(lat: float, lng: float, amenity_type: str):
+    """Nearest *amenity_type* POI to (lat, lng) from the distance fields.
+
+    Returns NOT_COVERED if no region covers the point for this type, None if
+    a region does but has no such POI in range, otherwise (nearest, route)
+    shaped like search_amenities / get_walking_route results.
+    """
+    key = amenity_type.lower().strip()
+    for region in _loaded_regions():
+        meta = region["meta"]
+        info = meta["types"].get(key)
+        south, west, north, east = meta["bbox"]
+        if info is None or not (south <= lat < north and west <= lng < east):
+            continue
+
+        y = int((lat - south) / meta["dlat"])
+        x = int((lng - west) / meta["dlng"])
+        dist, nearest = region["arrays"][info["stem"]]
+        if y >= dist.shape[0] or x >= dist.shape[1]:
+            continue
+        poi = int(nearest[y, x])
+        if poi == UNCOVERED:
+            continue
+        if poi < 0:
+            return None
+
+        walk_m = int(dist[y, x])
+        name, poi_lat, poi_lng = info["pois"][poi]
+        walk_speed = current_app.config.get("WALKING_SPEED_KMH", 5.0)
+        distance_km = walk_m / 1000
+        return (
+            {
+                "name": name or "Unnamed",
+                "lat": poi_lat,
+                "lng": poi_lng,
+                "amenity_type": amenity_type,
+                "distance_m": float(round(_haversine(lat, lng, poi_lat, poi_lng))),
+            },
+            {
+                "distance_km": round(distance_km, 2),
+                "duration_min": round((distance_km / walk_speed) * 60, 1),
+                "source": "distance_field",
+            },
+        )
+    return NOT_COVERED
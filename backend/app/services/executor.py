@@ -0,0 +1,128 @@
+"""Bounded thread pool for fanning out independent upstream calls.
+
+``spawn`` starts a function in the shared pool (inside a fresh app context
+and a copy of the caller's contextvars) and returns a Task. ``Task.result``
+runs the function in the calling thread if no worker has picked it up yet,
+so nested fan-outs (a pooled task that itself spawns tasks) can never
+deadlock the pool. ``as_completed`` yields tasks in finishing order under
+the same rule.
+
+Per-upstream concurrency is limited in http_client, not here.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from flask import Flask, current_app
+
+# How long as_completed waits for a worker before running a queued task itself
+_STEAL_AFTER_S = 0.05
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=current_app.config["EXECUTOR_MAX_WORKERS"],
+                thread_name_prefix="fanout",
+            )
+        return _pool
+
+
+def _run_in_app(app: Flask, fn, args, kwargs):
+    with app.app_context():
+        return fn(*args, **kwargs)
+
+
+class Task:
+    """Handle for a spawned call."""
+
+    def __init__(self, future: Future, run):
+        self._future = future
+        self._run = run
+        self._inline: Future | None = None  # outcome when run by the caller
+
+    def result(self):
+        """Return the call's result (re-raising its exception)."""
+        if self._inline is None and self._future.cancel():
+            # Still queued — do the work here instead of waiting for a worker.
+            self._inline = Future()
+            try:
+                self._inline.set_result(self._run())
+            except Exception as exc:
+                self._inline.set_exception(exc)
+        if self._inline is not None:
+            return self._inline.result()
+        return self._future.result()
+
+    def done(self) -> bool:
+        return self._inline is not None or self._future.done()
+
+    def queued(self) -> bool:
+        """True if no worker (and not the caller) has started the call yet."""
+        return self._inline is None and not (self._future.running() or self._future.done())
+
+    def cancel(self) -> None:
+        """Drop the call if it has not started yet."""
+        self._future.cancel()
+
+
+def spawn(fn, *args, **kwargs) -> Task:
+    """Start ``fn(*args, **kwargs)`` concurrently with the caller."""
+    app = current_app._get_current_object()
+    ctx = contextvars.copy_context()
+
+    def run():
+        # Each run gets its own copy so the pooled and inline paths match.
+        return ctx.copy().run(_run_in_app, app, fn, args, kwargs)
+
+    return Task(_get_pool().submit(run), run)
+
+
+def gather(tasks: list[Task]) -> list:
+    """Results of *tasks* in order; the first failure is raised after all finish."""
+    results, error = [], None
+    for task in tasks:
+        try:
+            results.append(task.result())
+        except Exception as exc:
+            results.append(None)
+            error = error or exc
+    if error is not None:
+        raise error
+    return results
+
+
+def as_completed(tasks: list[Task]):
+    """Yield *tasks* as they finish.
+
+    If nothing finishes within _STEAL_AFTER_S and some task is still queued,
+    the caller runs it instead of idling.
+    """
+    pending = list(tasks)
+    while pending:
+        ready = [t for t in pending if t.done()]
+        if not ready:
+            any_queued = any(t.queued() for t in pending)
+            wait(
+                [t._future for t in pending],
+                timeout=_STEAL_AFTER_S if any_queued else None,
+                return_when=FIRST_COMPLETED,
+            )
+            ready = [t for t in pending if t.done()]
+        if not ready:
+            task = next((t for t in pending if t.queued()), None)
+            if task is not None:
+                try:
+                    task.result()
+                except Exception:
+                    pass  # re-raised when the caller reads the result
+                ready = [task]
+        for task in ready:
+            pending.remove(task)
+            yield task
@@ -0,0 +1,46 @@
+"""Sparse responses — let clients pick the response fields they need.
+
+``"fields": ["grade", "total_weekly_walk_min", "breakdown.label"]`` keeps
+only those keys. A dotted path selects keys inside a nested object, or
+inside every object of a nested list; a bare key keeps its whole value.
+"""
+
+
+def parse_fields(body: dict) -> dict | None:
+    """The request's "fields" as a selection tree, or None to keep everything.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    fields = body.get("fields")
+    if fields is None:
+        return None
+    if not isinstance(fields, list) or not all(
+        isinstance(f, str) and f.strip() for f in fields
+    ):
+        raise ValueError("fields must be a list of field names")
+
+    tree: dict = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.strip().split(".")
+        for part in parents:
+            child = node.get(part, {})
+            if child is None:  # a bare parent already keeps the whole value
+                break
+            node = node.setdefault(part, child)
+        else:
+            node[leaf] = None
+    return tree
+
+
+def select_fields(data, tree: dict | None):
+    """Project *data* onto the selection *tree* from parse_fields."""
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        k: select_fields(data[k], sub) for k, sub in tree.items() if k in data
+    }
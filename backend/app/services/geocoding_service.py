@@ -1,65 +1,104 @@
 """Geocoding service — converts addresses ↔ coordinates using Nominatim (OSM)."""
 
-import time
-import requests
+import re
 from flask import current_app
 
+from app.services import http_client
+from app.services.cache import MISSING, get_cache
+from app.services.singleflight import single_flight
+
 # Nominatim requires a descriptive User-Agent (not blank/generic).
 _USER_AGENT = "HackURI-WalkScore/1.0"
 
-# Simple in-memory cache to respect Nominatim's 1-req/sec policy.
-_last_request_time: float = 0.0
+def _geocode_cache():
+    cfg = current_app.config
+    return get_cache(
+        "geocode",
+        max_entries=cfg["GEOCODE_CACHE_MAX_ENTRIES"],
+        ttl_s=cfg["GEOCODE_CACHE_TTL_S"],
+    )
 
 
-def _throttle():
-    """Ensure at least 1 second between Nominatim requests."""
-    global _last_request_time
-    elapsed = time.time() - _last_request_time
-    if elapsed < 1.0:
-        time.sleep(1.0 - elapsed)
-    _last_request_time = time.time()
+def _normalize_address(address: str) -> str:
+    """Case/whitespace/punctuation-insensitive cache key for an address."""
+    key = address.lower().replace(",", " ").replace(".", " ")
+    return re.sub(r"\s+", " ", key).strip()
 
 
+@single_flight
 def geocode_address(address: str) -> dict:
     """Forward-geocode a free-form address string.
 
     Returns dict with keys: address, lat, lng, display_name
     Raises ValueError if the address cannot be resolved.
     """
+    cache = _geocode_cache()
+    cache_key = f"fwd:{_normalize_address(address)}"
+    cached = cache.get(cache_key)
+    if cached is not MISSING:
+        if cached is None:
+            raise ValueError(f"Could not geocode address: {address}")
+        return {**cached, "address": address}
+
     base = current_app.config["NOMINATIM_BASE_URL"]
-    _throttle()
-    resp = requests.get(
+    resp = http_client.get(
+        "nominatim",
         f"{base}/search",
         params={"q": address, "format": "jsonv2", "limit": 1},
         headers={"User-Agent": _USER_AGENT},
-        timeout=10,
     )
     resp.raise_for_status()
     results = resp.json()
     if not results:
+        cache.put(
+            cache_key, None, ttl_s=current_app.config["GEOCODE_CACHE_NEGATIVE_TTL_S"]
+        )
         raise ValueError(f"Could not geocode address: {address}")
 
     hit = results[0]
-    return {
+    result = {
         "address": address,
         "lat": float(hit["lat"]),
         "lng": float(hit["lon"]),
         "display_name": hit.get("display_name", address),
     }
+    cache.put(cache_key, result)
+    return result
 
 
+@single_flight
 def reverse_geocode(lat: float, lng: float) -> dict:
     """Reverse-geocode coordinates to an address string."""
+    cache = _geocode_cache()
+    precision = current_app.config["GEOCODE_REVERSE_PRECISION"]
+    cache_key = f"rev:{round(lat, precision)},{round(lng, precision)}"
+    cached = cache.get(cache_key)
+    if cached is not MISSING:
+        display_name = cached or ""
+        return {
+            "address": display_name,
+            "lat": lat,
+            "lng": lng,
+            "display_name": display_name,
+        }
+
     base = current_app.config["NOMINATIM_BASE_URL"]
-    _throttle()
-    resp = requests.get(
+    resp = http_client.get(
+        "nominatim",
         f"{base}/reverse",
         params={"lat": lat, "lon": lng, "format": "jsonv2"},
         headers={"User-Agent": _USER_AGENT},
-        timeout=10,
     )
     resp.raise_for_status()
     data = resp.json()
+
+    # Nominatim answers {"error": "Unable to geocode"} for open water etc.
+    if data.get("display_name"):
+        cache.put(cache_key, data["display_name"])
+    else:
+        cache.put(
+            cache_key, None, ttl_s=current_app.config["GEOCODE_CACHE_NEGATIVE_TTL_S"]
+        )
     return {
         "address": data.get("display_name", ""),
         "lat": lat,
@@ -0,0 +1,246 @@
+"""Route geometry helpers — polyline encoding and zoom-aware simplification.
+
+Services work with ``[[lat, lng], ...]`` lists, or keep upstream encoded
+polylines as-is until a response needs them. Endpoints can ask for a
+smaller representation with these request fields:
+
+    geometry_format  "raw" (default) or "polyline" (Google encoded, 1e-5)
+    zoom             map zoom the geometry will be drawn at; sets the
+                     simplification tolerance to about one screen pixel
+    tolerance_m      explicit Douglas–Peucker tolerance in metres
+    include_geometry false drops geometry from the response; the services
+                     are then asked not to fetch it at all
+"""
+
+import math
+
+import numpy as np
+
+_M_PER_DEG_LAT = 111_320
+# Web Mercator ground resolution at zoom 0, metres per 256-px-tile pixel
+_M_PER_PX_ZOOM0 = 156_543.03
+_FORMATS = ("raw", "polyline")
+
+
+# ── Encoded polylines ────────────────────────────────────────────────
+
+
+def encode_polyline(coords: list[list[float]], precision: int = 5) -> str:
+    """Encode [[lat, lng], ...] as a Google encoded polyline."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in coords:
+        ilat, ilng = round(lat * factor), round(lng * factor)
+        out.append(_encode_pair(ilat - prev_lat, ilng - prev_lng))
+        prev_lat, prev_lng = ilat, ilng
+    return "".join(out)
+
+
+def _polyline_deltas(encoded: str) -> np.ndarray:
+    """Zigzag-decoded varints of *encoded* as an int64 array (lat/lng interleaved).
+
+    Works on the raw bytes: every char below 0x20 (after the -63 offset)
+    ends a varint, so group sums come from one ``np.add.reduceat``.
+    """
+    if not encoded:
+        return np.empty(0, dtype=np.int64)
+    b = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    ends = np.flatnonzero(b < 0x20)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Position of each char within its varint → its 5-bit shift
+    pos = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((b & 0x1F) << (5 * pos), starts)
+    return np.where(values & 1, ~(values >> 1), values >> 1)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> list[list[float]]:
+    """Decode a Google encoded polyline into [[lat, lng], ...] for Leaflet."""
+    points = np.cumsum(_polyline_deltas(encoded).reshape(-1, 2), axis=0)
+    # Leaflet expects [lat, lng] — NOT GeoJSON [lng, lat]
+    return (points / 10 ** precision).tolist()
+
+
+def _encode_pair(dlat: int, dlng: int) -> str:
+    out = []
+    for delta in (dlat, dlng):
+        value = ~(delta << 1) if delta < 0 else delta << 1
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def _first_pair(encoded: str) -> tuple[int, int, int]:
+    """(lat, lng, chars used) of the first point of *encoded*, in 1e-5 units."""
+    values, index = [], 0
+    while len(values) < 2:
+        shift = value = 0
+        while True:
+            b = ord(encoded[index]) - 63
+            index += 1
+            value |= (b & 0x1F) << shift
+            shift += 5
+            if b < 0x20:
+                break
+        values.append(~(value >> 1) if value & 1 else value >> 1)
+    return values[0], values[1], index
+
+
+def concat_polylines(encoded: list[str]) -> str:
+    """Join encoded polylines end to end without decoding them.
+
+    Only the first point of each following polyline is re-encoded, as a
+    delta from the previous polyline's last point; it is dropped when it
+    repeats that point.
+    """
+    parts = []
+    last = None
+    for enc in encoded:
+        if not enc:
+            continue
+        lat0, lng0, used = _first_pair(enc)
+        if last is None:
+            parts.append(enc)
+        elif (lat0, lng0) == last:
+            parts.append(enc[used:])
+        else:
+            parts.append(_encode_pair(lat0 - last[0], lng0 - last[1]) + enc[used:])
+        end = _polyline_deltas(enc).reshape(-1, 2).sum(axis=0)
+        last = (int(end[0]), int(end[1]))
+    return "".join(parts)
+
+
+# ── Simplification ───────────────────────────────────────────────────
+
+
+def tolerance_for_zoom(zoom: float, lat: float = 0.0) -> float:
+    """Metres covered by one screen pixel at *zoom* and latitude *lat*."""
+    return _M_PER_PX_ZOOM0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def simplify(coords: list[list[float]], tolerance_m: float) -> list[list[float]]:
+    """Douglas–Peucker simplification with a tolerance in metres.
+
+    Points are projected to a local equirectangular plane, which is accurate
+    enough at route scale.
+    """
+    n = len(coords)
+    if n < 3 or tolerance_m <= 0:
+        return coords
+
+    lat0 = math.radians(coords[0][0])
+    kx = _M_PER_DEG_LAT * math.cos(lat0)
+    xs = [c[1] * kx for c in coords]
+    ys = [c[0] * _M_PER_DEG_LAT for c in coords]
+    tol2 = tolerance_m * tolerance_m
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg2 = dx * dx + dy * dy
+
+        max_d2, max_i = -1.0, -1
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2 == 0:
+                d2 = px * px + py * py
+            else:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                ex, ey = px - t * dx, py - t * dy
+                d2 = ex * ex + ey * ey
+            if d2 > max_d2:
+                max_d2, max_i = d2, i
+
+        if max_d2 > tol2:
+            keep[max_i] = True
+            stack.append((first, max_i))
+            stack.append((max_i, last))
+
+    return [c for c, k in zip(coords, keep) if k]
+
+
+# ── Response shaping ─────────────────────────────────────────────────
+
+
+def parse_geometry_options(body: dict) -> dict:
+    """Read geometry_format / zoom / tolerance_m / include_geometry from a body.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    fmt = body.get("geometry_format", "raw")
+    if fmt not in _FORMATS:
+        raise ValueError(f"geometry_format must be one of {', '.join(_FORMATS)}")
+    include = body.get("include_geometry", True)
+    if not isinstance(include, bool):
+        raise ValueError("include_geometry must be true or false")
+
+    options = {"format": fmt, "zoom": None, "tolerance_m": None, "include": include}
+    try:
+        if body.get("zoom") is not None:
+            options["zoom"] = float(body["zoom"])
+            if not 0 <= options["zoom"] <= 22:
+                raise ValueError
+        if body.get("tolerance_m") is not None:
+            options["tolerance_m"] = float(body["tolerance_m"])
+            if options["tolerance_m"] < 0:
+                raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError("zoom must be 0-22 and tolerance_m a non-negative number")
+    return options
+
+
+def shape_geometry(coords, options: dict):
+    """Simplify and/or encode one [[lat, lng], ...] list per *options*."""
+    if not coords or not isinstance(coords, list):
+        return coords
+
+    tolerance = options.get("tolerance_m")
+    if tolerance is None and options.get("zoom") is not None:
+        tolerance = tolerance_for_zoom(options["zoom"], coords[0][0])
+    if tolerance:
+        coords = simplify(coords, tolerance)
+
+    if options.get("format") == "polyline":
+        return encode_polyline(coords)
+    return coords
+
+
+def shape_polyline(encoded: str, options: dict):
+    """Like ``shape_geometry`` for an encoded polyline; decodes only if needed."""
+    if options.get("format") == "polyline" and options.get("zoom") is None \
+            and not options.get("tolerance_m"):
+        return encoded
+    return shape_geometry(decode_polyline(encoded), options)
+
+
+def shape_geometries(data, options: dict):
+    """Apply the geometry options to every geometry nested in *data*.
+
+    "geometry" values are [[lat, lng], ...] lists. Services may instead keep
+    an encoded "polyline" string (see google_transit_service); it is
+    emitted as "geometry" in the requested format. Both are dropped when
+    the options exclude geometry.
+    """
+    if isinstance(data, dict):
+        out = {}
+        for k, v in data.items():
+            if k in ("geometry", "polyline") and not options.get("include", True):
+                continue
+            if k == "polyline" and isinstance(v, str):
+                out["geometry"] = shape_polyline(v, options)
+            elif k == "geometry":
+                out[k] = shape_geometry(v, options)
+            else:
+                out[k] = shape_geometries(v, options)
+        return out
+    if isinstance(data, list):
+        return [shape_geometries(v, options) for v in data]
+    return data
@@ -1,8 +1,24 @@
-"""Google Routes API transit service — real transit routing with accurate walk legs."""
+"""Google Routes API transit service — real transit routing with accurate walk legs.
+
+Results are cached on disk (the "transit" SQLite cache) per origin and
+destination, quantized to TRANSIT_CACHE_PRECISION decimals, and departure
+time bucket (weekday plus TRANSIT_CACHE_BUCKET_MIN slot of the day): the
+same commute at the same time of week costs no further computeRoutes calls
+until TRANSIT_CACHE_TTL_S runs out.
+"""
+
+import copy
+from datetime import datetime, timezone
 
-import requests
 from flask import current_app
 
+from app.services import http_client, metrics
+from app.services.cache import MISSING, get_cache
+from app.services.executor import spawn
+from app.services.geometry import concat_polylines
+from app.services.memo import memoized
+from app.services.singleflight import single_flight
+
 
 def _get_api_key() -> str:
     key = current_app.config.get("GOOGLE_MAPS_API_KEY", "")
@@ -11,15 +27,24 @@ def _get_api_key() -> str:
     return key
 
 
+@memoized
+@metrics.timed
+@single_flight
 def get_transit_route(
     home_lat: float,
     home_lng: float,
     work_lat: float,
     work_lng: float,
+    geometry: bool = True,
+    departure: datetime | None = None,
 ) -> dict | None:
     """
     Call the Google Routes API with travelMode=TRANSIT to get a real
-    transit itinerary, then extract the walking legs.
+    transit itinerary, then extract the walking legs. With
+    ``geometry=False`` step polylines are left out of the field mask.
+    *departure* (timezone-aware) defaults to now. Answers come from the
+    transit cache when the trip has been planned before in the same
+    departure bucket, taken in *departure*'s own offset.
 
     Returns
     -------
@@ -37,8 +62,43 @@ def get_transit_route(
         direct_walk_min: float | None
         direct_walk_km: float | None
     """
+    if departure is not None and departure.tzinfo is None:
+        raise ValueError("departure must be timezone-aware")
+    cache = _transit_cache()
+    key = _transit_key(home_lat, home_lng, work_lat, work_lng, departure)
+    cached = cache.get(key)
+    if cached is MISSING and not geometry:
+        # A summary-only entry is enough
+        cached = cache.get(f"leg:{key}")
+    if cached is not MISSING:
+        return _without_polylines(cached) if cached and not geometry else cached
+
+    result = _fetch_transit_route(
+        home_lat, home_lng, work_lat, work_lng, geometry=geometry, departure=departure
+    )
+    if not geometry:
+        key = f"leg:{key}"
+    if result is None:
+        cache.put(key, None, ttl_s=current_app.config["TRANSIT_CACHE_NEGATIVE_TTL_S"])
+    else:
+        cache.put(key, result)
+    return result
+
+
+def _fetch_transit_route(
+    home_lat: float,
+    home_lng: float,
+    work_lat: float,
+    work_lng: float,
+    geometry: bool = True,
+    departure: datetime | None = None,
+) -> dict | None:
+    """One computeRoutes call, parsed into get_transit_route's result."""
     api_key = _get_api_key()
 
+    # The direct-walk comparison doesn't depend on Google — start it now.
+    direct_task = spawn(_get_direct_walk, home_lat, home_lng, work_lat, work_lng)
+
     url = "https://routes.googleapis.com/directions/v2:computeRoutes"
 
     body = {
@@ -55,24 +115,29 @@ def get_transit_route(
         "travelMode": "TRANSIT",
         "computeAlternativeRoutes": False,
     }
+    if departure is not None:
+        body["departureTime"] = (
+            departure.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+        )
 
     # Field mask controls which fields are returned (and billing tier).
-    # We request step-level detail for walk/transit breakdown.
-    field_mask = ",".join([
+    # We request step-level detail for walk/transit breakdown; only step
+    # polylines are ever drawn, so leg/route polylines are never requested.
+    fields = [
         "routes.legs.steps.travelMode",
         "routes.legs.steps.staticDuration",
         "routes.legs.steps.distanceMeters",
         "routes.legs.steps.startLocation",
         "routes.legs.steps.endLocation",
         "routes.legs.steps.transitDetails",
-        "routes.legs.steps.polyline",
         "routes.legs.duration",
         "routes.legs.distanceMeters",
-        "routes.legs.polyline",
         "routes.distanceMeters",
         "routes.duration",
-        "routes.polyline",
-    ])
+    ]
+    if geometry:
+        fields.append("routes.legs.steps.polyline")
+    field_mask = ",".join(fields)
 
     headers = {
         "Content-Type": "application/json",
@@ -80,145 +145,151 @@ def get_transit_route(
         "X-Goog-FieldMask": field_mask,
     }
 
-    resp = requests.post(url, json=body, headers=headers, timeout=15)
-    resp.raise_for_status()
-    data = resp.json()
-
-    # ── Debug: log raw Google response ──────────────────
-    import json as _json
-    current_app.logger.debug(
-        "Google Routes API raw response:\n%s",
-        _json.dumps(data, indent=2, default=str)[:5000],
-    )
-
-    routes = data.get("routes", [])
-    if not routes:
-        current_app.logger.warning("Google Routes API returned no routes")
-        return None
-
-    route = routes[0]
-    leg = route["legs"][0]
-    steps = leg.get("steps", [])
-
-    # Log step summary
-    for i, s in enumerate(steps):
-        mode = s.get("travelMode", "?")
-        dist = s.get("distanceMeters", 0)
-        dur = s.get("staticDuration", "0s")
-        td = s.get("transitDetails", {})
-        line_name = td.get("transitLine", {}).get("nameShort", "")
-        dep = td.get("stopDetails", {}).get("departureStop", {}).get("name", "")
-        arr = td.get("stopDetails", {}).get("arrivalStop", {}).get("name", "")
-        current_app.logger.info(
-            "  Step %d: %s | %dm | %s%s",
-            i, mode, dist, dur,
-            f" | {line_name}: {dep} → {arr}" if dep else "",
-        )
-
-    # Separate walk and transit steps, preserving order
-    all_steps = []
-    walk_legs = []
-    transit_legs = []
-
-    for step in steps:
-        mode = step.get("travelMode", "")
-        duration_str = step.get("staticDuration", "0s")
-        duration_s = _parse_duration(duration_str)
-        dist_m = step.get("distanceMeters", 0)
-
-        step_info = {
-            "travelMode": mode,
-            "distance_m": dist_m,
-            "distance_km": round(dist_m / 1000, 2),
-            "duration_s": duration_s,
-            "duration_min": round(duration_s / 60, 1),
-            "start": _extract_latlng(step.get("startLocation")),
-            "end": _extract_latlng(step.get("endLocation")),
-        }
-
-        # Decode polyline if present
-        polyline = step.get("polyline", {}).get("encodedPolyline")
-        if polyline:
-            step_info["geometry"] = _decode_polyline(polyline)
-
-        if mode == "WALK":
-            walk_legs.append(step_info)
-        elif mode == "TRANSIT":
-            td = step.get("transitDetails", {})
-            step_info["transit_info"] = _parse_transit_details(td)
-            transit_legs.append(step_info)
-
-        all_steps.append(step_info)
-
-    total_walk_s = sum(w["duration_s"] for w in walk_legs)
-    total_walk_m = sum(w["distance_m"] for w in walk_legs)
-
-    total_dur_str = leg.get("duration") or route.get("duration", "0s")
-    total_dur_s = _parse_duration(total_dur_str)
-    total_dist_m = leg.get("distanceMeters") or route.get("distanceMeters", 0)
-
-    # ── Build home_to_transit / transit_to_work ──────────────────────
-    # Aggregate ALL walk segments before the first transit leg into one
-    # "home_to_transit" leg, and ALL walk segments after the last transit
-    # leg into one "transit_to_work" leg.
-    home_to_transit = None
-    transit_to_work = None
-
-    if transit_legs:
-        # Find index of first and last transit step in the ordered list
-        first_transit_idx = next(
-            i for i, s in enumerate(all_steps) if s.get("travelMode") == "TRANSIT"
-        )
-        last_transit_idx = next(
-            i for i in range(len(all_steps) - 1, -1, -1)
-            if all_steps[i].get("travelMode") == "TRANSIT"
+    # Every exit before the direct walk is collected (no routes, an HTTP
+    # error, a malformed response) drops it if it has not started yet.
+    try:
+        resp = http_client.post("google", url, json=body, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+
+        # ── Debug: log raw Google response ──────────────
+        import json as _json
+        current_app.logger.debug(
+            "Google Routes API raw response:\n%s",
+            _json.dumps(data, indent=2, default=str)[:5000],
         )
 
-        # Walk legs before first transit
-        pre_walks = [s for s in all_steps[:first_transit_idx] if s["travelMode"] == "WALK"]
-        if pre_walks:
-            home_to_transit = _merge_walk_legs(
-                pre_walks,
-                stop_name=_get_stop_name(transit_legs, 0, "start"),
-                stop_type=_get_transit_type(transit_legs, 0),
+        routes = data.get("routes", [])
+        if not routes:
+            current_app.logger.warning("Google Routes API returned no routes")
+            return None
+
+        route = routes[0]
+        leg = route["legs"][0]
+        steps = leg.get("steps", [])
+
+        # Log step summary
+        for i, s in enumerate(steps):
+            mode = s.get("travelMode", "?")
+            dist = s.get("distanceMeters", 0)
+            dur = s.get("staticDuration", "0s")
+            td = s.get("transitDetails", {})
+            line_name = td.get("transitLine", {}).get("nameShort", "")
+            dep = td.get("stopDetails", {}).get("departureStop", {}).get("name", "")
+            arr = td.get("stopDetails", {}).get("arrivalStop", {}).get("name", "")
+            current_app.logger.info(
+                "  Step %d: %s | %dm | %s%s",
+                i, mode, dist, dur,
+                f" | {line_name}: {dep} → {arr}" if dep else "",
             )
 
-        # Walk legs after last transit
-        post_walks = [s for s in all_steps[last_transit_idx + 1:] if s["travelMode"] == "WALK"]
-        if post_walks:
-            transit_to_work = _merge_walk_legs(
-                post_walks,
-                stop_name=_get_stop_name(transit_legs, -1, "end"),
-                stop_type=_get_transit_type(transit_legs, -1),
+        # Separate walk and transit steps, preserving order
+        all_steps = []
+        walk_legs = []
+        transit_legs = []
+
+        for step in steps:
+            mode = step.get("travelMode", "")
+            duration_str = step.get("staticDuration", "0s")
+            duration_s = _parse_duration(duration_str)
+            dist_m = step.get("distanceMeters", 0)
+
+            step_info = {
+                "travelMode": mode,
+                "distance_m": dist_m,
+                "distance_km": round(dist_m / 1000, 2),
+                "duration_s": duration_s,
+                "duration_min": round(duration_s / 60, 1),
+                "start": _extract_latlng(step.get("startLocation")),
+                "end": _extract_latlng(step.get("endLocation")),
+            }
+
+            # Keep the polyline encoded; endpoints decode it only if the client
+            # wants raw geometry (see geometry.shape_geometries)
+            polyline = step.get("polyline", {}).get("encodedPolyline")
+            if polyline:
+                step_info["polyline"] = polyline
+
+            if mode == "WALK":
+                walk_legs.append(step_info)
+            elif mode == "TRANSIT":
+                td = step.get("transitDetails", {})
+                step_info["transit_info"] = _parse_transit_details(td)
+                transit_legs.append(step_info)
+
+            all_steps.append(step_info)
+
+        total_walk_s = sum(w["duration_s"] for w in walk_legs)
+        total_walk_m = sum(w["distance_m"] for w in walk_legs)
+
+        total_dur_str = leg.get("duration") or route.get("duration", "0s")
+        total_dur_s = _parse_duration(total_dur_str)
+        total_dist_m = leg.get("distanceMeters") or route.get("distanceMeters", 0)
+
+        # ── Build home_to_transit / transit_to_work ──────────────────
+        # Aggregate ALL walk segments before the first transit leg into one
+        # "home_to_transit" leg, and ALL walk segments after the last transit
+        # leg into one "transit_to_work" leg.
+        home_to_transit = None
+        transit_to_work = None
+
+        if transit_legs:
+            # Find index of first and last transit step in the ordered list
+            first_transit_idx = next(
+                i for i, s in enumerate(all_steps) if s.get("travelMode") == "TRANSIT"
+            )
+            last_transit_idx = next(
+                i for i in range(len(all_steps) - 1, -1, -1)
+                if all_steps[i].get("travelMode") == "TRANSIT"
             )
 
-        # Walk legs BETWEEN transit legs (transfers)
-        transfer_walks = []
-        transit_indices = [
-            i for i, s in enumerate(all_steps) if s.get("travelMode") == "TRANSIT"
-        ]
-        for ti in range(len(transit_indices) - 1):
-            start_idx = transit_indices[ti] + 1
-            end_idx = transit_indices[ti + 1]
-            mid_walks = [s for s in all_steps[start_idx:end_idx] if s["travelMode"] == "WALK"]
-            if mid_walks:
-                from_stop = _get_stop_name(transit_legs, ti, "end")
-                to_stop = _get_stop_name(transit_legs, ti + 1, "start")
-                transfer_walks.append(_merge_walk_legs(
-                    mid_walks,
-                    stop_name=f"{from_stop} → {to_stop}",
-                    stop_type="transfer",
-                ))
-    elif walk_legs:
-        # All-walk route (no transit legs)
-        home_to_transit = _merge_walk_legs(
-            walk_legs,
-            stop_name="Destination",
-            stop_type="walk",
-        )
+            # Walk legs before first transit
+            pre_walks = [s for s in all_steps[:first_transit_idx] if s["travelMode"] == "WALK"]
+            if pre_walks:
+                home_to_transit = _merge_walk_legs(
+                    pre_walks,
+                    stop_name=_get_stop_name(transit_legs, 0, "start"),
+                    stop_type=_get_transit_type(transit_legs, 0),
+                )
+
+            # Walk legs after last transit
+            post_walks = [s for s in all_steps[last_transit_idx + 1:] if s["travelMode"] == "WALK"]
+            if post_walks:
+                transit_to_work = _merge_walk_legs(
+                    post_walks,
+                    stop_name=_get_stop_name(transit_legs, -1, "end"),
+                    stop_type=_get_transit_type(transit_legs, -1),
+                )
+
+            # Walk legs BETWEEN transit legs (transfers)
+            transfer_walks = []
+            transit_indices = [
+                i for i, s in enumerate(all_steps) if s.get("travelMode") == "TRANSIT"
+            ]
+            for ti in range(len(transit_indices) - 1):
+                start_idx = transit_indices[ti] + 1
+                end_idx = transit_indices[ti + 1]
+                mid_walks = [s for s in all_steps[start_idx:end_idx] if s["travelMode"] == "WALK"]
+                if mid_walks:
+                    from_stop = _get_stop_name(transit_legs, ti, "end")
+                    to_stop = _get_stop_name(transit_legs, ti + 1, "start")
+                    transfer_walks.append(_merge_walk_legs(
+                        mid_walks,
+                        stop_name=f"{from_stop} → {to_stop}",
+                        stop_type="transfer",
+                    ))
+        elif walk_legs:
+            # All-walk route (no transit legs)
+            home_to_transit = _merge_walk_legs(
+                walk_legs,
+                stop_name="Destination",
+                stop_type="walk",
+            )
 
-    # Also get a direct-walk estimate for comparison
-    direct_walk = _get_direct_walk(home_lat, home_lng, work_lat, work_lng)
+        # Direct-walk estimate for comparison (started above)
+        direct_walk = direct_task.result()
+    finally:
+        direct_task.cancel()
 
     result = {
         "mode": "transit" if transit_legs else "direct_walk",
@@ -241,30 +312,74 @@ def get_transit_route(
     return result
 
 
+# ── Transit cache ────────────────────────────────────────────────────
+#
+# Unlike walking routes, transit is directional and depends on the time of
+# week, so keys are (origin, destination, bucket). Entries with step
+# polylines also answer geometry-less requests; summary-only entries are
+# stored under a "leg:" prefix.
+
+
+def _transit_cache():
+    cfg = current_app.config
+    return get_cache(
+        "transit",
+        max_entries=cfg["TRANSIT_CACHE_MAX_ENTRIES"],
+        ttl_s=cfg["TRANSIT_CACHE_TTL_S"],
+    )
+
+
+def _departure_bucket(departure: datetime | None) -> str:
+    """Weekday and slot of the day, e.g. "d0s34" (Monday 08:30 with 15-min slots).
+
+    An aware *departure* is bucketed in its own offset (the caller's local
+    time at the origin); "now" in the server's.
+    """
+    local = departure if departure is not None else datetime.now().astimezone()
+    slot_min = max(1, current_app.config["TRANSIT_CACHE_BUCKET_MIN"])
+    return f"d{local.weekday()}s{(local.hour * 60 + local.minute) // slot_min}"
+
+
+def _transit_key(
+    home_lat: float, home_lng: float, work_lat: float, work_lng: float,
+    departure: datetime | None,
+) -> str:
+    p = current_app.config["TRANSIT_CACHE_PRECISION"]
+    return (
+        f"{round(home_lat, p)},{round(home_lng, p)}:{round(work_lat, p)},{round(work_lng, p)}"
+        f":{_departure_bucket(departure)}"
+    )
+
+
+def _without_polylines(result: dict) -> dict:
+    """Copy of a cached result with every step / walk-leg polyline dropped."""
+    out = copy.deepcopy(result)
+    legs = [out.get("home_to_transit"), out.get("transit_to_work")]
+    legs += out.get("transfer_walks", []) + out.get("walk_legs", []) + out.get("transit_legs", [])
+    for leg in legs:
+        if leg:
+            leg.pop("polyline", None)
+    return out
+
+
 # ── Helpers ──────────────────────────────────────────────────────────
 
 
 def _merge_walk_legs(legs: list[dict], stop_name: str, stop_type: str) -> dict:
     """Merge multiple consecutive walk-leg dicts into one combined leg.
 
-    Concatenates geometries, sums distances/durations.
+    Concatenates the encoded polylines (without decoding them; duplicate
+    join-points are dropped) and sums distances/durations.
     """
     total_m = sum(l["distance_m"] for l in legs)
     total_s = sum(l["duration_s"] for l in legs)
-    merged_geom = []
-    for l in legs:
-        geom = l.get("geometry", [])
-        # Avoid duplicate join-points when concatenating
-        if merged_geom and geom and merged_geom[-1] == geom[0]:
-            geom = geom[1:]
-        merged_geom.extend(geom)
 
     return {
         "stop_name": stop_name,
         "stop_type": stop_type,
         "distance_km": round(total_m / 1000, 2),
         "duration_min": round(total_s / 60, 1),
-        "geometry": merged_geom,
+        "polyline": concat_polylines([l.get("polyline", "") for l in legs]),
     }
 
 
@@ -328,50 +443,12 @@ def _parse_transit_details(td: dict) -> dict:
     }
 
 
-def _decode_polyline(encoded: str) -> list[list[float]]:
-    """Decode a Google encoded polyline into [[lat, lng], ...] for Leaflet."""
-    result = []
-    index = 0
-    lat = 0
-    lng = 0
-
-    while index < len(encoded):
-        # Latitude
-        shift = 0
-        value = 0
-        while True:
-            b = ord(encoded[index]) - 63
-            index += 1
-            value |= (b & 0x1F) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        lat += (~(value >> 1) if (value & 1) else (value >> 1))
-
-        # Longitude
-        shift = 0
-        value = 0
-        while True:
-            b = ord(encoded[index]) - 63
-            index += 1
-            value |= (b & 0x1F) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        lng += (~(value >> 1) if (value & 1) else (value >> 1))
-
-        # Leaflet expects [lat, lng] — NOT GeoJSON [lng, lat]
-        result.append([lat / 1e5, lng / 1e5])
-
-    return result
-
-
 def _get_direct_walk(
     home_lat: float, home_lng: float, work_lat: float, work_lng: float
 ) -> dict | None:
     """Get direct walk route for comparison (reuse existing routing service)."""
     try:
         from app.services.routing_service import get_walking_route
-        return get_walking_route(home_lat, home_lng, work_lat, work_lng)
+        return get_walking_route(home_lat, home_lng, work_lat, work_lng, geometry=False)
     except Exception:
         return None
@@ -0,0 +1,62 @@
+"""Lat/lng grid cells — the shared layout of the local spatial indexes.
+
+poi_index, stop_index and walk_graph (each with its own cell size) sort
+their items by packed cell key and keep the sorted distinct keys plus, per
+key, where its slice of items starts (with one final end offset). A radius
+query then reads one contiguous key range per grid row.
+"""
+
+import math
+
+import numpy as np
+
+M_PER_DEG_LAT = 111_320
+
+
+def pack(cy, cx):
+    """Sortable key of cell (row *cy*, column *cx*); ints or int64 arrays."""
+    # Offset so both halves are non-negative, then pack into one int.
+    return ((cy + (1 << 20)) << 22) | (cx + (1 << 21))
+
+
+def cell_of(lat: float, lng: float, cell_deg: float) -> tuple[int, int]:
+    """(row, column) of the cell containing (lat, lng)."""
+    return math.floor(lat / cell_deg), math.floor(lng / cell_deg)
+
+
+def cell_keys(lat, lng, cell_deg: float) -> np.ndarray:
+    """Packed cell keys of coordinate arrays."""
+    cy = np.floor(np.asarray(lat) / cell_deg).astype(np.int64)
+    cx = np.floor(np.asarray(lng) / cell_deg).astype(np.int64)
+    return pack(cy, cx)
+
+
+def cell_m(lat: float, cell_deg: float) -> float:
+    """Width in metres of a cell at *lat* (the shorter side)."""
+    return cell_deg * M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01)
+
+
+def box_cells(lat: float, lng: float, radius_m: float, cell_deg: float) -> tuple[int, int, int, int]:
+    """(first row, last row, first column, last column) covering *radius_m* around a point."""
+    dlat = radius_m / M_PER_DEG_LAT
+    dlng = radius_m / (M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    y0, x0 = cell_of(lat - dlat, lng - dlng, cell_deg)
+    y1, x1 = cell_of(lat + dlat, lng + dlng, cell_deg)
+    return y0, y1, x0, x1
+
+
+def items_near(
+    keys: np.ndarray, starts: np.ndarray, lat: float, lng: float, radius_m: float, cell_deg: float
+) -> np.ndarray:
+    """Positions of the items in every cell of box_cells (not distance-filtered)."""
+    y0, y1, x0, x1 = box_cells(lat, lng, radius_m, cell_deg)
+    rows = np.arange(y0, y1 + 1, dtype=np.int64)
+    lo = np.searchsorted(keys, pack(rows, x0))
+    hi = np.searchsorted(keys, pack(rows, x1), side="right")
+    spans = [
+        np.arange(starts[a], starts[b])
+        for a, b in zip(lo.tolist(), hi.tolist()) if a < b
+    ]
+    if not spans:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(spans)
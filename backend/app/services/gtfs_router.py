@@ -0,0 +1,776 @@
+"""Local transit router — earliest-arrival commutes from agency GTFS feeds.
+
+``flask build-gtfs-timetable <feed.zip> ...`` compiles one or more GTFS
+feeds into a compact timetable at GTFS_TIMETABLE_PATH. When it exists,
+get_commute_walk_legs plans commutes with it (after Google, before the
+nearest-stop heuristic), so itineraries use stops that really share a
+route, with no API calls.
+
+Timetable layout: trips with the same route and stop sequence form a
+*pattern*; a pattern's trips are sorted by departure and their times are
+stored row-major (trip × stop) as int32 seconds. Every variable-length
+table is flat, indexed by an offsets array (``pattern_stops`` from
+``pattern_stop_start``, the times from ``pattern_time_start``, the
+(pattern, position) pairs serving each stop from ``stop_pattern_start``,
+the stops within GTFS_TRANSFER_M on foot from ``transfer_start``), so the
+whole timetable is a set of numpy arrays saved as an .npz and loaded with
+allow_pickle=False.
+
+Queries run RAPTOR (round-based public transit routing): round k finds
+the earliest arrival at every stop using at most k vehicles, scanning each
+pattern touched by the previous round once. Access and egress walks come
+from one one-to-many walking search around home and work (see
+get_walking_routes).
+"""
+
+import bisect
+import csv
+import io
+import math
+import os
+import threading
+import zipfile
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from flask import current_app
+
+from app.services import metrics
+from app.services.amenities_service import _haversine, haversine_many, nearest_order
+
+_FORMAT_VERSION = 2
+_M_PER_DEG_LAT = 111_320
+# Transfers between nearby stops: straight-line distance × this detour factor
+_TRANSFER_CIRCUITY = 1.3
+
+# GTFS route_type → vehicle type (as reported by Google's transit_info["type"])
+_ROUTE_TYPES = {
+    0: "tram", 1: "subway", 2: "rail", 3: "bus", 4: "ferry",
+    5: "cable_car", 6: "gondola_lift", 7: "funicular", 11: "trolleybus", 12: "monorail",
+}
+# Extended route types, by hundreds
+_EXTENDED_ROUTE_TYPES = {
+    1: "rail", 2: "bus", 4: "subway", 7: "bus", 8: "trolleybus",
+    9: "tram", 10: "ferry", 12: "ferry", 13: "gondola_lift", 14: "funicular",
+}
+
+
+def _vehicle_type(route_type: int) -> str:
+    if route_type in _ROUTE_TYPES:
+        return _ROUTE_TYPES[route_type]
+    return _EXTENDED_ROUTE_TYPES.get(route_type // 100, "transit")
+
+
+# Array fields of a Timetable, as stored in the .npz (see module docstring)
+_ARRAYS = (
+    "stop_names", "stop_lat", "stop_lng",
+    "route_short_name", "route_long_name", "route_type", "route_agency",
+    "pattern_route", "pattern_headsign",
+    "pattern_stop_start", "pattern_stops",
+    "pattern_time_start", "pattern_arr", "pattern_dep",
+    "pattern_trip_start", "pattern_service",
+    "stop_pattern_start", "stop_pattern", "stop_pattern_pos",
+    "transfer_start", "transfer_stop", "transfer_s",
+    "service_days", "service_start", "service_end",
+    "exception_service", "exception_date", "exception_added",
+)
+
+
+class Timetable:
+    """Compiled GTFS timetable (see module docstring)."""
+
+    def __init__(self, data: dict):
+        self.timezone: str = str(data["timezone"])
+        for name in _ARRAYS:
+            setattr(self, name, data[name])
+        # Memoryviews over the arrays the search loops index element by
+        # element: they return Python ints (fast) without copying to lists
+        self._pattern_stop_start = memoryview(self.pattern_stop_start)
+        self._pattern_stops = memoryview(self.pattern_stops)
+        self._pattern_time_start = memoryview(self.pattern_time_start)
+        self._pattern_arr = memoryview(self.pattern_arr)
+        self._pattern_dep = memoryview(self.pattern_dep)
+        self._pattern_trip_start = memoryview(self.pattern_trip_start)
+        self._pattern_service = memoryview(self.pattern_service)
+        self._stop_pattern_start = memoryview(self.stop_pattern_start)
+        self._stop_pattern = memoryview(self.stop_pattern)
+        self._stop_pattern_pos = memoryview(self.stop_pattern_pos)
+        self._transfer_start = memoryview(self.transfer_start)
+        self._transfer_stop = memoryview(self.transfer_stop)
+        self._transfer_s = memoryview(self.transfer_s)
+
+    def __len__(self) -> int:
+        return len(self.stop_names)
+
+    def pattern_count(self) -> int:
+        return len(self.pattern_route)
+
+    def stops(self, p: int) -> memoryview:
+        """Stops of pattern *p*, in order."""
+        starts = self._pattern_stop_start
+        return self._pattern_stops[starts[p]:starts[p + 1]]
+
+    def times(self, p: int) -> tuple[memoryview, memoryview]:
+        """(arrivals, departures) of pattern *p*, row-major trip × stop."""
+        starts = self._pattern_time_start
+        a, b = starts[p], starts[p + 1]
+        return self._pattern_arr[a:b], self._pattern_dep[a:b]
+
+    def trip_services(self, p: int) -> memoryview:
+        """Service of each trip of pattern *p*, in departure order."""
+        starts = self._pattern_trip_start
+        return self._pattern_service[starts[p]:starts[p + 1]]
+
+    def route(self, p: int) -> dict:
+        """Names, GTFS route_type and agency of pattern *p*'s route."""
+        r = int(self.pattern_route[p])
+        return {
+            "short_name": str(self.route_short_name[r]),
+            "long_name": str(self.route_long_name[r]),
+            "type": int(self.route_type[r]),
+            "agency": str(self.route_agency[r]),
+        }
+
+    def stop_name(self, s: int) -> str:
+        return str(self.stop_names[s])
+
+    # ── Persistence ─────────────────────────────────────────────────
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            version=np.array(_FORMAT_VERSION),
+            timezone=np.array(self.timezone),
+            **{name: getattr(self, name) for name in _ARRAYS},
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Timetable":
+        with np.load(path, allow_pickle=False) as f:
+            data = {k: f[k] for k in f.files}
+        if "version" not in data or int(data.pop("version")) != _FORMAT_VERSION:
+            raise ValueError(f"{path} was built by an incompatible version; rebuild it")
+        return cls(data)
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    def active_services(self, day: date) -> set[int]:
+        """Indexes of the services running on *day* (calendar + calendar_dates)."""
+        ymd = int(day.strftime("%Y%m%d"))
+        bit = 1 << day.weekday()
+        running = (
+            (self.service_days & bit).astype(bool)
+            & (self.service_start <= ymd) & (ymd <= self.service_end)
+        )
+        today = self.exception_date == ymd
+        running[self.exception_service[today & self.exception_added]] = True
+        running[self.exception_service[today & ~self.exception_added]] = False
+        return set(np.flatnonzero(running).tolist())
+
+    def stops_near(self, lat: float, lng: float, radius_m: float, limit: int) -> list[int]:
+        """The nearest *limit* stops within *radius_m* of (lat, lng)."""
+        dists = haversine_many(lat, lng, self.stop_lat, self.stop_lng)
+        order = nearest_order(dists, limit)
+        return [int(s) for s in order if dists[s] <= radius_m]
+
+    def _earliest_trip(self, p: int, pos: int, t: float, active: set[int]) -> int:
+        """First running trip of pattern *p* leaving position *pos* at or after *t*, or -1."""
+        _, dep = self.times(p)
+        n = len(self.stops(p))
+        services = self.trip_services(p)
+        lo, hi = 0, len(services)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if dep[mid * n + pos] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < len(services) and services[lo] not in active:
+            lo += 1
+        return lo if lo < len(services) else -1
+
+    def raptor(
+        self,
+        access: dict[int, float],
+        egress: dict[int, float],
+        depart_s: float,
+        active: set[int],
+        max_rides: int,
+        min_transfer_s: float,
+    ) -> list[tuple] | None:
+        """Earliest-arrival journey as a list of legs, or None.
+
+        *access* / *egress* map stop → walking seconds from home / to work.
+        Legs are ("walk", from_stop | None, to_stop | None, seconds) and
+        ("ride", pattern, trip, board_pos, alight_pos); ties in arrival
+        time go to the journey with fewer rides.
+        """
+        inf = math.inf
+        stop_start = self._pattern_stop_start
+        stop_pattern_start = self._stop_pattern_start
+        stop_pattern, stop_pattern_pos = self._stop_pattern, self._stop_pattern_pos
+        transfer_start = self._transfer_start
+        transfer_stop, transfer_s = self._transfer_stop, self._transfer_s
+        best: dict[int, float] = {}
+        labels: list[dict[int, float]] = [{}]
+        parents: list[dict[int, tuple]] = [{}]
+        for s, walk_s in access.items():
+            labels[0][s] = best[s] = depart_s + walk_s
+            parents[0][s] = ("access", walk_s)
+        marked = set(access)
+        target, target_at = inf, None
+
+        for k in range(1, max_rides + 1):
+            prev = labels[k - 1]
+            cur, par = dict(prev), {}
+            slack = min_transfer_s if k > 1 else 0
+
+            queue: dict[int, int] = {}
+            for s in marked:
+                for j in range(stop_pattern_start[s], stop_pattern_start[s + 1]):
+                    p, pos = stop_pattern[j], stop_pattern_pos[j]
+                    if pos < queue.get(p, stop_start[p + 1] - stop_start[p]):
+                        queue[p] = pos
+
+            ridden = set()
+            for p, start in queue.items():
+                stops = self.stops(p)
+                n = len(stops)
+                arr, dep = self.times(p)
+                trip, board = -1, -1
+                for i in range(start, n):
+                    s = stops[i]
+                    if trip >= 0:
+                        a = arr[trip * n + i]
+                        if a < best.get(s, inf) and a < target:
+                            cur[s] = best[s] = a
+                            par[s] = ("ride", p, trip, board, i)
+                            ridden.add(s)
+                    t_prev = prev.get(s)
+                    if t_prev is not None and (trip < 0 or t_prev + slack <= dep[trip * n + i]):
+                        t = self._earliest_trip(p, i, t_prev + slack, active)
+                        if t >= 0 and (trip < 0 or dep[t * n + i] < dep[trip * n + i]):
+                            trip, board = t, i
+
+            # Footpaths from every stop reached by a vehicle this round
+            marked = set(ridden)
+            for s in ridden:
+                for j in range(transfer_start[s], transfer_start[s + 1]):
+                    s2, walk_s = transfer_stop[j], transfer_s[j]
+                    t = cur[s] + walk_s
+                    if t < best.get(s2, inf) and t < target:
+                        cur[s2] = best[s2] = t
+                        par[s2] = ("walk", s, walk_s)
+                        marked.add(s2)
+            labels.append(cur)
+            parents.append(par)
+
+            for s, walk_s in egress.items():
+                if s in par and cur[s] + walk_s < target:
+                    target, target_at = cur[s] + walk_s, (k, s)
+            if not marked:
+                break
+
+        if target_at is None:
+            return None
+        return self._journey(parents, *target_at, egress[target_at[1]])
+
+    def _journey(self, parents: list[dict], k: int, stop: int, egress_s: float) -> list[tuple]:
+        legs = [("walk", stop, None, egress_s)]
+        s = stop
+        while True:
+            while s not in parents[k]:
+                k -= 1
+            label = parents[k][s]
+            if label[0] == "access":
+                legs.append(("walk", None, s, label[1]))
+                break
+            if label[0] == "walk":
+                legs.append(("walk", label[1], s, label[2]))
+                s = label[1]
+            else:
+                _, p, trip, board, alight = label
+                legs.append(("ride", p, trip, board, alight))
+                s = self.stops(p)[board]
+                k -= 1
+        legs.reverse()
+        return legs
+
+
+# ── Commute planning ─────────────────────────────────────────────────
+
+
+@metrics.timed
+def plan_commute(
+    home_lat: float,
+    home_lng: float,
+    work_lat: float,
+    work_lng: float,
+    geometry: bool = True,
+    departure: datetime | None = None,
+) -> dict | None:
+    """Earliest-arrival transit commute from the local timetable.
+
+    *departure* is a local time in the feed's timezone if naive, converted
+    to it otherwise (default: the next weekday at GTFS_DEFAULT_DEPARTURE).
+    Returns the structure of
+    google_transit_service.get_transit_route with source "gtfs_raptor", or
+    None if the timetable has no stops near home or work.
+    """
+    from app.services.routing_service import get_walking_route, get_walking_routes
+
+    cfg = current_app.config
+    tt = get_timetable()
+    if tt is None:
+        return None
+    if departure is None:
+        departure = _default_departure(tt)
+    elif departure.tzinfo is not None:
+        departure = _feed_time(tt, departure)
+    depart_s = (departure - datetime.combine(departure.date(), time())).total_seconds()
+
+    radius, limit = cfg["GTFS_ACCESS_M"], cfg["GTFS_ACCESS_MAX_STOPS"]
+    home_stops = tt.stops_near(home_lat, home_lng, radius, limit)
+    work_stops = tt.stops_near(work_lat, work_lng, radius, limit)
+    if not home_stops or not work_stops:
+        return None
+
+    def stop_coords(stops):
+        return [(float(tt.stop_lat[s]), float(tt.stop_lng[s])) for s in stops]
+
+    # One walking search from each end, plus the direct walk for comparison
+    home_walks = get_walking_routes(
+        home_lat, home_lng, stop_coords(home_stops) + [(work_lat, work_lng)]
+    )
+    direct = home_walks.pop()
+    work_walks = get_walking_routes(work_lat, work_lng, stop_coords(work_stops))
+    access = {s: w["duration_min"] * 60 for s, w in zip(home_stops, home_walks) if w}
+    egress = {s: w["duration_min"] * 60 for s, w in zip(work_stops, work_walks) if w}
+    walks = {
+        **{("home", s): w for s, w in zip(home_stops, home_walks) if w},
+        **{("work", s): w for s, w in zip(work_stops, work_walks) if w},
+    }
+
+    legs = None
+    if access and egress:
+        legs = tt.raptor(
+            access, egress, depart_s, tt.active_services(departure.date()),
+            max_rides=cfg["GTFS_MAX_TRANSFERS"] + 1,
+            min_transfer_s=cfg["GTFS_MIN_TRANSFER_S"],
+        )
+
+    direct_info = {}
+    if direct:
+        direct_info = {"direct_walk_min": direct["duration_min"],
+                       "direct_walk_km": direct["distance_km"]}
+    rides = [leg for leg in legs or [] if leg[0] == "ride"]
+    if not rides or (direct and direct["duration_min"] * 60 <= _door_to_door_s(tt, legs)):
+        if not direct:
+            return None
+        return {
+            "mode": "direct_walk",
+            "home_to_transit": None,
+            "transit_to_work": None,
+            "transfer_walks": [],
+            "total_walk_min": direct["duration_min"],
+            "total_walk_km": direct["distance_km"],
+            **direct_info,
+            "source": "gtfs_raptor",
+        }
+
+    result = _itinerary(tt, legs, walks)
+    if geometry:
+        first, last = rides[0], rides[-1]
+        board_stop = tt.stops(first[1])[first[3]]
+        alight_stop = tt.stops(last[1])[last[4]]
+        h2t, t2w = result["home_to_transit"], result["transit_to_work"]
+        h2t["geometry"] = (get_walking_route(
+            home_lat, home_lng, *stop_coords([board_stop])[0]) or {}).get("geometry")
+        t2w["geometry"] = (get_walking_route(
+            *stop_coords([alight_stop])[0], work_lat, work_lng) or {}).get("geometry")
+    return {**result, **direct_info}
+
+
+def _feed_time(tt: Timetable, moment: datetime) -> datetime:
+    """Aware *moment* as naive wall-clock time in the feed's timezone."""
+    try:
+        from zoneinfo import ZoneInfo
+        return moment.astimezone(ZoneInfo(tt.timezone)).replace(tzinfo=None)
+    except Exception:
+        return moment.astimezone().replace(tzinfo=None)
+
+
+def _default_departure(tt: Timetable) -> datetime:
+    """The next weekday (today included) at GTFS_DEFAULT_DEPARTURE, feed-local."""
+    now = _feed_time(tt, datetime.now().astimezone())
+    hh, mm = (int(v) for v in current_app.config["GTFS_DEFAULT_DEPARTURE"].split(":"))
+    day = now.date()
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, time(hh, mm))
+
+
+def _door_to_door_s(tt: Timetable, legs: list[tuple]) -> float:
+    """Seconds from leaving home (just in time) to arriving at work."""
+    first = next(i for i, leg in enumerate(legs) if leg[0] == "ride")
+    last = max(i for i, leg in enumerate(legs) if leg[0] == "ride")
+    _, p, trip, board, _ = legs[first]
+    _, q, trip2, _, alight = legs[last]
+    n_p, n_q = len(tt.stops(p)), len(tt.stops(q))
+    leave = tt.times(p)[1][trip * n_p + board] - sum(l[3] for l in legs[:first])
+    arrive = tt.times(q)[0][trip2 * n_q + alight] + sum(l[3] for l in legs[last + 1:])
+    return arrive - leave
+
+
+def _itinerary(tt: Timetable, legs: list[tuple], walks: dict) -> dict:
+    """get_transit_route-shaped dict for a RAPTOR journey."""
+    walk_legs, transit_legs, transfer_walks = [], [], []
+    home_to_transit = transit_to_work = None
+    ride_km = 0.0
+    for i, leg in enumerate(legs):
+        if leg[0] == "ride":
+            _, p, trip, board, alight = leg
+            stops = tt.stops(p)
+            n = len(stops)
+            route = tt.route(p)
+            arrs, deps = tt.times(p)
+            dep, arr = deps[trip * n + board], arrs[trip * n + alight]
+            ride_km += sum(
+                _haversine(tt.stop_lat[a], tt.stop_lng[a], tt.stop_lat[b], tt.stop_lng[b])
+                for a, b in zip(stops[board:alight], stops[board + 1:alight + 1])
+            ) / 1000
+            transit_legs.append({
+                "travelMode": "TRANSIT",
+                "duration_min": round((arr - dep) / 60, 1),
+                "departure_time": _clock(dep),
+                "arrival_time": _clock(arr),
+                "transit_info": {
+                    "departure_stop": tt.stop_name(stops[board]),
+                    "arrival_stop": tt.stop_name(stops[alight]),
+                    "line_name": route["long_name"],
+                    "line_short_name": route["short_name"],
+                    "type": _vehicle_type(route["type"]),
+                    "agency": route["agency"],
+                    "headsign": str(tt.pattern_headsign[p]),
+                    "num_stops": alight - board,
+                },
+            })
+            continue
+
+        _, from_stop, to_stop, walk_s = leg
+        if from_stop is None:
+            known = walks[("home", to_stop)]
+        elif to_stop is None:
+            known = walks[("work", from_stop)]
+        else:
+            straight = _haversine(tt.stop_lat[from_stop], tt.stop_lng[from_stop],
+                                  tt.stop_lat[to_stop], tt.stop_lng[to_stop])
+            known = {"distance_km": round(straight * _TRANSFER_CIRCUITY / 1000, 2),
+                     "duration_min": round(walk_s / 60, 1)}
+        walk = {"travelMode": "WALK", "distance_km": known["distance_km"],
+                "duration_min": known["duration_min"]}
+        walk_legs.append(walk)
+
+        ride_before = next((l for l in reversed(legs[:i]) if l[0] == "ride"), None)
+        ride_after = next((l for l in legs[i + 1:] if l[0] == "ride"), None)
+        if from_stop is None:
+            home_to_transit = {**_walk_summary(walk, tt, ride_after, "board")}
+        elif to_stop is None:
+            transit_to_work = {**_walk_summary(walk, tt, ride_before, "alight")}
+        else:
+            transfer_walks.append({
+                "stop_name": f"{tt.stop_name(from_stop)} → {tt.stop_name(to_stop)}",
+                "stop_type": "transfer",
+                "distance_km": walk["distance_km"],
+                "duration_min": walk["duration_min"],
+            })
+
+    total_walk_min = sum(w["duration_min"] for w in walk_legs)
+    total_walk_km = sum(w["distance_km"] for w in walk_legs)
+    return {
+        "mode": "transit",
+        "home_to_transit": home_to_transit,
+        "transit_to_work": transit_to_work,
+        "transfer_walks": transfer_walks,
+        "total_walk_min": round(total_walk_min, 1),
+        "total_walk_km": round(total_walk_km, 2),
+        "total_duration_min": round(_door_to_door_s(tt, legs) / 60, 1),
+        "total_distance_km": round(total_walk_km + ride_km, 2),
+        "walk_legs": walk_legs,
+        "transit_legs": transit_legs,
+        "source": "gtfs_raptor",
+    }
+
+
+def _walk_summary(walk: dict, tt: Timetable, ride: tuple, end: str) -> dict:
+    """home_to_transit / transit_to_work entry for a walk next to *ride*."""
+    _, p, _, board, alight = ride
+    stop = tt.stops(p)[board if end == "board" else alight]
+    return {
+        "stop_name": tt.stop_name(stop),
+        "stop_type": _vehicle_type(tt.route(p)["type"]),
+        "distance_km": walk["distance_km"],
+        "duration_min": walk["duration_min"],
+    }
+
+
+def _clock(seconds: int) -> str:
+    """GTFS seconds after midnight as HH:MM (hours may exceed 24)."""
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+# ── Process-wide timetable ───────────────────────────────────────────
+
+_timetable: Timetable | None = None
+_timetable_mtime: float | None = None
+_timetable_lock = threading.Lock()
+
+
+def get_timetable() -> Timetable | None:
+    """The timetable at GTFS_TIMETABLE_PATH (reloaded when the file changes), or None."""
+    global _timetable, _timetable_mtime
+    path = current_app.config["GTFS_TIMETABLE_PATH"]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _timetable_lock:
+        if _timetable is None or mtime != _timetable_mtime:
+            _timetable = Timetable.load(path)
+            _timetable_mtime = mtime
+        return _timetable
+
+
+# ── Ingestion ────────────────────────────────────────────────────────
+
+
+def read_csv(feed: zipfile.ZipFile, name: str) -> list[dict]:
+    """Rows of *name* in a GTFS feed zip as dicts ([] if the feed has no such file)."""
+    try:
+        raw = feed.open(name)
+    except KeyError:
+        return []
+    with io.TextIOWrapper(raw, encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def _parse_time(value: str) -> int | None:
+    """GTFS HH:MM:SS (hours may exceed 24) to seconds, None if blank."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    hh, mm, ss = value.split(":")
+    return int(hh) * 3600 + int(mm) * 60 + int(ss)
+
+
+def _fill_times(times: list[int | None]) -> list[int]:
+    """Interpolate blank (non-timepoint) stop times by position."""
+    known = [i for i, t in enumerate(times) if t is not None]
+    if not known:
+        raise ValueError("trip without any stop times")
+    out = list(times)
+    for i in range(len(out)):
+        if out[i] is not None:
+            continue
+        j = bisect.bisect(known, i)
+        if j == 0:
+            out[i] = times[known[0]]
+        elif j == len(known):
+            out[i] = times[known[-1]]
+        else:
+            a, b = known[j - 1], known[j]
+            out[i] = round(times[a] + (times[b] - times[a]) * (i - a) / (b - a))
+    return out
+
+
+def build_timetable(sources: list[str], transfer_m: float, walk_speed_kmh: float) -> Timetable:
+    """Compile GTFS zip *sources* into one Timetable (ids are namespaced per feed)."""
+    timezone = "UTC"
+    stop_index: dict[str, int] = {}
+    stop_names, stop_lat, stop_lng = [], [], []
+    routes, route_index = [], {}
+    services, service_index = [], {}
+    patterns: dict[tuple, dict] = {}
+
+    for n, source in enumerate(sources):
+        with zipfile.ZipFile(source) as feed:
+            agencies = read_csv(feed, "agency.txt")
+            if n == 0 and agencies:
+                timezone = agencies[0].get("agency_timezone") or timezone
+            agency_names = {a.get("agency_id", ""): a.get("agency_name", "") for a in agencies}
+            default_agency = agencies[0].get("agency_name", "") if agencies else ""
+
+            for row in read_csv(feed, "stops.txt"):
+                if row.get("location_type", "0") not in ("", "0"):
+                    continue
+                stop_index[f"{n}:{row['stop_id']}"] = len(stop_names)
+                stop_names.append(row.get("stop_name", ""))
+                stop_lat.append(float(row["stop_lat"]))
+                stop_lng.append(float(row["stop_lon"]))
+
+            for row in read_csv(feed, "routes.txt"):
+                route_index[f"{n}:{row['route_id']}"] = len(routes)
+                routes.append({
+                    "short_name": row.get("route_short_name", ""),
+                    "long_name": row.get("route_long_name", ""),
+                    "type": int(row.get("route_type") or 3),
+                    "agency": agency_names.get(row.get("agency_id", ""), default_agency),
+                })
+
+            def service(service_id: str) -> int:
+                key = f"{n}:{service_id}"
+                if key not in service_index:
+                    service_index[key] = len(services)
+                    services.append({"days": 0, "start": 0, "end": 0,
+                                     "added": set(), "removed": set()})
+                return service_index[key]
+
+            weekdays = ("monday", "tuesday", "wednesday", "thursday",
+                        "friday", "saturday", "sunday")
+            for row in read_csv(feed, "calendar.txt"):
+                svc = services[service(row["service_id"])]
+                svc["days"] = sum(1 << i for i, d in enumerate(weekdays) if row.get(d) == "1")
+                svc["start"], svc["end"] = int(row["start_date"]), int(row["end_date"])
+            for row in read_csv(feed, "calendar_dates.txt"):
+                svc = services[service(row["service_id"])]
+                which = "added" if row.get("exception_type") == "1" else "removed"
+                svc[which].add(int(row["date"]))
+
+            trips = {
+                row["trip_id"]: (route_index[f"{n}:{row['route_id']}"],
+                                 service(row["service_id"]), row.get("trip_headsign", ""))
+                for row in read_csv(feed, "trips.txt")
+                if f"{n}:{row['route_id']}" in route_index
+            }
+
+            stop_times: dict[str, list] = {}
+            for row in read_csv(feed, "stop_times.txt"):
+                stop = stop_index.get(f"{n}:{row['stop_id']}")
+                if stop is None or row["trip_id"] not in trips:
+                    continue
+                stop_times.setdefault(row["trip_id"], []).append((
+                    int(row["stop_sequence"]), stop,
+                    _parse_time(row.get("arrival_time")), _parse_time(row.get("departure_time")),
+                ))
+
+        for trip_id, rows in stop_times.items():
+            if len(rows) < 2:
+                continue
+            rows.sort()
+            route, svc, headsign = trips[trip_id]
+            arr = [r[2] if r[2] is not None else r[3] for r in rows]
+            dep = [r[3] if r[3] is not None else r[2] for r in rows]
+            try:
+                arr, dep = _fill_times(arr), _fill_times(dep)
+            except ValueError:
+                continue
+            key = (route, tuple(r[1] for r in rows))
+            pattern = patterns.setdefault(key, {"headsign": headsign, "trips": []})
+            pattern["trips"].append((dep[0], arr, dep, svc))
+
+    pattern_route, pattern_headsign, pattern_stops = [], [], []
+    pattern_arr, pattern_dep, pattern_service = [], [], []
+    stop_patterns: list[list[int]] = [[] for _ in stop_names]
+    stop_positions: list[list[int]] = [[] for _ in stop_names]
+    for p, ((route, stops), pattern) in enumerate(patterns.items()):
+        pattern["trips"].sort(key=lambda t: t[0])
+        pattern_route.append(route)
+        pattern_headsign.append(pattern["headsign"])
+        pattern_stops.append(stops)
+        pattern_arr.append([t for trip in pattern["trips"] for t in trip[1]])
+        pattern_dep.append([t for trip in pattern["trips"] for t in trip[2]])
+        pattern_service.append([trip[3] for trip in pattern["trips"]])
+        for pos, s in enumerate(stops):
+            stop_patterns[s].append(p)
+            stop_positions[s].append(pos)
+
+    exceptions = sorted(
+        (i, d, which == "added")
+        for i, svc in enumerate(services)
+        for which in ("added", "removed")
+        for d in svc[which]
+    )
+    lat = np.array(stop_lat, dtype=np.float64)
+    lng = np.array(stop_lng, dtype=np.float64)
+    transfer_start, transfer_stop, transfer_s = _transfers(lat, lng, transfer_m, walk_speed_kmh)
+    pattern_stop_start, flat_stops = _csr(pattern_stops)
+    pattern_time_start, flat_arr = _csr(pattern_arr)
+    pattern_trip_start, flat_service = _csr(pattern_service)
+    stop_pattern_start, stop_pattern = _csr(stop_patterns)
+    return Timetable({
+        "timezone": timezone,
+        "stop_names": np.array(stop_names, dtype=np.str_),
+        "stop_lat": lat,
+        "stop_lng": lng,
+        "route_short_name": np.array([r["short_name"] for r in routes], dtype=np.str_),
+        "route_long_name": np.array([r["long_name"] for r in routes], dtype=np.str_),
+        "route_type": np.array([r["type"] for r in routes], dtype=np.int32),
+        "route_agency": np.array([r["agency"] for r in routes], dtype=np.str_),
+        "pattern_route": np.array(pattern_route, dtype=np.int32),
+        "pattern_headsign": np.array(pattern_headsign, dtype=np.str_),
+        "pattern_stop_start": pattern_stop_start,
+        "pattern_stops": flat_stops,
+        "pattern_time_start": pattern_time_start,
+        "pattern_arr": flat_arr,
+        "pattern_dep": _csr(pattern_dep)[1],
+        "pattern_trip_start": pattern_trip_start,
+        "pattern_service": flat_service,
+        "stop_pattern_start": stop_pattern_start,
+        "stop_pattern": stop_pattern,
+        "stop_pattern_pos": _csr(stop_positions)[1],
+        "transfer_start": transfer_start,
+        "transfer_stop": transfer_stop,
+        "transfer_s": transfer_s,
+        "service_days": np.array([svc["days"] for svc in services], dtype=np.uint8),
+        "service_start": np.array([svc["start"] for svc in services], dtype=np.int32),
+        "service_end": np.array([svc["end"] for svc in services], dtype=np.int32),
+        "exception_service": np.array([e[0] for e in exceptions], dtype=np.int32),
+        "exception_date": np.array([e[1] for e in exceptions], dtype=np.int32),
+        "exception_added": np.array([e[2] for e in exceptions], dtype=bool),
+    })
+
+
+def _csr(rows: list) -> tuple[np.ndarray, np.ndarray]:
+    """(offsets, flat int32 values) of int sequences; row i is values[offsets[i]:offsets[i + 1]]."""
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(row) for row in rows])
+    return offsets, np.fromiter((v for row in rows for v in row), dtype=np.int32, count=offsets[-1])
+
+
+def _transfers(
+    lat: np.ndarray, lng: np.ndarray, max_m: float, walk_speed_kmh: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(offsets, other stop, walking seconds) per stop, for stops within *max_m*."""
+    order = np.argsort(lat)
+    sorted_lat = lat[order]
+    dlat = max_m / _M_PER_DEG_LAT
+    m_per_s = walk_speed_kmh / 3.6
+    starts = np.zeros(len(lat) + 1, dtype=np.int64)
+    stops, secs = [], []
+    for s in range(len(lat)):
+        lo = np.searchsorted(sorted_lat, lat[s] - dlat)
+        hi = np.searchsorted(sorted_lat, lat[s] + dlat, side="right")
+        near = order[lo:hi]
+        dists = haversine_many(lat[s], lng[s], lat[near], lng[near])
+        keep = (dists <= max_m) & (near != s)
+        stops.append(near[keep])
+        secs.append(np.round(dists[keep] * _TRANSFER_CIRCUITY / m_per_s))
+        starts[s + 1] = starts[s] + int(keep.sum())
+    if not stops:
+        return starts, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    return starts, np.concatenate(stops).astype(np.int32), np.concatenate(secs).astype(np.int32)
+
+
+def build_gtfs_timetable(sources: list[str], output: str) -> Timetable:
+    """Compile GTFS feeds *sources* and write the timetable to *output*."""
+    cfg = current_app.config
+    tt = build_timetable(
+        sources, cfg["GTFS_TRANSFER_M"], cfg.get("WALKING_SPEED_KMH", 5.0)
+    )
+    if not tt.pattern_count():
+        raise ValueError("No trips with at least two known stops in the feeds")
+    tt.save(output)
+    return tt
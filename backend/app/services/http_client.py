@@ -0,0 +1,132 @@
+"""Shared HTTP client — one pooled keep-alive session per upstream.
+
+Every outbound call goes through ``get``/``post`` here, which apply the
+upstream's shared rate limit (rate_limit.acquire), its in-flight request
+cap (UPSTREAM_CONCURRENCY), its default timeout, and one retry/back-off
+policy for 429s, 5xx gateway errors and dropped connections (honouring
+Retry-After when the server sends it). Each attempt, retry and back-off
+is recorded in metrics.py.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from app.services import metrics
+from app.services.rate_limit import acquire
+
+_USER_AGENT = "HackURI-WalkScore/1.0"
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+_sessions: dict[str, requests.Session] = {}
+_slots: dict[str, threading.BoundedSemaphore] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(upstream: str) -> requests.Session:
+    """The process-wide pooled session for *upstream*."""
+    with _sessions_lock:
+        session = _sessions.get(upstream)
+        if session is None:
+            pool_size = current_app.config["HTTP_POOL_SIZE"]
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "User-Agent": _USER_AGENT,
+                "Accept-Encoding": "gzip, deflate",
+            })
+            _sessions[upstream] = session
+        return session
+
+
+def _slot(upstream: str) -> threading.BoundedSemaphore:
+    """Semaphore capping concurrent in-flight requests to *upstream*."""
+    with _sessions_lock:
+        slot = _slots.get(upstream)
+        if slot is None:
+            limit = current_app.config["UPSTREAM_CONCURRENCY"].get(upstream, 8)
+            slot = _slots[upstream] = threading.BoundedSemaphore(limit)
+        return slot
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    value = resp.headers.get("Retry-After", "")
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None  # HTTP-date form — fall back to our own back-off
+
+
+def request(upstream: str, method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request to *upstream*, retrying transient failures.
+
+    Returns the final response (callers still call ``raise_for_status``);
+    raises the last connection error if every attempt failed to connect.
+    """
+    cfg = current_app.config
+    kwargs.setdefault("timeout", cfg["HTTP_TIMEOUTS"].get(upstream, 15))
+    max_attempts = cfg["HTTP_MAX_RETRIES"] + 1
+    backoff = cfg["HTTP_BACKOFF_S"]
+    session = get_session(upstream)
+    slot = _slot(upstream)
+
+    for attempt in range(max_attempts):
+        last = attempt == max_attempts - 1
+        acquire(upstream)
+        queued = time.perf_counter()
+        try:
+            with slot:
+                # Latency below is the upstream's alone; slot queueing is counted apart
+                start = time.perf_counter()
+                metrics.inc("hackuri_slot_wait_seconds_total", start - queued, upstream=upstream)
+                resp = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            metrics.observe(
+                "hackuri_upstream_request_seconds", time.perf_counter() - start,
+                upstream=upstream,
+            )
+            if last:
+                metrics.inc("hackuri_upstream_requests_total", upstream=upstream, status="error")
+                raise
+            current_app.logger.info("%s request failed (%s), retrying", upstream, exc)
+            _count_retry(upstream, "connection", backoff * 2 ** attempt)
+            time.sleep(backoff * 2 ** attempt)
+            continue
+        metrics.observe(
+            "hackuri_upstream_request_seconds", time.perf_counter() - start, upstream=upstream
+        )
+
+        if resp.status_code not in _RETRY_STATUSES or last:
+            metrics.inc(
+                "hackuri_upstream_requests_total", upstream=upstream, status=resp.status_code
+            )
+            return resp
+        wait = _retry_after(resp)
+        if wait is None:
+            wait = backoff * 2 ** attempt
+        current_app.logger.info(
+            "%s returned %d, retrying in %.1fs", upstream, resp.status_code, wait
+        )
+        resp.close()
+        _count_retry(upstream, str(resp.status_code), wait)
+        time.sleep(wait)
+
+    raise AssertionError("unreachable")
+
+
+def _count_retry(upstream: str, reason: str, wait_s: float) -> None:
+    metrics.inc("hackuri_upstream_retries_total", upstream=upstream, reason=reason)
+    metrics.inc("hackuri_upstream_retry_sleep_seconds_total", wait_s, upstream=upstream)
+
+
+def get(upstream: str, url: str, **kwargs) -> requests.Response:
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream: str, url: str, **kwargs) -> requests.Response:
+    return request(upstream, "POST", url, **kwargs)
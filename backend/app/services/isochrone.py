@@ -0,0 +1,167 @@
+"""Walk isochrones — the area reachable on foot within N minutes.
+
+An isochrone is sampled with one walking-table call (see routing_service):
+the walking distance from the centre to ISOCHRONE_RINGS points on each of
+ISOCHRONE_BEARINGS rays, spread out to the straight-line reach of N minutes
+at WALKING_SPEED_KMH. Each sample gives a detour factor (walking ÷
+straight-line distance). The polygon vertex on a ray is where the
+interpolated walking time reaches N minutes, and walk_estimates() applies
+the same factors to any number of points at once, so every candidate POI
+is classified in one vectorized pass instead of one route each.
+
+The samples go through the route cache, so an isochrone around the same
+centre costs no further upstream calls.
+"""
+
+import math
+
+import numpy as np
+from flask import current_app
+
+from app.services import metrics
+from app.services.amenities_service import haversine_many
+from app.services.memo import memoized
+from app.services.routing_service import get_walking_matrix
+
+_M_PER_DEG_LAT = 111_320
+# Resolution of the reach search along each ray
+_RAY_STEPS = 64
+
+
+@memoized
+@metrics.timed
+def get_walk_isochrone(lat: float, lng: float, minutes: float) -> dict:
+    """Walk isochrone of *minutes* around (lat, lng).
+
+    Returns {"center": {"lat", "lng"}, "minutes", "geometry" (closed
+    [[lat, lng], ...] ring), "source", "radii_m", "circuity"}; the last two
+    are numpy arrays for walk_estimates() and are not JSON-serializable.
+    """
+    cfg = current_app.config
+    n_bearings = max(4, cfg["ISOCHRONE_BEARINGS"])
+    n_rings = max(2, cfg["ISOCHRONE_RINGS"])
+    m_per_min = cfg.get("WALKING_SPEED_KMH", 5.0) * 1000 / 60
+
+    radii = minutes * m_per_min * np.arange(1, n_rings + 1) / n_rings
+    bearings = 2 * math.pi * np.arange(n_bearings) / n_bearings
+    kx = _M_PER_DEG_LAT * math.cos(math.radians(lat))
+    samples = [
+        (round(lat + r * math.cos(b) / _M_PER_DEG_LAT, 5),
+         round(lng + r * math.sin(b) / kx, 5))
+        for b in bearings.tolist() for r in radii.tolist()
+    ]
+    legs = get_walking_matrix(lat, lng, samples)
+
+    straight = haversine_many(
+        lat, lng, np.array([s[0] for s in samples]), np.array([s[1] for s in samples])
+    )
+    walk = np.array([leg["distance_km"] * 1000 if leg else np.nan for leg in legs])
+    circuity = (walk / np.maximum(straight, 1.0)).reshape(n_bearings, n_rings)
+    circuity = _fill_unrouted(circuity)
+
+    iso = {
+        "center": {"lat": lat, "lng": lng},
+        "minutes": minutes,
+        "source": next((leg["source"] for leg in legs if leg), None),
+        "radii_m": radii,
+        "circuity": circuity,
+    }
+    iso["geometry"] = _polygon(iso, m_per_min)
+    return iso
+
+
+def walk_estimates(iso: dict, lats, lngs) -> np.ndarray:
+    """Estimated walking metres from the isochrone centre to each point.
+
+    Detour factors are interpolated between the two nearest rays and rings
+    (and held constant beyond the outermost ring); inf where the nearby
+    samples had no route.
+    """
+    c_lat, c_lng = iso["center"]["lat"], iso["center"]["lng"]
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    dist = haversine_many(c_lat, c_lng, lats, lngs)
+
+    kx = _M_PER_DEG_LAT * math.cos(math.radians(c_lat))
+    bearing = np.arctan2((lngs - c_lng) * kx, (lats - c_lat) * _M_PER_DEG_LAT)
+    n_bearings = iso["circuity"].shape[0]
+    pos = (bearing % (2 * math.pi)) / (2 * math.pi) * n_bearings
+    ray0 = np.floor(pos).astype(int) % n_bearings
+    w = pos - np.floor(pos)
+
+    c0 = _ray_circuity(iso, ray0, dist)
+    c1 = _ray_circuity(iso, (ray0 + 1) % n_bearings, dist)
+    with np.errstate(invalid="ignore"):
+        circuity = np.where(w == 0, c0, (1 - w) * c0 + w * c1)
+    return dist * circuity
+
+
+def classify_points(iso: dict, points: list[tuple[float, float]]) -> list[dict]:
+    """{"reachable", "distance_km", "duration_min"} for each (lat, lng) point.
+
+    distance_km / duration_min are None where no estimate exists.
+    """
+    if not points:
+        return []
+    m_per_min = current_app.config.get("WALKING_SPEED_KMH", 5.0) * 1000 / 60
+    walk = walk_estimates(iso, [p[0] for p in points], [p[1] for p in points])
+    out = []
+    for walk_m in walk.tolist():
+        if not math.isfinite(walk_m):
+            out.append({"reachable": False, "distance_km": None, "duration_min": None})
+            continue
+        duration = walk_m / m_per_min
+        out.append({
+            "reachable": duration <= iso["minutes"],
+            "distance_km": round(walk_m / 1000, 2),
+            "duration_min": round(duration, 1),
+        })
+    return out
+
+
+def _fill_unrouted(circuity: np.ndarray) -> np.ndarray:
+    """Replace unrouted samples with the nearest routed ring on the same ray.
+
+    Rays with no routed sample at all stay inf (unreachable).
+    """
+    out = np.full_like(circuity, np.inf)
+    for b, ray in enumerate(circuity):
+        routed = np.flatnonzero(~np.isnan(ray))
+        if routed.size:
+            nearest = routed[np.abs(np.arange(ray.size)[:, None] - routed).argmin(axis=1)]
+            out[b] = ray[nearest]
+    return out
+
+
+def _ray_circuity(iso: dict, rays: np.ndarray, dist: np.ndarray) -> np.ndarray:
+    """Detour factor along *rays* at straight-line distances *dist*."""
+    radii = iso["radii_m"]
+    k = np.clip(np.searchsorted(radii, dist), 1, len(radii) - 1)
+    lo, hi = radii[k - 1], radii[k]
+    t = np.clip((dist - lo) / (hi - lo), 0.0, 1.0)
+    inner, outer = iso["circuity"][rays, k - 1], iso["circuity"][rays, k]
+    with np.errstate(invalid="ignore"):
+        return np.where(t == 0, inner, np.where(t == 1, outer, (1 - t) * inner + t * outer))
+
+
+def _polygon(iso: dict, m_per_min: float) -> list[list[float]]:
+    """Closed ring of the farthest reachable point on every ray."""
+    c_lat, c_lng = iso["center"]["lat"], iso["center"]["lng"]
+    n_bearings = iso["circuity"].shape[0]
+    steps = np.linspace(0, iso["radii_m"][-1], _RAY_STEPS + 1)[1:]
+
+    rays = np.repeat(np.arange(n_bearings), steps.size)
+    dist = np.tile(steps, n_bearings)
+    minutes = (dist * _ray_circuity(iso, rays, dist) / m_per_min).reshape(n_bearings, -1)
+    within = minutes <= iso["minutes"]
+    # Farthest step before the walking time first exceeds the budget
+    first_out = np.where(within.all(axis=1), steps.size, (~within).argmax(axis=1))
+    reach = np.where(first_out > 0, steps[np.maximum(first_out - 1, 0)], 0.0)
+
+    kx = _M_PER_DEG_LAT * math.cos(math.radians(c_lat))
+    bearings = 2 * math.pi * np.arange(n_bearings) / n_bearings
+    ring = [
+        [c_lat + r * math.cos(b) / _M_PER_DEG_LAT, c_lng + r * math.sin(b) / kx]
+        for b, r in zip(bearings.tolist(), reach.tolist())
+    ]
+    return ring + ring[:1]
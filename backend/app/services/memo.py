@@ -0,0 +1,139 @@
+"""Request-scoped memoization — each distinct call runs at most once per request.
+
+``with request_memo():`` (or ``@in_request_memo``) opens a memo for the
+block. ``@memoized`` functions called inside it — in this thread or in
+tasks spawned from it, which inherit the caller's contextvars (see
+executor.spawn) — share results by arguments; ``memoized_batch`` does the same per item
+for batched calls such as fetch_pois. Both hand out deep copies, so
+callers may mutate what they get. Concurrent callers of the same key
+wait for the first one, which also shares its exception. Nothing
+outlives the block, so entries never go stale; outside one, calls run
+normally.
+"""
+
+import contextlib
+import copy
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+from contextvars import ContextVar
+
+_memo: ContextVar[dict | None] = ContextVar("request_memo", default=None)
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def request_memo():
+    """Memoize @memoized calls made inside the block (nested blocks share the outer memo)."""
+    if _memo.get() is not None:
+        yield
+        return
+    token = _memo.set({})
+    try:
+        yield
+    finally:
+        try:
+            _memo.reset(token)
+        except ValueError:
+            pass  # a generator finalized from another context; nothing to undo here
+
+
+def in_request_memo(fn):
+    """Decorator: run *fn* (a function or generator function) inside request_memo()."""
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator(*args, **kwargs):
+            with request_memo():
+                yield from fn(*args, **kwargs)
+        return generator
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with request_memo():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _freeze(value):
+    """Hashable stand-in for argument values (lists → tuples, dicts → sorted items)."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _claim(memo: dict, key) -> tuple[Future, bool]:
+    """(future for *key*, whether the caller must compute it)."""
+    with _lock:
+        future = memo.get(key)
+        if future is not None:
+            return future, False
+        future = memo[key] = Future()
+        return future, True
+
+
+def memoized(fn):
+    """Decorator: share results of equal calls inside a request_memo block.
+
+    Arguments are normalized through the signature (positional or keyword,
+    defaults filled in); callers get a deep copy of the result.
+    """
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        memo = _memo.get()
+        if memo is None:
+            return fn(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (name, _freeze(tuple(bound.arguments.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(*args, **kwargs)
+
+        future, leader = _claim(memo, key)
+        if leader:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+        return copy.deepcopy(future.result())
+
+    return wrapper
+
+
+def memoized_batch(name: str, items: list, fetch) -> list:
+    """``fetch(unique_items) -> results`` for *items*, once per distinct item.
+
+    Equal items (compared frozen) are fetched once per call, and inside a
+    request_memo block once per request. Results are returned in input
+    order; each is a deep copy, as with @memoized.
+    """
+    keys = [(name, _freeze(item)) for item in items]
+    memo = _memo.get()
+    if memo is None:
+        memo = {}  # still dedupe within this call
+
+    futures, todo = [], {}
+    for key, item in zip(keys, items):
+        future, leader = _claim(memo, key)
+        futures.append(future)
+        if leader:
+            todo[key] = (future, item)
+
+    if todo:
+        pending = list(todo.values())
+        try:
+            results = fetch([item for _, item in pending])
+        except BaseException as exc:
+            for future, _ in pending:
+                future.set_exception(exc)
+        else:
+            for (future, _), result in zip(pending, results):
+                future.set_result(result)
+    return [copy.deepcopy(future.result()) for future in futures]
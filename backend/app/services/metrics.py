@@ -0,0 +1,170 @@
+"""In-process metrics, rendered in the Prometheus text format at /api/metrics.
+
+Recorded by instrumentation that is already on the request path:
+    http_client.request   upstream request counts, latency and retries
+    @timed                service-function latency (routing, transit, POIs)
+    routes/metrics.py     per-endpoint API request latency
+and read at scrape time from existing counters: rate_limit.wait_stats
+(throttle waits) and cache.cache_stats (cache hits and misses).
+
+Counters live in this process only; with several workers each one is
+scraped (or aggregated) separately, as with any Prometheus client.
+Recording is a dict update under one lock, and nothing at all when
+METRICS_ENABLED is off (create_app calls set_enabled).
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = True
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}              # (name, labels) -> value
+_histograms: dict[tuple, list] = {}             # (name, labels) -> [bucket counts..., sum, count]
+
+_HELP = {
+    "hackuri_upstream_requests_total": ("counter", "Upstream HTTP requests by final status."),
+    "hackuri_upstream_request_seconds": ("histogram", "Upstream HTTP request latency, per attempt."),
+    "hackuri_upstream_retries_total": ("counter", "Upstream attempts retried, by reason."),
+    "hackuri_upstream_retry_sleep_seconds_total": ("counter", "Time spent backing off before retries."),
+    "hackuri_throttle_acquires_total": ("counter", "Rate-limit token reservations."),
+    "hackuri_throttle_wait_seconds_total": ("counter", "Time spent waiting on rate limits."),
+    "hackuri_slot_wait_seconds_total": (
+        "counter", "Time spent queued for an in-flight request slot (UPSTREAM_CONCURRENCY)."
+    ),
+    "hackuri_walk_legs_total": ("counter", "Walking legs returned, by source."),
+    "hackuri_service_seconds": ("histogram", "Service function latency."),
+    "hackuri_http_request_seconds": ("histogram", "API request latency (to the first byte for streams)."),
+    "hackuri_cache_lookups_total": ("counter", "Cache lookups by result."),
+    "hackuri_cache_hit_ratio": ("gauge", "Share of cache lookups answered (hits + negative hits)."),
+}
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn recording on or off for this process."""
+    global _enabled
+    _enabled = enabled
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    """Add *value* to counter *name* with *labels*."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """Record *seconds* in histogram *name* with *labels*."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    slot = bisect.bisect_left(_BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(_BUCKETS) + 1) + [0.0, 0]
+        hist[slot] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+def timed(fn):
+    """Decorator: record each call's latency in hackuri_service_seconds."""
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe("hackuri_service_seconds", time.perf_counter() - start, function=name)
+
+    return wrapper
+
+
+def count_legs(legs) -> None:
+    """Count walking legs (dicts with a "source", or None) in hackuri_walk_legs_total."""
+    by_source: dict[str, int] = {}
+    for leg in legs:
+        source = leg.get("source", "unknown") if leg else "none"
+        by_source[source] = by_source.get(source, 0) + 1
+    for source, n in by_source.items():
+        inc("hackuri_walk_legs_total", n, source=source)
+
+
+# ── Exposition ───────────────────────────────────────────────────────
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _scraped() -> dict[tuple, float]:
+    """Counters and gauges read from other modules' own statistics."""
+    from app.services.cache import cache_stats
+    from app.services.rate_limit import wait_stats
+
+    out = {}
+    for upstream, stats in wait_stats().items():
+        out[_key("hackuri_throttle_acquires_total", {"upstream": upstream})] = stats["calls"]
+        out[_key("hackuri_throttle_wait_seconds_total", {"upstream": upstream})] = stats["waited_s"]
+    for cache, stats in cache_stats().items():
+        for field, result in (("hits", "hit"), ("negative_hits", "negative_hit"),
+                              ("misses", "miss")):
+            out[_key("hackuri_cache_lookups_total",
+                     {"cache": cache, "result": result})] = stats[field]
+        out[_key("hackuri_cache_hit_ratio", {"cache": cache})] = stats["hit_ratio"]
+    return out
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        values = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    values.update(_scraped())
+
+    by_name: dict[str, list[str]] = {}
+    for (name, labels), value in sorted(values.items()):
+        by_name.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+    for (name, labels), hist in sorted(histograms.items()):
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, n in zip(_BUCKETS + (float("inf"),), hist):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_labels(labels, (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(round(hist[-2], 6))}")
+        lines.append(f"{name}_count{_labels(labels)} {hist[-1]}")
+
+    out = []
+    for name in sorted(by_name):
+        kind, text = _HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(by_name[name])
+    return "\n".join(out) + "\n"
@@ -0,0 +1,121 @@
+"""Overpass service — throttled client plus a planner that batches POI lookups.
+
+A *lookup* is "elements matching these tag groups within radius_m of a
+point". ``fetch_lookups`` answers any number of lookups with ONE Overpass
+request: each lookup becomes a named set, and a ``make`` marker element is
+emitted before its members so the response can be split back out exactly.
+"""
+
+from functools import lru_cache
+
+from flask import current_app
+
+from app.services import http_client
+from app.services.singleflight import single_flight
+
+
+@single_flight
+def post_overpass(query: str, timeout: int = 15) -> list[dict]:
+    """Run an Overpass QL query (rate-limited, retried on 429) and return its elements."""
+    overpass_url = current_app.config["OVERPASS_BASE_URL"]
+    resp = http_client.post(
+        "overpass", overpass_url, data={"data": query}, timeout=timeout
+    )
+    resp.raise_for_status()
+    return resp.json().get("elements", [])
+
+
+def lookup(
+    lat: float,
+    lng: float,
+    radius_m: int,
+    tag_groups: list[list[str]],
+    element_types: tuple[str, ...] = ("node", "way"),
+) -> dict:
+    """Describe one POI lookup for ``fetch_lookups``.
+
+    *tag_groups* uses the AMENITY_TAG_MAP shape: clauses inside a group are
+    ANDed, groups are ORed.
+    """
+    return {
+        "lat": lat,
+        "lng": lng,
+        "radius_m": radius_m,
+        "tag_groups": tag_groups,
+        "element_types": element_types,
+    }
+
+
+def bbox_lookup(
+    bbox: tuple[float, float, float, float],
+    tag_groups: list[list[str]],
+    element_types: tuple[str, ...] = ("node", "way"),
+) -> dict:
+    """Like ``lookup`` but for a (south, west, north, east) bounding box."""
+    return {
+        "bbox": bbox,
+        "tag_groups": tag_groups,
+        "element_types": element_types,
+    }
+
+
+def build_union_query(lookups: list[dict], timeout: int = 25) -> str:
+    """Build one Overpass query that outputs every lookup as a marked block."""
+    blocks = []
+    for i, lk in enumerate(lookups):
+        if "bbox" in lk:
+            around = "({},{},{},{})".format(*lk["bbox"])
+        else:
+            around = f"(around:{lk['radius_m']},{lk['lat']},{lk['lng']})"
+        parts = []
+        for group in lk["tag_groups"]:
+            tag_filter = "".join(f"[{clause}]" for clause in group)
+            for etype in lk["element_types"]:
+                parts.append(f"{etype}{tag_filter}{around};")
+        blocks.append(
+            f"({' '.join(parts)})->.l{i};\n"
+            f'make marker idx="{i}";\nout;\n'
+            f".l{i} out center body;"
+        )
+
+    return f"[out:json][timeout:{timeout}];\n" + "\n".join(blocks)
+
+
+@lru_cache(maxsize=None)
+def parse_clause(clause: str) -> tuple[str, str]:
+    """Split a tag clause like '"amenity"="cafe"' into ("amenity", "cafe")."""
+    key, value = clause.split("=", 1)
+    return key.strip('"'), value.strip('"')
+
+
+def matches_tag_groups(tags: dict, tag_groups: list[list[str]]) -> bool:
+    """Local equivalent of the Overpass filter: any group whose clauses all match."""
+    for group in tag_groups:
+        if all(tags.get(k) == v for k, v in map(parse_clause, group)):
+            return True
+    return False
+
+
+def split_elements(elements: list[dict], count: int) -> list[list[dict]]:
+    """Split a marked union response back into one element list per lookup."""
+    out: list[list[dict]] = [[] for _ in range(count)]
+    current = None
+    for el in elements:
+        if el.get("type") == "marker":
+            current = out[int(el["tags"]["idx"])]
+        elif current is not None:
+            current.append(el)
+    return out
+
+
+def fetch_lookups(lookups: list[dict], timeout: int = 25) -> list[list[dict]]:
+    """Answer every lookup with a single Overpass round-trip.
+
+    Returns the raw Overpass elements for each lookup, in input order.
+    """
+    if not lookups:
+        return []
+    elements = post_overpass(
+        build_union_query(lookups, timeout=timeout), timeout=timeout + 5
+    )
+    return split_elements(elements, len(lookups))
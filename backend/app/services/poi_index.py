@@ -0,0 +1,360 @@
+"""Offline POI index — amenity and transit-stop lookups from a local OSM extract.
+
+``flask build-poi-index <extract>`` reads an Overpass JSON dump or an
+``.osm.pbf`` file (needs pyosmium), keeps every element matching a tag group
+from AMENITY_TAG_MAP or TRANSIT_STOP_TAGS, and writes a compact grid index
+to POI_INDEX_PATH. With POI_SOURCE=index, lookups are answered from it
+without touching Overpass.
+
+Layout: POIs are sorted by grid cell (see grid.py); ``cell_keys`` (sorted)
+and ``cell_start`` give the slice of the coordinate / mask arrays for a cell.
+Each POI has a bit mask of the tag groups it matches. The index is saved
+as an .npz (the tag groups as JSON) and loaded with allow_pickle=False.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+from array import array
+
+import numpy as np
+from flask import current_app
+
+from app.services import grid
+from app.services.amenities_service import AMENITY_TAG_MAP, _haversine
+from app.services.overpass_service import matches_tag_groups, parse_clause
+from app.services.transit_service import TRANSIT_STOP_TAGS
+
+_FORMAT_VERSION = 2
+_CELL_DEG = 0.005           # ≈ 550 m north-south
+_MAX_GROUPS = 64            # masks are stored as unsigned 64-bit ints
+
+
+def known_tag_groups() -> list[list[str]]:
+    """Every distinct tag group the index classifies POIs by."""
+    groups = [g for gs in AMENITY_TAG_MAP.values() for g in gs] + TRANSIT_STOP_TAGS
+    unique = {tuple(sorted(g)): None for g in groups}
+    return [list(g) for g in unique]
+
+
+class PoiIndex:
+    """Grid index of classified POIs (see module docstring)."""
+
+    def __init__(self, data: dict):
+        # Numeric columns are read through memoryviews, whether they come
+        # from build (array / bytes) or load (numpy): scalar reads are fast
+        self.groups: list[list[str]] = data["groups"]
+        self.cell_keys = memoryview(data["cell_keys"])
+        self.cell_start = memoryview(data["cell_start"])
+        self.lat = memoryview(data["lat"])
+        self.lng = memoryview(data["lng"])
+        self.masks = memoryview(data["masks"])
+        self.ways = memoryview(data["ways"])     # 1 = way (center point), 0 = node
+        self.ids = memoryview(data["ids"])
+        self.names: list[str] = data["names"]
+        self._group_bits = {tuple(sorted(g)): 1 << i for i, g in enumerate(self.groups)}
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ── Building / persistence ──────────────────────────────────────
+
+    @classmethod
+    def build(cls, elements, groups: list[list[str]]) -> "PoiIndex":
+        """Index Overpass-shaped elements (ways need a ``center``)."""
+        if len(groups) > _MAX_GROUPS:
+            raise ValueError(f"At most {_MAX_GROUPS} tag groups can be indexed")
+
+        rows = []
+        for el in elements:
+            if el.get("type") not in ("node", "way"):
+                continue
+            el_lat = el.get("lat") or el.get("center", {}).get("lat")
+            el_lng = el.get("lon") or el.get("center", {}).get("lon")
+            if el_lat is None or el_lng is None:
+                continue
+            tags = el.get("tags", {})
+            mask = 0
+            for bit, group in enumerate(groups):
+                if matches_tag_groups(tags, [group]):
+                    mask |= 1 << bit
+            if not mask:
+                continue
+            key = grid.pack(*grid.cell_of(el_lat, el_lng, _CELL_DEG))
+            rows.append((key, el_lat, el_lng, mask, el["type"] == "way",
+                         el["id"], tags.get("name", "")))
+
+        rows.sort(key=lambda r: r[0])
+        cell_keys, cell_start = array("q"), array("q")
+        for i, row in enumerate(rows):
+            if not cell_keys or cell_keys[-1] != row[0]:
+                cell_keys.append(row[0])
+                cell_start.append(i)
+        cell_start.append(len(rows))
+
+        return cls({
+            "groups": groups,
+            "cell_keys": cell_keys,
+            "cell_start": cell_start,
+            "lat": array("d", (r[1] for r in rows)),
+            "lng": array("d", (r[2] for r in rows)),
+            "masks": array("Q", (r[3] for r in rows)),
+            "ways": bytes(r[4] for r in rows),
+            "ids": array("q", (r[5] for r in rows)),
+            "names": [r[6] for r in rows],
+        })
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            version=np.array(_FORMAT_VERSION),
+            groups=np.array(json.dumps(self.groups)),
+            cell_keys=np.asarray(self.cell_keys, dtype=np.int64),
+            cell_start=np.asarray(self.cell_start, dtype=np.int64),
+            lat=np.asarray(self.lat, dtype=np.float64),
+            lng=np.asarray(self.lng, dtype=np.float64),
+            masks=np.asarray(self.masks, dtype=np.uint64),
+            ways=np.asarray(self.ways, dtype=np.uint8),
+            ids=np.asarray(self.ids, dtype=np.int64),
+            names=np.array(self.names, dtype=np.str_),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PoiIndex":
+        with np.load(path, allow_pickle=False) as f:
+            data = {k: f[k] for k in f.files}
+        if "version" not in data or int(data.pop("version")) != _FORMAT_VERSION:
+            raise ValueError(f"{path} was built by an incompatible version; rebuild it")
+        data["groups"] = json.loads(str(data["groups"]))
+        data["names"] = data["names"].tolist()
+        return cls(data)
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    def mask_for(self, tag_groups: list[list[str]]) -> int | None:
+        """Bit mask for *tag_groups*, or None if any group is not indexed."""
+        mask = 0
+        for group in tag_groups:
+            bit = self._group_bits.get(tuple(sorted(group)))
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def _cell_range(self, cy: int, cx: int) -> range:
+        key = grid.pack(cy, cx)
+        pos = bisect.bisect_left(self.cell_keys, key)
+        if pos == len(self.cell_keys) or self.cell_keys[pos] != key:
+            return range(0)
+        return range(self.cell_start[pos], self.cell_start[pos + 1])
+
+    def _candidates(self, cells, mask: int, nodes_only: bool):
+        for cy, cx in cells:
+            for i in self._cell_range(cy, cx):
+                if self.masks[i] & mask and not (nodes_only and self.ways[i]):
+                    yield i
+
+    def within(
+        self, lat: float, lng: float, radius_m: float, mask: int, nodes_only: bool = False
+    ) -> list[tuple[float, int]]:
+        """(distance_m, poi) pairs within *radius_m*, unsorted."""
+        y0, y1, x0, x1 = grid.box_cells(lat, lng, radius_m, _CELL_DEG)
+        cells = ((y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1))
+
+        hits = []
+        for i in self._candidates(cells, mask, nodes_only):
+            dist = _haversine(lat, lng, self.lat[i], self.lng[i])
+            if dist <= radius_m:
+                hits.append((dist, i))
+        return hits
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        mask: int,
+        nodes_only: bool = False,
+        max_radius_m: float = 10_000,
+    ) -> list[tuple[float, int]]:
+        """The *k* nearest matching POIs as sorted (distance_m, poi) pairs.
+
+        Searches rings of cells outward and stops once the next ring cannot
+        contain anything closer than the current k-th hit.
+        """
+        cy, cx = grid.cell_of(lat, lng, _CELL_DEG)
+        cell_m = grid.cell_m(lat, _CELL_DEG)
+        max_ring = math.ceil(max_radius_m / cell_m) + 1
+
+        hits: list[tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            if ring == 0:
+                cells = [(cy, cx)]
+            else:
+                cells = [
+                    (cy + dy, cx + dx)
+                    for dy in range(-ring, ring + 1)
+                    for dx in range(-ring, ring + 1)
+                    if max(abs(dy), abs(dx)) == ring
+                ]
+            for i in self._candidates(cells, mask, nodes_only):
+                dist = _haversine(lat, lng, self.lat[i], self.lng[i])
+                if dist <= max_radius_m:
+                    hits.append((dist, i))
+            hits.sort()
+            del hits[k:]
+            # Anything in ring+1 is at least `ring * cell_m` away.
+            if len(hits) == k and hits[-1][0] <= ring * cell_m:
+                break
+        return hits
+
+    def element(self, i: int, dist_m: float | None = None) -> dict:
+        """Overpass-shaped element for POI *i* (tags rebuilt from its groups)."""
+        tags = {}
+        mask = self.masks[i]
+        for bit, group in enumerate(self.groups):
+            if mask & (1 << bit):
+                tags.update(parse_clause(c) for c in group)
+        if self.names[i]:
+            tags["name"] = self.names[i]
+        return {
+            "type": "way" if self.ways[i] else "node",
+            "id": self.ids[i],
+            "lat": self.lat[i],
+            "lon": self.lng[i],
+            "tags": tags,
+        }
+
+
+# ── Process-wide index ───────────────────────────────────────────────
+
+_index: PoiIndex | None = None
+_index_mtime: float | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> PoiIndex | None:
+    """The index at POI_INDEX_PATH (reloaded when the file changes), or None."""
+    global _index, _index_mtime
+    path = current_app.config["POI_INDEX_PATH"]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = PoiIndex.load(path)
+            _index_mtime = mtime
+        return _index
+
+
+def covers(index: PoiIndex, lk: dict) -> bool:
+    """True if *lk* is a radius lookup over tag groups the index knows."""
+    return "bbox" not in lk and index.mask_for(lk["tag_groups"]) is not None
+
+
+def fetch_from_index(index: PoiIndex, lookups: list[dict]) -> list[list[dict]]:
+    """Answer radius lookups (see ``covers``) with Overpass-shaped elements."""
+    results = []
+    for lk in lookups:
+        hits = index.within(
+            lk["lat"], lk["lng"], lk["radius_m"],
+            index.mask_for(lk["tag_groups"]),
+            nodes_only="way" not in lk["element_types"],
+        )
+        results.append([index.element(i) for _, i in hits])
+    return results
+
+
+def nearest_from_index(index: PoiIndex, lk: dict, k: int) -> list[dict]:
+    """The *k* elements nearest the centre of radius lookup *lk* (see ``covers``)."""
+    hits = index.nearest(
+        lk["lat"], lk["lng"], k,
+        index.mask_for(lk["tag_groups"]),
+        nodes_only="way" not in lk["element_types"],
+        max_radius_m=lk["radius_m"],
+    )
+    return [index.element(i) for _, i in hits]
+
+
+# ── Ingestion ────────────────────────────────────────────────────────
+
+
+def read_overpass_json(path: str) -> list[dict]:
+    """Elements from an Overpass JSON dump; way centers are filled in if missing."""
+    import json
+
+    with open(path, encoding="utf-8") as f:
+        elements = json.load(f).get("elements", [])
+
+    nodes = {el["id"]: (el["lat"], el["lon"]) for el in elements
+             if el.get("type") == "node" and "lat" in el}
+    for el in elements:
+        if el.get("type") != "way" or "center" in el:
+            continue
+        if "bounds" in el:
+            b = el["bounds"]
+            el["center"] = {"lat": (b["minlat"] + b["maxlat"]) / 2,
+                            "lon": (b["minlon"] + b["maxlon"]) / 2}
+            continue
+        pts = el.get("geometry") or [
+            {"lat": nodes[n][0], "lon": nodes[n][1]} for n in el.get("nodes", []) if n in nodes
+        ]
+        if pts:
+            el["center"] = _bbox_center([(p["lat"], p["lon"]) for p in pts])
+    return elements
+
+
+def read_pbf(path: str, groups: list[list[str]]) -> list[dict]:
+    """Matching nodes and ways (as bbox centers) from an .osm.pbf extract."""
+    try:
+        import osmium
+    except ImportError as exc:
+        raise RuntimeError(
+            "Reading .pbf extracts requires pyosmium (pip install osmium)"
+        ) from exc
+
+    elements = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            tags = dict(n.tags)
+            if tags and matches_tag_groups(tags, groups):
+                elements.append({"type": "node", "id": n.id, "lat": n.location.lat,
+                                 "lon": n.location.lon, "tags": tags})
+
+        def way(self, w):
+            tags = dict(w.tags)
+            if not tags or not matches_tag_groups(tags, groups):
+                return
+            pts = [(n.lat, n.lon) for n in w.nodes if n.location.valid()]
+            if pts:
+                elements.append({"type": "way", "id": w.id,
+                                 "center": _bbox_center(pts), "tags": tags})
+
+    Handler().apply_file(path, locations=True)
+    return elements
+
+
+def _bbox_center(points: list[tuple[float, float]]) -> dict:
+    """Center of the bounding box — what Overpass reports as a way's center."""
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    return {"lat": (min(lats) + max(lats)) / 2, "lon": (min(lngs) + max(lngs)) / 2}
+
+
+def build_poi_index(source: str, output: str) -> PoiIndex:
+    """Read *source* (.json Overpass dump or .pbf) and write the index to *output*."""
+    groups = known_tag_groups()
+    if source.endswith(".pbf"):
+        elements = read_pbf(source, groups)
+    else:
+        elements = read_overpass_json(source)
+    index = PoiIndex.build(elements, groups)
+    index.save(output)
+    return index
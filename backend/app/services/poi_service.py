@@ -0,0 +1,87 @@
+"""POI source selection — routes Overpass-style lookups to the configured backend.
+
+POI_SOURCE:
+    "tiles"    — cached map tiles (poi_tiles), live Overpass for anything the
+                 tiles don't store (e.g. raw amenity=<value> fallbacks)
+    "index"    — local grid index built from an OSM extract (poi_index),
+                 live Overpass if the index file is missing
+    "overpass" — always query Overpass around the point
+"""
+
+from flask import current_app
+
+from app.services import metrics
+from app.services.memo import memoized_batch
+from app.services.overpass_service import fetch_lookups
+
+
+@metrics.timed
+def fetch_pois(lookups: list[dict]) -> list[list[dict]]:
+    """Answer lookups (see overpass_service.lookup) with the fewest upstream calls.
+
+    Identical lookups (e.g. amenity aliases with the same tag groups) are
+    fetched once, and once per request inside a request_memo block.
+
+    Returns Overpass-shaped elements per lookup, in input order.
+    """
+    return memoized_batch("fetch_pois", lookups, _fetch_pois)
+
+
+def fetch_nearest_pois(lookup: dict, limit: int, results) -> list[dict]:
+    """``results(elements)`` for the POIs of *lookup* nearest its centre.
+
+    *results* turns elements into at most *limit* dicts, possibly dropping
+    some (duplicates, excluded names). With POI_SOURCE=index only the cells
+    around the nearest hits are read (PoiIndex.nearest), doubling the count
+    asked for until *results* has *limit* entries or the radius is
+    exhausted; otherwise the whole radius is fetched with fetch_pois.
+    """
+    if current_app.config["POI_SOURCE"] == "index" and limit > 0:
+        from app.services import poi_index
+
+        index = poi_index.get_index()
+        if index is not None and poi_index.covers(index, lookup):
+            k = limit
+            while True:
+                elements = poi_index.nearest_from_index(index, lookup, k)
+                found = results(elements)
+                if len(found) >= limit or len(elements) < k:
+                    return found
+                k *= 2
+
+    [elements] = fetch_pois([lookup])
+    return results(elements)
+
+
+def _fetch_pois(lookups: list[dict]) -> list[list[dict]]:
+    """Fetch distinct *lookups* from the configured POI_SOURCE."""
+    results: list[list[dict] | None] = [None] * len(lookups)
+    source = current_app.config["POI_SOURCE"]
+
+    if source == "index":
+        from app.services import poi_index
+
+        index = poi_index.get_index()
+        if index is None:
+            current_app.logger.warning(
+                "POI_SOURCE=index but %s is missing; querying Overpass",
+                current_app.config["POI_INDEX_PATH"],
+            )
+        else:
+            idx = [i for i, lk in enumerate(lookups) if poi_index.covers(index, lk)]
+            answered = poi_index.fetch_from_index(index, [lookups[i] for i in idx])
+            for i, elements in zip(idx, answered):
+                results[i] = elements
+
+    elif source == "tiles":
+        from app.services import poi_tiles
+
+        idx = [i for i, lk in enumerate(lookups) if poi_tiles.covers(lk)]
+        answered = poi_tiles.fetch_from_tiles([lookups[i] for i in idx])
+        for i, elements in zip(idx, answered):
+            results[i] = elements
+
+    live = [i for i, r in enumerate(results) if r is None]
+    for i, elements in zip(live, fetch_lookups([lookups[i] for i in live])):
+        results[i] = elements
+    return results
@@ -0,0 +1,287 @@
+"""POI tile cache — answers amenity / transit-stop lookups from cached map tiles.
+
+The map is cut into fixed POI_TILE_DEG x POI_TILE_DEG tiles. A tile is
+fetched from Overpass once with EVERY tag group we know about
+(AMENITY_TAG_MAP + TRANSIT_STOP_TAGS) and stored on disk, so any amenity
+type and any radius around any nearby home becomes a local lookup. Tiles
+older than POI_TILE_TTL_S are still served, but refreshed in a background
+thread.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from flask import current_app
+
+from app.services.amenities_service import _haversine
+from app.services.cache import MISSING, get_cache
+from app.services.overpass_service import (
+    bbox_lookup,
+    fetch_lookups,
+    matches_tag_groups,
+    parse_clause,
+)
+
+_STALE_FACTOR = 4           # tiles are dropped from disk after 4 x POI_TILE_TTL_S
+_MEMORY_TILES = 256         # decoded tiles kept in-process
+_MAX_TILES_PER_QUERY = 16   # bigger batches risk Overpass timeouts
+_M_PER_DEG_LAT = 111_320
+
+_ELEMENT_TYPES = {"n": "node", "w": "way"}
+
+_memory: OrderedDict = OrderedDict()
+_memory_lock = threading.Lock()
+_refreshing: set[str] = set()
+
+
+# ── Tag coverage ─────────────────────────────────────────────────────
+
+
+def _minimal_groups(groups: list[list[str]]) -> list[list[str]]:
+    """Deduplicate tag groups and drop any group implied by a broader one.
+
+    e.g. amenity=cafe already fetches everything amenity=cafe+cuisine=coffee_shop would.
+    """
+    sets = {frozenset(g) for g in groups}
+    keep = [s for s in sets if not any(other < s for other in sets)]
+    return [sorted(s) for s in sorted(keep, key=sorted)]
+
+
+@lru_cache(maxsize=1)
+def _tile_groups() -> tuple[list[list[str]], list[list[str]]]:
+    """(amenity groups fetched as node+way, transit groups fetched as node)."""
+    from app.services.amenities_service import AMENITY_TAG_MAP
+    from app.services.transit_service import TRANSIT_STOP_TAGS
+
+    amenity = _minimal_groups([g for groups in AMENITY_TAG_MAP.values() for g in groups])
+    return amenity, _minimal_groups(TRANSIT_STOP_TAGS)
+
+
+@lru_cache(maxsize=1)
+def _kept_keys() -> frozenset[str]:
+    """Tag keys worth storing — everything our filters look at, plus name."""
+    from app.services.amenities_service import AMENITY_TAG_MAP
+    from app.services.transit_service import TRANSIT_STOP_TAGS
+
+    groups = [g for gs in AMENITY_TAG_MAP.values() for g in gs] + TRANSIT_STOP_TAGS
+    keys = {parse_clause(c)[0] for g in groups for c in g}
+    return frozenset(keys | {"name"})
+
+
+def covers(lk: dict) -> bool:
+    """True if every tag group of *lk* is contained in what tiles store."""
+    if "bbox" in lk:
+        return False
+    amenity, transit = _tile_groups()
+    node_only = tuple(lk["element_types"]) == ("node",)
+    fetched = [frozenset(g) for g in (amenity + transit if node_only else amenity)]
+    return all(
+        any(f <= frozenset(group) for f in fetched) for group in lk["tag_groups"]
+    )
+
+
+# ── Tile geometry ────────────────────────────────────────────────────
+
+
+def _tiles_for(lat: float, lng: float, radius_m: float, deg: float) -> list[tuple[int, int]]:
+    """Every tile intersecting the bounding box of the search circle."""
+    dlat = radius_m / _M_PER_DEG_LAT
+    dlng = radius_m / (_M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    y0, y1 = math.floor((lat - dlat) / deg), math.floor((lat + dlat) / deg)
+    x0, x1 = math.floor((lng - dlng) / deg), math.floor((lng + dlng) / deg)
+    return [(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def _tile_key(tile: tuple[int, int], deg: float) -> str:
+    return f"{deg}:{tile[0]}:{tile[1]}"
+
+
+def _tile_bbox(tile: tuple[int, int], deg: float) -> tuple[float, float, float, float]:
+    y, x = tile
+    return (
+        round(y * deg, 6), round(x * deg, 6),
+        round((y + 1) * deg, 6), round((x + 1) * deg, 6),
+    )
+
+
+# ── Storage ──────────────────────────────────────────────────────────
+
+
+def _tile_cache():
+    ttl = current_app.config["POI_TILE_TTL_S"]
+    return get_cache(
+        "poi_tiles",
+        max_entries=current_app.config["POI_TILE_MAX_TILES"],
+        ttl_s=ttl * _STALE_FACTOR,
+    )
+
+
+def _remember(key: str, tile: dict) -> None:
+    with _memory_lock:
+        _memory[key] = tile
+        _memory.move_to_end(key)
+        while len(_memory) > _MEMORY_TILES:
+            _memory.popitem(last=False)
+
+
+def _load(keys: list[str]) -> dict[str, dict]:
+    """Tiles available in memory or on disk, keyed by tile key."""
+    found = {}
+    cache = None
+    for key in keys:
+        with _memory_lock:
+            tile = _memory.get(key)
+            if tile is not None:
+                _memory.move_to_end(key)
+        if tile is None:
+            cache = cache or _tile_cache()
+            tile = cache.get(key)
+            if tile is MISSING or tile is None:
+                continue
+            _remember(key, tile)
+        found[key] = tile
+    return found
+
+
+def _compact(el: dict, keep: frozenset[str]) -> list | None:
+    """Overpass element → [type, id, lat, lng, tags] with only useful tags."""
+    el_lat = el.get("lat") or el.get("center", {}).get("lat")
+    el_lng = el.get("lon") or el.get("center", {}).get("lon")
+    if el_lat is None or el_lng is None:
+        return None
+    tags = {k: v for k, v in el.get("tags", {}).items() if k in keep}
+    return [el["type"][0], el["id"], el_lat, el_lng, tags]
+
+
+def _fetch_tiles(tiles: list[tuple[int, int]], deg: float) -> dict[str, dict]:
+    """Download tiles from Overpass (batched) and store them."""
+    amenity, transit = _tile_groups()
+    keep = _kept_keys()
+    cache = _tile_cache()
+    fetched = {}
+
+    for start in range(0, len(tiles), _MAX_TILES_PER_QUERY):
+        batch = tiles[start:start + _MAX_TILES_PER_QUERY]
+        lookups = []
+        for tile in batch:
+            bbox = _tile_bbox(tile, deg)
+            lookups.append(bbox_lookup(bbox, amenity))
+            lookups.append(bbox_lookup(bbox, transit, element_types=("node",)))
+        elements = fetch_lookups(lookups, timeout=60)
+
+        now = time.time()
+        for i, tile in enumerate(batch):
+            seen = set()
+            compact = []
+            for el in elements[2 * i] + elements[2 * i + 1]:
+                row = _compact(el, keep)
+                if row is None or (row[0], row[1]) in seen:
+                    continue
+                seen.add((row[0], row[1]))
+                compact.append(row)
+            key = _tile_key(tile, deg)
+            data = {"fetched_at": now, "elements": compact}
+            cache.put(key, data)
+            _remember(key, data)
+            fetched[key] = data
+
+    return fetched
+
+
+def _refresh_in_background(tiles: list[tuple[int, int]], deg: float) -> None:
+    """Re-download stale tiles without blocking the current request."""
+    with _memory_lock:
+        tiles = [t for t in tiles if _tile_key(t, deg) not in _refreshing]
+        _refreshing.update(_tile_key(t, deg) for t in tiles)
+    if not tiles:
+        return
+
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                _fetch_tiles(tiles, deg)
+            except Exception as exc:
+                app.logger.warning("POI tile refresh failed: %s", exc)
+            finally:
+                with _memory_lock:
+                    _refreshing.difference_update(_tile_key(t, deg) for t in tiles)
+
+    threading.Thread(target=run, name="poi-tile-refresh", daemon=True).start()
+
+
+# ── Queries ──────────────────────────────────────────────────────────
+
+
+def fetch_from_tiles(lookups: list[dict]) -> list[list[dict]]:
+    """Answer radius lookups (see ``covers``) from tiles, fetching missing ones.
+
+    If fetching the missing tiles fails, lookups covered by the tiles at
+    hand are still answered from them and only the rest are sent to
+    Overpass as plain lookups.
+
+    Returns Overpass-shaped elements per lookup, like overpass_service.fetch_lookups.
+    """
+    deg = current_app.config["POI_TILE_DEG"]
+    ttl = current_app.config["POI_TILE_TTL_S"]
+
+    tiles_per_lookup = [
+        _tiles_for(lk["lat"], lk["lng"], lk["radius_m"], deg) for lk in lookups
+    ]
+    wanted = list(dict.fromkeys(t for tiles in tiles_per_lookup for t in tiles))
+    have = _load([_tile_key(t, deg) for t in wanted])
+
+    missing = [t for t in wanted if _tile_key(t, deg) not in have]
+    if missing:
+        try:
+            have.update(_fetch_tiles(missing, deg))
+        except Exception as exc:
+            current_app.logger.warning("POI tile fetch failed: %s", exc)
+            # Batches stored before the failure are usable
+            have.update(_load([_tile_key(t, deg) for t in missing]))
+
+    now = time.time()
+    stale = [t for t in wanted
+             if _tile_key(t, deg) in have and now - have[_tile_key(t, deg)]["fetched_at"] > ttl]
+    if stale:
+        _refresh_in_background(stale, deg)
+
+    results: list[list[dict] | None] = []
+    for lk, tiles in zip(lookups, tiles_per_lookup):
+        if all(_tile_key(t, deg) in have for t in tiles):
+            results.append(_from_tiles(lk, [have[_tile_key(t, deg)] for t in tiles]))
+        else:
+            results.append(None)
+
+    uncovered = [i for i, r in enumerate(results) if r is None]
+    if uncovered:
+        for i, elements in zip(uncovered, fetch_lookups([lookups[i] for i in uncovered])):
+            results[i] = elements
+    return results
+
+
+def _from_tiles(lk: dict, tiles: list[dict]) -> list[dict]:
+    """Elements of *tiles* matching radius lookup *lk*."""
+    types = {t[0] for t in lk["element_types"]}
+    seen = set()
+    out = []
+    for tile in tiles:
+        for etype, eid, el_lat, el_lng, tags in tile["elements"]:
+            if etype not in types or (etype, eid) in seen:
+                continue
+            if not matches_tag_groups(tags, lk["tag_groups"]):
+                continue
+            if _haversine(lk["lat"], lk["lng"], el_lat, el_lng) > lk["radius_m"]:
+                continue
+            seen.add((etype, eid))
+            out.append({
+                "type": _ELEMENT_TYPES.get(etype, etype),
+                "id": eid,
+                "lat": el_lat,
+                "lon": el_lng,
+                "tags": tags,
+            })
+    return out
@@ -0,0 +1,95 @@
+"""Shared token-bucket rate limiter for upstream APIs.
+
+Bucket state lives in a tiny file per upstream under ``CACHE_DIR/ratelimit``
+and is updated under an exclusive ``flock``, so every thread of every worker
+process draws from the same budget. Budgets come from ``RATE_LIMITS`` in
+Config as (requests per second, burst).
+
+Callers *reserve* a token: the bucket may go negative, and each caller sleeps
+until its own reservation matures. That keeps callers in arrival order
+without polling.
+"""
+
+import os
+import struct
+import threading
+import time
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows — fall back to a per-process limiter
+    fcntl = None
+
+_STATE = struct.Struct("<dd")  # tokens, last refill timestamp
+
+_local_lock = threading.Lock()
+_local_state: dict[str, tuple[float, float]] = {}
+_wait_totals: dict[str, list[float]] = {}  # upstream -> [calls, waited seconds]
+
+
+def _reserve(tokens: float, last: float, now: float, rate: float, burst: float):
+    """Refill, take one token, and return (new tokens, seconds to wait)."""
+    tokens = min(burst, tokens + (now - last) * rate) - 1.0
+    wait = -tokens / rate if tokens < 0 else 0.0
+    return tokens, wait
+
+
+def _reserve_shared(path: str, rate: float, burst: float) -> float:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        raw = os.pread(fd, _STATE.size, 0)
+        now = time.time()
+        tokens, last = _STATE.unpack(raw) if len(raw) == _STATE.size else (burst, now)
+        tokens, wait = _reserve(tokens, last, now, rate, burst)
+        os.pwrite(fd, _STATE.pack(tokens, now), 0)
+        return wait
+    finally:
+        os.close(fd)  # also releases the lock
+
+
+def _reserve_local(upstream: str, rate: float, burst: float) -> float:
+    with _local_lock:
+        now = time.time()
+        tokens, last = _local_state.get(upstream, (burst, now))
+        tokens, wait = _reserve(tokens, last, now, rate, burst)
+        _local_state[upstream] = (tokens, now)
+        return wait
+
+
+def acquire(upstream: str) -> float:
+    """Block until *upstream* may be called; return the seconds spent waiting.
+
+    Upstreams without an entry in RATE_LIMITS are not limited.
+    """
+    limit = current_app.config["RATE_LIMITS"].get(upstream)
+    if not limit:
+        return 0.0
+    rate, burst = limit
+
+    if fcntl is not None:
+        path = os.path.join(current_app.config["CACHE_DIR"], "ratelimit", upstream)
+        wait = _reserve_shared(path, rate, burst)
+    else:
+        wait = _reserve_local(upstream, rate, burst)
+
+    with _local_lock:
+        totals = _wait_totals.setdefault(upstream, [0, 0.0])
+        totals[0] += 1
+        totals[1] += wait
+
+    if wait > 0:
+        current_app.logger.debug("Rate limit: waiting %.2fs for %s", wait, upstream)
+        time.sleep(wait)
+    return wait
+
+
+def wait_stats() -> dict[str, dict]:
+    """Per-upstream acquire() counts and total wait time in this process."""
+    with _local_lock:
+        return {
+            upstream: {"calls": calls, "waited_s": round(waited, 3)}
+            for upstream, (calls, waited) in _wait_totals.items()
+        }
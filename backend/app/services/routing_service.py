@@ -1,57 +1,193 @@
 """Routing service — calculates walking distance & time.
 
+Local: pedestrian graph at WALK_GRAPH_PATH, when built (see walk_graph.py).
 Primary: OpenRouteService (foot-walking profile, free 2000 req/day).
 Fallback: OSRM distance + estimated walk time at 5 km/h.
 """
 
-import requests
+import struct
+from array import array
+
 from flask import current_app
 
+from app.services import http_client, metrics
+from app.services.cache import MISSING, get_cache
+from app.services.executor import gather, spawn
+from app.services.memo import memoized
+from app.services.singleflight import single_flight
+from app.services.walk_graph import get_walk_graph
+
+# Cache keys carry the backend so ORS and OSRM-estimated entries never mix.
+_SOURCE_KEYS = {"openrouteservice": "ors", "osrm_estimated": "osrm"}
+
 
+@memoized
+@metrics.timed
 def get_walking_route(
     origin_lat: float,
     origin_lng: float,
     dest_lat: float,
     dest_lng: float,
+    geometry: bool = True,
 ) -> dict | None:
     """Get walking route between two points.
 
-    Tries OpenRouteService first (accurate foot-walking profile).
-    Falls back to OSRM car distance + estimated walk time if ORS key is missing.
+    Uses the local pedestrian graph when one is built and covers both
+    points (not cached — a local query is cheaper than a cache read).
+    Otherwise tries OpenRouteService (accurate foot-walking profile) and
+    falls back to OSRM car distance + estimated walk time if ORS key is missing.
 
     Returns dict with: distance_km, duration_min, geometry (list of [lat,lng]),
-    or None if no route found.
+    or None if no route found. With ``geometry=False`` the upstream is asked
+    for the summary only and the result may have no "geometry".
     """
+    graph = get_walk_graph()
+    if graph is not None:
+        route = graph.route(origin_lat, origin_lng, dest_lat, dest_lng, geometry=geometry)
+        if route is not None:
+            metrics.count_legs([route])
+            return route
+
     api_key = current_app.config.get("ORS_API_KEY", "").strip()
+    source = "openrouteservice" if api_key else "osrm_estimated"
+
+    cache = _route_cache()
+    key, reverse = _route_key(source, origin_lat, origin_lng, dest_lat, dest_lng)
+    cached = cache.get(key)
+    if cached is MISSING and not geometry:
+        # A distance-only entry (matrix or geometry-less route) is enough
+        cached = cache.get(f"leg:{key}")
+        if cached is not MISSING and cached is not None:
+            del cached["geometry"]
+    if cached is not MISSING:
+        if cached is None:
+            return None
+        if reverse and cached.get("geometry"):
+            cached["geometry"].reverse()
+        metrics.count_legs([cached])
+        return cached
+
     if api_key:
-        return _ors_walking_route(origin_lat, origin_lng, dest_lat, dest_lng, api_key)
+        route = _ors_walking_route(
+            origin_lat, origin_lng, dest_lat, dest_lng, api_key, geometry=geometry
+        )
     else:
-        return _osrm_estimated_walk(origin_lat, origin_lng, dest_lat, dest_lng)
+        route = _osrm_estimated_walk(
+            origin_lat, origin_lng, dest_lat, dest_lng, geometry=geometry
+        )
+
+    if not geometry:
+        key = f"leg:{key}"
+    if route is None:
+        cache.put(key, None, ttl_s=current_app.config["ROUTE_CACHE_NEGATIVE_TTL_S"])
+    else:
+        stored = dict(route)
+        if reverse and "geometry" in route:
+            stored["geometry"] = list(reversed(route["geometry"]))
+        cache.put(key, stored)
+    metrics.count_legs([route])
+    return route
+
+
+# ── Route cache ──────────────────────────────────────────────────────
+#
+# Walking is symmetric, so A→B and B→A share one entry: endpoints are
+# quantized (ROUTE_CACHE_PRECISION decimals) and stored in sorted order, and
+# the geometry is reversed when the caller asked for the other direction.
+# Values are packed as a fixed header plus delta-encoded int32 coordinates
+# (micro-degrees) instead of JSON [[lat, lng], ...] lists.
+
+_ROUTE_HEADER = struct.Struct("<ddB")  # distance_km, duration_min, source id
+_SOURCES = ("openrouteservice", "osrm_estimated", "local_graph")
+_COORD_SCALE = 1e6
+
+
+def _route_cache():
+    cfg = current_app.config
+    return get_cache(
+        "routes",
+        max_entries=cfg["ROUTE_CACHE_MAX_ENTRIES"],
+        ttl_s=cfg["ROUTE_CACHE_TTL_S"],
+        dumps=_pack_route,
+        loads=_unpack_route,
+    )
+
+
+def _route_key(
+    source: str, a_lat: float, a_lng: float, b_lat: float, b_lng: float
+) -> tuple[str, bool]:
+    """(cache key, whether the request runs opposite to the stored direction)."""
+    p = current_app.config["ROUTE_CACHE_PRECISION"]
+    a = (round(a_lat, p), round(a_lng, p))
+    b = (round(b_lat, p), round(b_lng, p))
+    reverse = b < a
+    if reverse:
+        a, b = b, a
+    return f"{_SOURCE_KEYS[source]}:{a[0]},{a[1]}:{b[0]},{b[1]}", reverse
+
+
+def _pack_route(route: dict) -> bytes:
+    coords = array("i")
+    prev_lat = prev_lng = 0
+    for lat, lng in route.get("geometry") or []:
+        ilat, ilng = round(lat * _COORD_SCALE), round(lng * _COORD_SCALE)
+        coords.append(ilat - prev_lat)
+        coords.append(ilng - prev_lng)
+        prev_lat, prev_lng = ilat, ilng
+    header = _ROUTE_HEADER.pack(
+        route["distance_km"], route["duration_min"], _SOURCES.index(route["source"])
+    )
+    return header + coords.tobytes()
+
+
+def _unpack_route(blob: bytes) -> dict:
+    distance_km, duration_min, source = _ROUTE_HEADER.unpack_from(blob)
+    coords = array("i")
+    coords.frombytes(blob[_ROUTE_HEADER.size:])
+    geometry = []
+    lat = lng = 0
+    for i in range(0, len(coords), 2):
+        lat += coords[i]
+        lng += coords[i + 1]
+        geometry.append([lat / _COORD_SCALE, lng / _COORD_SCALE])
+    return {
+        "distance_km": distance_km,
+        "duration_min": duration_min,
+        "geometry": geometry,
+        "source": _SOURCES[source],
+    }
 
 
+@single_flight
 def _ors_walking_route(
     origin_lat: float,
     origin_lng: float,
     dest_lat: float,
     dest_lng: float,
     api_key: str,
+    geometry: bool = True,
 ) -> dict | None:
-    """Query OpenRouteService for a foot-walking route."""
-    url = "https://api.openrouteservice.org/v2/directions/foot-walking/geojson"
+    """Query OpenRouteService for a foot-walking route (summary only if not *geometry*)."""
+    url = "https://api.openrouteservice.org/v2/directions/foot-walking"
+    body = {
+        "coordinates": [
+            [origin_lng, origin_lat],
+            [dest_lng, dest_lat],
+        ],
+    }
+    if geometry:
+        url += "/geojson"
+    else:
+        body["geometry"] = False
 
-    resp = requests.post(
+    resp = http_client.post(
+        "ors",
         url,
-        json={
-            "coordinates": [
-                [origin_lng, origin_lat],
-                [dest_lng, dest_lat],
-            ],
-        },
+        json=body,
         headers={
             "Authorization": api_key,
             "Content-Type": "application/json",
         },
-        timeout=15,
     )
 
     if resp.status_code == 404:
@@ -59,6 +195,14 @@ def _ors_walking_route(
     resp.raise_for_status()
     data = resp.json()
 
+    if not geometry:
+        summary = data["routes"][0]["summary"]
+        return {
+            "distance_km": round(summary.get("distance", 0) / 1000, 2),
+            "duration_min": round(summary.get("duration", 0) / 60, 1),
+            "source": "openrouteservice",
+        }
+
     feature = data["features"][0]
     props = feature["properties"]["summary"]
     geometry_coords = feature["geometry"]["coordinates"]  # [[lng, lat, alt?], ...]
@@ -74,11 +218,13 @@ def _ors_walking_route(
     }
 
 
+@single_flight
 def _osrm_estimated_walk(
     origin_lat: float,
     origin_lng: float,
     dest_lat: float,
     dest_lng: float,
+    geometry: bool = True,
 ) -> dict | None:
     """
     Fallback: Use OSRM for the *road distance* but estimate walking time
@@ -89,15 +235,10 @@ def _osrm_estimated_walk(
     coords = f"{origin_lng},{origin_lat};{dest_lng},{dest_lat}"
     url = f"{base}/route/v1/driving/{coords}"
 
-    resp = requests.get(
-        url,
-        params={
-            "overview": "full",
-            "geometries": "geojson",
-            "steps": "false",
-        },
-        timeout=10,
-    )
+    params = {"overview": "false", "steps": "false"}
+    if geometry:
+        params.update(overview="full", geometries="geojson")
+    resp = http_client.get("osrm", url, params=params)
     resp.raise_for_status()
     data = resp.json()
 
@@ -106,19 +247,241 @@ def _osrm_estimated_walk(
 
     route = data["routes"][0]
     distance_m = route["distance"]
-    geometry = route["geometry"]["coordinates"]
-
-    # Flip to [lat, lng] for Leaflet
-    geometry_latlng = [[pt[1], pt[0]] for pt in geometry]
 
     # Estimate walking time from distance
     walk_speed = current_app.config.get("WALKING_SPEED_KMH", 5.0)
     distance_km = distance_m / 1000
     duration_min = (distance_km / walk_speed) * 60
 
-    return {
+    result = {
         "distance_km": round(distance_km, 2),
         "duration_min": round(duration_min, 1),
-        "geometry": geometry_latlng,
         "source": "osrm_estimated",
     }
+    if geometry:
+        # Flip to [lat, lng] for Leaflet
+        result["geometry"] = [[pt[1], pt[0]] for pt in route["geometry"]["coordinates"]]
+    return result
+
+
+# ── One-to-many / many-to-many (matrix) ─────────────────────────────
+
+# Public OSRM / ORS free tier cap the size of a single matrix request.
+_MATRIX_MAX_LOCATIONS = 50
+_MATRIX_MAX_SOURCES = 10
+
+
+def get_walking_matrix(
+    origin_lat: float,
+    origin_lng: float,
+    destinations: list[tuple[float, float]],
+) -> list[dict | None]:
+    """Walking distance/time from one origin to many (lat, lng) destinations.
+
+    With the local pedestrian graph, one search from the origin settles
+    every destination it covers. The rest use the ORS foot-walking matrix
+    when ORS_API_KEY is set, otherwise the OSRM table service with the
+    WALKING_SPEED_KMH estimate. Pairs already in the route cache are
+    answered locally; the rest cost one upstream call per 49 destinations.
+
+    Returns one {distance_km, duration_min, source} dict per destination, in
+    order, or None where no route exists.
+    """
+    return get_walking_table([(origin_lat, origin_lng)], destinations)[0]
+
+
+@memoized
+@metrics.timed
+def get_walking_table(
+    origins: list[tuple[float, float]],
+    destinations: list[tuple[float, float]],
+) -> list[list[dict | None]]:
+    """Walking legs from every origin to every destination (rows = origins).
+
+    Same sources and caching as get_walking_matrix (one local graph search
+    per origin). Uncached pairs are fetched in blocks of up to
+    10 origins × (50 − origins) destinations.
+    """
+    api_key = current_app.config.get("ORS_API_KEY", "").strip()
+    source = "openrouteservice" if api_key else "osrm_estimated"
+    cache = _route_cache()
+    graph = get_walk_graph()
+    local = [
+        graph.routes(o_lat, o_lng, destinations) if graph is not None else None
+        for o_lat, o_lng in origins
+    ]
+
+    # Full cached routes answer a matrix cell too; otherwise look for a
+    # distance-only "leg" entry from an earlier matrix call.
+    table: list[list[dict | None]] = []
+    miss_rows: dict[int, None] = {}
+    miss_cols: dict[int, None] = {}
+    missing: set[tuple[int, int]] = set()
+    for r, (o_lat, o_lng) in enumerate(origins):
+        row = []
+        for c, (lat, lng) in enumerate(destinations):
+            if local[r] is not None and local[r][c] is not None:
+                row.append(local[r][c])
+                continue
+            key, _ = _route_key(source, o_lat, o_lng, lat, lng)
+            cached = cache.get(key)
+            if cached is MISSING:
+                cached = cache.get(f"leg:{key}")
+            if cached is MISSING:
+                missing.add((r, c))
+                miss_rows[r] = miss_cols[c] = None
+                cached = None
+            elif cached is not None:
+                cached = {k: cached[k] for k in ("distance_km", "duration_min", "source")}
+            row.append(cached)
+        table.append(row)
+
+    rows, cols = list(miss_rows), list(miss_cols)
+    n_src = min(len(rows), _MATRIX_MAX_SOURCES)
+    n_dst = _MATRIX_MAX_LOCATIONS - n_src
+    for r0 in range(0, len(rows), n_src or 1):
+        row_idx = rows[r0:r0 + n_src]
+        for c0 in range(0, len(cols), n_dst):
+            col_idx = [
+                c for c in cols[c0:c0 + n_dst]
+                if any((r, c) in missing for r in row_idx)
+            ]
+            if not col_idx:
+                continue
+            srcs = tuple((float(origins[r][0]), float(origins[r][1])) for r in row_idx)
+            dsts = tuple(
+                (float(destinations[c][0]), float(destinations[c][1])) for c in col_idx
+            )
+            if api_key:
+                block = _ors_matrix(srcs, dsts, api_key)
+            else:
+                block = _osrm_estimated_matrix(srcs, dsts)
+            for r, (o_lat, o_lng), legs in zip(row_idx, srcs, block):
+                for c, (lat, lng), leg in zip(col_idx, dsts, legs):
+                    table[r][c] = leg
+                    key, _ = _route_key(source, o_lat, o_lng, lat, lng)
+                    if leg is None:
+                        cache.put(
+                            f"leg:{key}", None,
+                            ttl_s=current_app.config["ROUTE_CACHE_NEGATIVE_TTL_S"],
+                        )
+                    else:
+                        cache.put(f"leg:{key}", {**leg, "geometry": []})
+    metrics.count_legs(leg for row in table for leg in row)
+    return table
+
+
+def get_walking_routes(
+    origin_lat: float,
+    origin_lng: float,
+    destinations: list[tuple[float, float]],
+    geometry: bool = False,
+) -> list[dict | None]:
+    """get_walking_route from one origin to many destinations, as one search.
+
+    Without geometry this is get_walking_matrix. With geometry the local
+    graph returns every path it covers from one search; remote matrices
+    carry no paths, so the remaining destinations are routed one by one.
+    """
+    if not geometry:
+        return get_walking_matrix(origin_lat, origin_lng, destinations)
+
+    graph = get_walk_graph()
+    routes = (
+        graph.routes(origin_lat, origin_lng, destinations, geometry=True)
+        if graph is not None else [None] * len(destinations)
+    )
+    rest = [i for i, route in enumerate(routes) if route is None]
+    tasks = [
+        spawn(get_walking_route, origin_lat, origin_lng, *destinations[i])
+        for i in rest
+    ]
+    for i, route in zip(rest, gather(tasks)):
+        routes[i] = route
+    return routes
+
+
+@single_flight
+def _ors_matrix(
+    sources: tuple[tuple[float, float], ...],
+    destinations: tuple[tuple[float, float], ...],
+    api_key: str,
+) -> list[list[dict | None]]:
+    """Query the OpenRouteService foot-walking matrix (one row per source)."""
+    url = "https://api.openrouteservice.org/v2/matrix/foot-walking"
+    locations = [[lng, lat] for lat, lng in sources + destinations]
+
+    resp = http_client.post(
+        "ors",
+        url,
+        json={
+            "locations": locations,
+            "sources": list(range(len(sources))),
+            "destinations": list(range(len(sources), len(locations))),
+            "metrics": ["distance", "duration"],
+        },
+        headers={
+            "Authorization": api_key,
+            "Content-Type": "application/json",
+        },
+    )
+    resp.raise_for_status()
+    data = resp.json()
+
+    out = []
+    for dist_row, dur_row in zip(data["distances"], data["durations"]):
+        row = []
+        for dist_m, dur_s in zip(dist_row, dur_row):
+            if dist_m is None or dur_s is None:
+                row.append(None)
+                continue
+            row.append({
+                "distance_km": round(dist_m / 1000, 2),
+                "duration_min": round(dur_s / 60, 1),
+                "source": "openrouteservice",
+            })
+        out.append(row)
+    return out
+
+
+@single_flight
+def _osrm_estimated_matrix(
+    sources: tuple[tuple[float, float], ...],
+    destinations: tuple[tuple[float, float], ...],
+) -> list[list[dict | None]]:
+    """OSRM table distances with walk time estimated at WALKING_SPEED_KMH."""
+    base = current_app.config["OSRM_BASE_URL"]
+    coords = ";".join(f"{lng},{lat}" for lat, lng in sources + destinations)
+    url = f"{base}/table/v1/driving/{coords}"
+
+    n = len(sources)
+    resp = http_client.get(
+        "osrm",
+        url,
+        params={
+            "sources": ";".join(str(i) for i in range(n)),
+            "destinations": ";".join(str(i) for i in range(n, n + len(destinations))),
+            "annotations": "distance",
+        },
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("code") != "Ok":
+        return [[None] * len(destinations) for _ in sources]
+
+    walk_speed = current_app.config.get("WALKING_SPEED_KMH", 5.0)
+    out = []
+    for dist_row in data["distances"]:
+        row = []
+        for distance_m in dist_row:
+            if distance_m is None:
+                row.append(None)
+                continue
+            distance_km = distance_m / 1000
+            row.append({
+                "distance_km": round(distance_km, 2),
+                "duration_min": round((distance_km / walk_speed) * 60, 1),
+                "source": "osrm_estimated",
+            })
+        out.append(row)
+    return out
@@ -1,9 +1,32 @@
 """Score calculation service — aggregates walking data into exercise metrics."""
 
+import math
+
 from flask import current_app
-from app.services.routing_service import get_walking_route
-from app.services.amenities_service import search_amenities
-from app.services.transit_service import get_commute_walk_legs
+from app.services.routing_service import (
+    get_walking_matrix,
+    get_walking_route,
+    get_walking_routes,
+    get_walking_table,
+)
+from app.services.amenities_service import _haversine, amenity_lookup, amenity_results
+from app.services.distance_fields import NOT_COVERED, nearest_amenity
+from app.services.executor import as_completed, gather, spawn
+from app.services.isochrone import classify_points, get_walk_isochrone
+from app.services.memo import in_request_memo
+from app.services.poi_service import fetch_pois
+from app.services.stop_index import get_stop_index
+from app.services.transit_service import (
+    find_nearest_transit_stops,
+    get_commute_walk_legs,
+    transit_stop_lookup,
+    transit_stop_results,
+    uses_stop_heuristic,
+)
+
+# Search radii used by the score (metres)
+_AMENITY_RADIUS_M = 3000
+_TRANSIT_RADIUS_M = 2000
 
 
 def _letter_grade(pct: float) -> str:
@@ -21,6 +44,257 @@ def _letter_grade(pct: float) -> str:
     return "F"
 
 
+def _prefetch_pois(
+    home_lat: float,
+    home_lng: float,
+    work_lat: float | None,
+    work_lng: float | None,
+    amenity_types: list[str],
+    with_transit_stops: bool,
+) -> tuple[dict[str, list[dict]], list[dict] | None, list[dict] | None]:
+    """Fetch every amenity type and both transit-stop lists in one batch.
+
+    The batch costs at most one Overpass round-trip (none if tiles are cached).
+    Stops come from the local stop index instead when one has been built.
+
+    Returns (amenities by type, home stops, work stops); the stop lists are
+    None when *with_transit_stops* is false.
+    """
+    types = list(dict.fromkeys(amenity_types))
+    lookups = [
+        amenity_lookup(home_lat, home_lng, t, _AMENITY_RADIUS_M) for t in types
+    ]
+    local_stops = with_transit_stops and get_stop_index() is not None
+    if with_transit_stops and not local_stops:
+        lookups.append(transit_stop_lookup(home_lat, home_lng, _TRANSIT_RADIUS_M))
+        lookups.append(transit_stop_lookup(work_lat, work_lng, _TRANSIT_RADIUS_M))
+
+    elements = fetch_pois(lookups) if lookups else []
+
+    # The isochrone estimate is per point and cheap, so it sees every candidate
+    k = None if _isochrone_routing() else current_app.config["AMENITY_CANDIDATES"]
+    by_type = {
+        t: amenity_results(home_lat, home_lng, t, els, limit=k)
+        for t, els in zip(types, elements)
+    }
+    if not with_transit_stops:
+        return by_type, None, None
+    if local_stops:
+        return (
+            by_type,
+            find_nearest_transit_stops(home_lat, home_lng, _TRANSIT_RADIUS_M),
+            find_nearest_transit_stops(work_lat, work_lng, _TRANSIT_RADIUS_M),
+        )
+    home_stops = transit_stop_results(home_lat, home_lng, elements[-2])
+    work_stops = transit_stop_results(work_lat, work_lng, elements[-1])
+    return by_type, home_stops, work_stops
+
+
+def _commute_item(
+    home_lat: float,
+    home_lng: float,
+    work_lat: float,
+    work_lng: float,
+    work_days_per_week: int,
+    commute_mode: str,
+    home_stops: list[dict] | None,
+    work_stops: list[dict] | None,
+    include_geometry: bool = True,
+    home_legs: dict[tuple[float, float], dict | None] | None = None,
+) -> dict | None:
+    """Breakdown entry for the work commute, or None if it can't be routed.
+
+    *home_legs* are walking legs from home found by _home_legs.
+    """
+    if commute_mode == "transit":
+        # Realistic: walk to transit stop + walk from transit stop to work
+        commute = get_commute_walk_legs(
+            home_lat, home_lng, work_lat, work_lng, _TRANSIT_RADIUS_M,
+            home_stops=home_stops, work_stops=work_stops, geometry=include_geometry,
+            home_legs=home_legs,
+        )
+        if not commute:
+            return None
+        walk_min = commute["total_walk_min"]
+        walk_km = commute["total_walk_km"]
+        weekly_min = walk_min * 2 * work_days_per_week
+
+        label = "Work commute"
+        if commute["mode"] == "transit":
+            h2t = commute.get("home_to_transit")
+            t2w = commute.get("transit_to_work")
+            if h2t and t2w:
+                label = (
+                    f"Walk to {h2t['stop_name']} "
+                    f"+ walk from {t2w['stop_name']} to work"
+                )
+            elif h2t:
+                label = f"Walk to {h2t['stop_name']} + transit to work"
+
+        return {
+            "label": label,
+            "distance_km": walk_km,
+            "one_way_min": walk_min,
+            "round_trips_per_week": work_days_per_week,
+            "weekly_minutes": round(weekly_min, 1),
+            "commute_mode": commute["mode"],
+            "commute_detail": commute,
+            "source": commute.get("source", "unknown"),
+        }
+
+    # Legacy: walk the entire distance (the entry carries no geometry)
+    if home_legs is not None and (work_lat, work_lng) in home_legs:
+        route = home_legs[(work_lat, work_lng)]
+    else:
+        route = get_walking_route(home_lat, home_lng, work_lat, work_lng, geometry=False)
+    if not route:
+        return None
+    weekly_min = route["duration_min"] * 2 * work_days_per_week
+    return {
+        "label": "Work commute (full walk)",
+        "distance_km": route["distance_km"],
+        "one_way_min": route["duration_min"],
+        "round_trips_per_week": work_days_per_week,
+        "weekly_minutes": round(weekly_min, 1),
+        "commute_mode": "walk",
+    }
+
+
+def _amenity_entry(item: dict, nearest: dict, route: dict) -> dict:
+    """Breakdown entry for trips to *nearest* along *route*."""
+    visits = item.get("visits_per_week", 3)
+    weekly_min = route["duration_min"] * 2 * visits
+    return {
+        "label": f"{item['amenity_type'].title()} ({nearest['name']})",
+        "distance_km": route["distance_km"],
+        "one_way_min": route["duration_min"],
+        "round_trips_per_week": visits,
+        "weekly_minutes": round(weekly_min, 1),
+    }
+
+
+def _amenity_items(
+    home_lat: float,
+    home_lng: float,
+    amenities: list[dict],
+    pois: dict[str, list[dict]],
+    legs: dict[tuple[float, float], dict | None] | None = None,
+) -> list[dict | None]:
+    """Breakdown entries for every amenity, nearest by *walking* distance.
+
+    The top AMENITY_CANDIDATES of each type (by straight-line distance) are
+    scored against the home in one walking-matrix call, and the candidate
+    with the shortest network distance wins. *legs* ((lat, lng) → leg) are
+    pre-computed matrix results (see score_batch) that replace the call.
+    With SCORE_AMENITY_ROUTING=isochrone (and no *legs*) every candidate is
+    estimated from one walk isochrone instead.
+    """
+    if legs is None and _isochrone_routing():
+        return _isochrone_amenity_items(home_lat, home_lng, amenities, pois)
+
+    k = current_app.config["AMENITY_CANDIDATES"]
+    candidates = [(pois.get(item["amenity_type"]) or [])[:k] for item in amenities]
+    coords = _candidate_coords(candidates)
+    if not coords:
+        return [None] * len(amenities)
+
+    if legs is None:
+        try:
+            legs = dict(zip(coords, get_walking_matrix(home_lat, home_lng, coords)))
+        except Exception as exc:
+            current_app.logger.warning(
+                "Walking matrix failed, routing nearest candidates one by one: %s", exc
+            )
+            return gather([
+                spawn(_routed_amenity_entry, home_lat, home_lng, item, cs[0] if cs else None)
+                for item, cs in zip(amenities, candidates)
+            ])
+
+    entries = []
+    for item, cs in zip(amenities, candidates):
+        scored = [(legs.get((c["lat"], c["lng"])), c) for c in cs]
+        scored = [(leg, c) for leg, c in scored if leg is not None]
+        if not scored:
+            entries.append(None)
+            continue
+        leg, nearest = min(scored, key=lambda lc: lc[0]["distance_km"])
+        entries.append(_amenity_entry(item, nearest, leg))
+    return entries
+
+
+def _home_legs(
+    home_lat: float, home_lng: float, targets: list[tuple[float, float]]
+) -> dict[tuple[float, float], dict | None] | None:
+    """Walking legs from home to every target with one search, or None on failure.
+
+    One local graph search or one walking-matrix call (see
+    get_walking_routes) instead of a route per amenity candidate, transit
+    stop and the work place.
+    """
+    coords = list(dict.fromkeys(targets))
+    if not coords:
+        return None
+    try:
+        return dict(zip(coords, get_walking_routes(home_lat, home_lng, coords)))
+    except Exception as exc:
+        current_app.logger.warning("One-to-many walking search failed: %s", exc)
+        return None
+
+
+def _isochrone_routing() -> bool:
+    return current_app.config.get("SCORE_AMENITY_ROUTING", "matrix") == "isochrone"
+
+
+def _isochrone_amenity_items(
+    home_lat: float, home_lng: float, amenities: list[dict], pois: dict[str, list[dict]]
+) -> list[dict | None]:
+    """Breakdown entries from a walk isochrone covering the amenity search radius."""
+    candidates = [pois.get(item["amenity_type"]) or [] for item in amenities]
+    coords = _candidate_coords(candidates)
+    if not coords:
+        return [None] * len(amenities)
+
+    m_per_min = current_app.config.get("WALKING_SPEED_KMH", 5.0) * 1000 / 60
+    iso = get_walk_isochrone(home_lat, home_lng, _AMENITY_RADIUS_M / m_per_min)
+    estimates = dict(zip(coords, classify_points(iso, coords)))
+
+    entries = []
+    for item, cs in zip(amenities, candidates):
+        scored = [(estimates[(c["lat"], c["lng"])], c) for c in cs]
+        scored = [(est, c) for est, c in scored if est["distance_km"] is not None]
+        if not scored:
+            entries.append(None)
+            continue
+        est, nearest = min(scored, key=lambda ec: ec[0]["distance_km"])
+        route = {
+            "distance_km": est["distance_km"],
+            "duration_min": est["duration_min"],
+            "source": "isochrone",
+        }
+        entries.append(_amenity_entry(item, nearest, route))
+    return entries
+
+
+def _candidate_coords(candidates: list[list[dict]]) -> list[tuple[float, float]]:
+    """Unique (lat, lng) of every candidate, in first-seen order."""
+    return list(dict.fromkeys((c["lat"], c["lng"]) for cs in candidates for c in cs))
+
+
+def _routed_amenity_entry(
+    home_lat: float, home_lng: float, item: dict, nearest: dict | None
+) -> dict | None:
+    """Fallback: route to a single candidate with get_walking_route."""
+    if nearest is None:
+        return None
+    route = get_walking_route(
+        home_lat, home_lng, nearest["lat"], nearest["lng"], geometry=False
+    )
+    if route is None:
+        return None
+    return _amenity_entry(item, nearest, route)
+
+
+@in_request_memo
 def calculate_score(
     home_lat: float,
     home_lng: float,
@@ -29,6 +303,7 @@ def calculate_score(
     amenities: list[dict] | None = None,
     work_days_per_week: int = 5,
     commute_mode: str = "transit",
+    include_geometry: bool = True,
 ) -> dict:
     """
     Compute an overall exercise score.
@@ -40,107 +315,343 @@ def calculate_score(
     amenities : list of {"amenity_type": str, "visits_per_week": int}
     work_days_per_week : how many days they commute on foot
     commute_mode : "transit" (walk to/from station) or "walk" (entire distance)
+    include_geometry : fetch commute leg geometry (False skips it upstream)
 
     Returns
     -------
     dict with total_weekly_walk_min, total_weekly_calories,
     who_guideline_pct, grade, and a per-item breakdown.
     """
-    cal_per_min = current_app.config["CALORIES_PER_MINUTE_WALKING"]
-    who_min = current_app.config["WHO_WEEKLY_MINUTES"]
-    breakdown: list[dict] = []
+    items: dict[int, dict] = {}
+    result: dict = {}
+    for event, data in score_events(
+        home_lat, home_lng, work_lat, work_lng, amenities,
+        work_days_per_week, commute_mode, include_geometry,
+    ):
+        if event == "item":
+            items[data["index"]] = data["item"]
+        elif event == "grade":
+            result = data
+    return {**result, "breakdown": [items[i] for i in sorted(items)]}
+
+
+@in_request_memo
+def score_events(
+    home_lat: float,
+    home_lng: float,
+    work_lat: float | None = None,
+    work_lng: float | None = None,
+    amenities: list[dict] | None = None,
+    work_days_per_week: int = 5,
+    commute_mode: str = "transit",
+    include_geometry: bool = True,
+):
+    """
+    Compute a score incrementally (same parameters as calculate_score).
+
+    Yields (event, data) pairs:
+        ("item",   {"index", "item"})  a breakdown entry as soon as it is
+                                       ready; index is its breakdown position
+                                       (commute first, then amenities in order)
+        ("totals", {...})              running totals after each item
+        ("grade",  {...})              final totals plus the letter grade
+
+    Routing and POI calls are memoized for the whole computation (see
+    memo.py), so repeated legs and alias lookups cost one upstream call.
+    """
+    has_work = work_lat is not None and work_lng is not None
+    tasks = {}
 
     # ------------------------------------------------------------------
-    # 1. Work commute
+    # 0. Distance-field answers, then one batched POI fetch for every
+    #    lookup below. Transit stops are only needed by the heuristic used
+    #    when neither Google nor a GTFS timetable is available; any other
+    #    commute (walk mode or a routed transit trip) starts right away.
     # ------------------------------------------------------------------
-    if work_lat is not None and work_lng is not None:
-        if commute_mode == "transit":
-            # Realistic: walk to transit stop + walk from transit stop to work
-            commute = get_commute_walk_legs(
-                home_lat, home_lng, work_lat, work_lng
-            )
-            if commute:
-                walk_min = commute["total_walk_min"]
-                walk_km = commute["total_walk_km"]
-                weekly_min = walk_min * 2 * work_days_per_week
-
-                label = "Work commute"
-                if commute["mode"] == "transit":
-                    h2t = commute.get("home_to_transit")
-                    t2w = commute.get("transit_to_work")
-                    if h2t and t2w:
-                        label = (
-                            f"Walk to {h2t['stop_name']} "
-                            f"+ walk from {t2w['stop_name']} to work"
-                        )
-                    elif h2t:
-                        label = f"Walk to {h2t['stop_name']} + transit to work"
-
-                breakdown.append({
-                    "label": label,
-                    "distance_km": walk_km,
-                    "one_way_min": walk_min,
-                    "round_trips_per_week": work_days_per_week,
-                    "weekly_minutes": round(weekly_min, 1),
-                    "commute_mode": commute["mode"],
-                    "commute_detail": commute,
-                    "source": commute.get("source", "unknown"),
-                })
+    with_stops = has_work and commute_mode == "transit" and uses_stop_heuristic()
+    if has_work and not with_stops:
+        tasks[spawn(
+            _commute_item, home_lat, home_lng, work_lat, work_lng,
+            work_days_per_week, commute_mode, None, None, include_geometry,
+        )] = "commute"
+
+    offset = 1 if has_work else 0
+    done: dict[int, dict] = {}
+
+    def emit(index: int, entry: dict | None):
+        if entry is None:
+            return
+        done[index] = entry
+        yield "item", {"index": index, "item": entry}
+        yield "totals", _totals(sum(e["weekly_minutes"] for e in done.values()))
+
+    # Amenities inside a precomputed distance-field region are answered now
+    live: list[tuple[int, dict]] = []  # (breakdown index, item) for the live path
+    for i, item in enumerate(amenities or []):
+        hit = nearest_amenity(home_lat, home_lng, item["amenity_type"])
+        if hit is NOT_COVERED:
+            live.append((offset + i, item))
+        elif hit is not None:
+            yield from emit(offset + i, _amenity_entry(item, *hit))
+
+    amenity_types = [item["amenity_type"] for _, item in live]
+    if amenity_types or with_stops:
+        pois, home_stops, work_stops = _prefetch_pois(
+            home_lat, home_lng, work_lat, work_lng, amenity_types, with_stops
+        )
+    else:
+        pois, home_stops, work_stops = {}, None, None
+
+    # ------------------------------------------------------------------
+    # 1. One walking search from home to every amenity candidate and, for
+    #    the stop heuristic, the nearest home stop and the work place (the
+    #    direct walk), started in the background
+    # ------------------------------------------------------------------
+    live_items = [item for _, item in live]
+    targets = []
+    if not _isochrone_routing():
+        k = current_app.config["AMENITY_CANDIDATES"]
+        targets += _candidate_coords(
+            [(pois.get(item["amenity_type"]) or [])[:k] for item in live_items]
+        )
+    if with_stops:
+        targets.append((work_lat, work_lng))
+        if home_stops and not include_geometry:
+            targets.append((home_stops[0]["lat"], home_stops[0]["lng"]))
+    legs_task = spawn(_home_legs, home_lat, home_lng, targets) if targets else None
+
+    def with_home_legs(fn, *args):
+        """fn(*args, home_legs) once the shared search has finished."""
+        return fn(*args, legs_task.result() if legs_task is not None else None)
+
+    # ------------------------------------------------------------------
+    # 2. Work commute and amenity trips, fanned out concurrently and
+    #    reported in the order they finish
+    # ------------------------------------------------------------------
+    if with_stops:
+        tasks[spawn(
+            with_home_legs, _commute_item, home_lat, home_lng, work_lat, work_lng,
+            work_days_per_week, commute_mode, home_stops, work_stops, include_geometry,
+        )] = "commute"
+    if live:
+        if _isochrone_routing():
+            task = spawn(_amenity_items, home_lat, home_lng, live_items, pois)
+        else:
+            task = spawn(with_home_legs, _amenity_items, home_lat, home_lng, live_items, pois)
+        tasks[task] = "amenities"
+
+    for task in as_completed(list(tasks)):
+        if tasks[task] == "commute":
+            entries = [(0, task.result())]
         else:
-            # Legacy: walk the entire distance
-            route = get_walking_route(home_lat, home_lng, work_lat, work_lng)
-            if route:
-                weekly_min = route["duration_min"] * 2 * work_days_per_week
-                breakdown.append({
-                    "label": "Work commute (full walk)",
-                    "distance_km": route["distance_km"],
-                    "one_way_min": route["duration_min"],
-                    "round_trips_per_week": work_days_per_week,
-                    "weekly_minutes": round(weekly_min, 1),
-                    "commute_mode": "walk",
-                })
+            entries = [(index, e) for (index, _), e in zip(live, task.result())]
+        for index, entry in entries:
+            yield from emit(index, entry)
 
     # ------------------------------------------------------------------
-    # 2. Amenity trips
+    # 3. Aggregate (in breakdown order)
     # ------------------------------------------------------------------
-    for item in amenities or []:
-        amenity_type = item["amenity_type"]
-        visits = item.get("visits_per_week", 3)
+    totals = _totals(sum(done[i]["weekly_minutes"] for i in sorted(done)))
+    yield "grade", {**totals, "grade": _letter_grade(totals["who_guideline_pct"])}
 
-        # Find the nearest amenity of this type
-        results = search_amenities(home_lat, home_lng, amenity_type, radius_m=3000)
-        if not results:
-            continue
 
-        nearest = results[0]
-        route = get_walking_route(
-            home_lat, home_lng, nearest["lat"], nearest["lng"]
+def _totals(total_min: float) -> dict:
+    """Weekly minutes, calories and WHO percentage for *total_min*."""
+    cal_per_min = current_app.config["CALORIES_PER_MINUTE_WALKING"]
+    who_min = current_app.config["WHO_WEEKLY_MINUTES"]
+    return {
+        "total_weekly_walk_min": round(total_min, 1),
+        "total_weekly_calories": round(total_min * cal_per_min, 0),
+        "who_guideline_pct": round((total_min / who_min) * 100, 1) if who_min else 0,
+    }
+
+
+# ── Batch scoring ────────────────────────────────────────────────────
+
+
+@in_request_memo
+def score_batch(
+    homes: list[tuple[float, float]],
+    work_lat: float | None = None,
+    work_lng: float | None = None,
+    amenities: list[dict] | None = None,
+    work_days_per_week: int = 5,
+    commute_mode: str = "transit",
+    include_geometry: bool = False,
+) -> list[dict]:
+    """
+    Score many homes against one work location and amenity list.
+
+    Homes are grouped into SCORE_BATCH_GROUP_M grid cells. All POI lookups
+    (one per group and type, widened to cover every home in the group, plus
+    the work-side transit stops once) go out as a single fetch_pois batch,
+    and each group's amenity candidates are routed with one walking table.
+
+    Returns one calculate_score-shaped dict per home, in order, each with an
+    "errors" list of {"item", "error"} for parts that failed; the totals and
+    grade cover the parts that succeeded.
+    """
+    amenities = amenities or []
+    has_work = work_lat is not None and work_lng is not None
+    with_stops = has_work and commute_mode == "transit" and uses_stop_heuristic()
+    # With a local stop index, stops are looked up per home instead of fetched
+    local_stops = with_stops and get_stop_index() is not None
+    fetch_stops = with_stops and not local_stops
+    k = current_app.config["AMENITY_CANDIDATES"]
+    types = list(dict.fromkeys(item["amenity_type"] for item in amenities))
+    groups = _group_homes(homes)
+
+    # ------------------------------------------------------------------
+    # 0. Every POI lookup of the batch in one fetch
+    # ------------------------------------------------------------------
+    lookups = []
+    for members in groups:
+        c_lat, c_lng, spread = _group_extent([homes[i] for i in members])
+        lookups.extend(
+            amenity_lookup(c_lat, c_lng, t, _AMENITY_RADIUS_M + spread) for t in types
         )
-        if route is None:
-            continue
+        if fetch_stops:
+            lookups.append(transit_stop_lookup(c_lat, c_lng, _TRANSIT_RADIUS_M + spread))
+    if fetch_stops:
+        lookups.append(transit_stop_lookup(work_lat, work_lng, _TRANSIT_RADIUS_M))
+
+    poi_error = None
+    elements: list[list[dict]] = []
+    if lookups:
+        try:
+            elements = fetch_pois(lookups)
+        except Exception as exc:
+            current_app.logger.warning("Batch POI fetch failed: %s", exc)
+            poi_error = str(exc)
+
+    # Per-home amenity candidates and stops, cut back to the home's own radius
+    per_group = len(types) + (1 if fetch_stops else 0)
+    pois: list[dict[str, list[dict]]] = [{} for _ in homes]
+    home_stops: list[list[dict] | None] = [None] * len(homes)
+    work_stops = None
+    if local_stops:
+        work_stops = find_nearest_transit_stops(work_lat, work_lng, _TRANSIT_RADIUS_M)
+        home_stops = [find_nearest_transit_stops(h[0], h[1], _TRANSIT_RADIUS_M) for h in homes]
+    if elements and fetch_stops:
+        work_stops = transit_stop_results(work_lat, work_lng, elements[-1])
+    for g, members in enumerate(groups):
+        group_els = elements[g * per_group:(g + 1) * per_group] if elements else []
+        for i in members:
+            h_lat, h_lng = homes[i]
+            for t, els in zip(types, group_els):
+                pois[i][t] = [
+                    r for r in amenity_results(h_lat, h_lng, t, els, limit=k)
+                    if r["distance_m"] <= _AMENITY_RADIUS_M
+                ]
+            if fetch_stops and group_els:
+                home_stops[i] = [
+                    r for r in transit_stop_results(h_lat, h_lng, group_els[-1])
+                    if r["distance_m"] <= _TRANSIT_RADIUS_M
+                ]
 
-        weekly_min = route["duration_min"] * 2 * visits
-        breakdown.append(
-            {
-                "label": f"{amenity_type.title()} ({nearest['name']})",
-                "distance_km": route["distance_km"],
-                "one_way_min": route["duration_min"],
-                "round_trips_per_week": visits,
-                "weekly_minutes": round(weekly_min, 1),
-            }
+    # ------------------------------------------------------------------
+    # 1. One walking table per group: its homes × their amenity candidates
+    # ------------------------------------------------------------------
+    legs: list[dict | None] = [None] * len(homes)
+    tables = []
+    for members in groups:
+        coords = _candidate_coords(
+            [cs for i in members for cs in pois[i].values()]
         )
+        if coords:
+            tables.append((members, coords, spawn(
+                get_walking_table, [homes[i] for i in members], coords
+            )))
+    for members, coords, task in tables:
+        try:
+            rows = task.result()
+        except Exception as exc:
+            # Homes left without legs fall back to their own matrix call
+            current_app.logger.warning("Batch walking table failed: %s", exc)
+            continue
+        for i, row in zip(members, rows):
+            legs[i] = dict(zip(coords, row))
 
     # ------------------------------------------------------------------
-    # 3. Aggregate
+    # 2. Commute and amenity entries per home, fanned out
     # ------------------------------------------------------------------
-    total_min = sum(b["weekly_minutes"] for b in breakdown)
-    total_cal = round(total_min * cal_per_min, 0)
-    who_pct = round((total_min / who_min) * 100, 1) if who_min else 0
+    tasks = [
+        spawn(
+            _batch_home_score, homes[i], work_lat, work_lng, amenities, pois[i],
+            legs[i], home_stops[i], work_stops, work_days_per_week, commute_mode,
+            include_geometry, poi_error,
+        )
+        for i in range(len(homes))
+    ]
+    results = []
+    for task in tasks:
+        try:
+            results.append(task.result())
+        except Exception as exc:
+            results.append({"error": str(exc)})
+    return results
+
+
+def _group_homes(homes: list[tuple[float, float]]) -> list[list[int]]:
+    """Indexes of *homes* grouped by SCORE_BATCH_GROUP_M grid cell."""
+    cell_deg = current_app.config["SCORE_BATCH_GROUP_M"] / 111_320
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, (lat, lng) in enumerate(homes):
+        cell = (math.floor(lat / cell_deg), math.floor(lng / cell_deg))
+        groups.setdefault(cell, []).append(i)
+    return list(groups.values())
+
+
+def _group_extent(points: list[tuple[float, float]]) -> tuple[float, float, int]:
+    """(centroid lat, centroid lng, metres from centroid to the farthest point)."""
+    c_lat = sum(p[0] for p in points) / len(points)
+    c_lng = sum(p[1] for p in points) / len(points)
+    spread = max(_haversine(c_lat, c_lng, lat, lng) for lat, lng in points)
+    return c_lat, c_lng, math.ceil(spread)
 
+
+def _batch_home_score(
+    home: tuple[float, float],
+    work_lat: float | None,
+    work_lng: float | None,
+    amenities: list[dict],
+    pois: dict[str, list[dict]],
+    legs: dict | None,
+    home_stops: list[dict] | None,
+    work_stops: list[dict] | None,
+    work_days_per_week: int,
+    commute_mode: str,
+    include_geometry: bool,
+    poi_error: str | None,
+) -> dict:
+    """One home's score from the batch's shared lookups; failures go to "errors"."""
+    home_lat, home_lng = home
+    breakdown, errors = [], []
+
+    if work_lat is not None and work_lng is not None:
+        try:
+            entry = _commute_item(
+                home_lat, home_lng, work_lat, work_lng, work_days_per_week,
+                commute_mode, home_stops, work_stops, include_geometry,
+            )
+            if entry is not None:
+                breakdown.append(entry)
+        except Exception as exc:
+            errors.append({"item": "commute", "error": str(exc)})
+
+    if amenities and poi_error is not None:
+        errors.append({"item": "amenities", "error": poi_error})
+    elif amenities:
+        try:
+            entries = _amenity_items(home_lat, home_lng, amenities, pois, legs)
+            breakdown.extend(e for e in entries if e is not None)
+        except Exception as exc:
+            errors.append({"item": "amenities", "error": str(exc)})
+
+    totals = _totals(sum(b["weekly_minutes"] for b in breakdown))
     return {
-        "total_weekly_walk_min": round(total_min, 1),
-        "total_weekly_calories": total_cal,
-        "who_guideline_pct": who_pct,
-        "grade": _letter_grade(who_pct),
+        **totals,
+        "grade": _letter_grade(totals["who_guideline_pct"]),
         "breakdown": breakdown,
+        "errors": errors,
     }
@@ -0,0 +1,71 @@
+"""Single-flight — concurrent identical upstream calls share one in-flight result.
+
+When several threads call a ``@single_flight`` function with the same
+arguments at the same time, only the first (the *leader*) runs it; the rest
+block until it finishes and get a copy of its result (or its exception).
+Nothing is cached: once the call returns, the next caller starts a new one.
+"""
+
+import copy
+import functools
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+_calls: dict[tuple, _Call] = {}
+_lock = threading.Lock()
+
+
+def single_flight(fn):
+    """Decorator: coalesce concurrent calls with equal (hashable) arguments."""
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(*args, **kwargs)
+
+        with _lock:
+            call = _calls.get(key)
+            leader = call is None
+            if leader:
+                call = _calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        else:
+            call.result = result
+        finally:
+            with _lock:
+                del _calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+
+        # Followers copy call.result; hand the leader its own copy so nobody
+        # sees another caller's mutations.
+        return copy.deepcopy(result) if shared else result
+
+    return wrapper
@@ -0,0 +1,236 @@
+"""Local transit-stop index — nearest-stop lookups without Overpass.
+
+``flask build-stop-index --gtfs feed.zip [--gtfs ...] [--osm extract]``
+collects boarding stops from GTFS ``stops.txt`` (typed by the routes that
+serve them), optionally topped up with transit stops from an OSM extract
+(.pbf or Overpass .json, typed from their tags) that the feeds lack, and
+writes them to STOP_INDEX_PATH. When it exists, find_nearest_transit_stops
+and the score's stop prefetch answer from it instead of sending a
+transit-stop query to Overpass. OSM stops alone need no index of their
+own: the POI index (poi_index.py, POI_SOURCE=index) already holds them.
+
+OSM stops within _MERGE_M of a GTFS stop are taken to be the same stop and
+dropped; stops at the same rounded coordinates are kept once, as
+transit_stop_results does.
+
+Layout (.npz): stops sorted by grid cell (see grid.py); ``cell_keys``
+(sorted) and ``cell_start`` give the slice of stops per cell.
+"""
+
+import os
+import threading
+import zipfile
+
+import numpy as np
+from flask import current_app
+
+from app.services import grid
+from app.services.amenities_service import haversine_many, nearest_order
+
+_FORMAT_VERSION = 1
+_CELL_DEG = 0.005           # ≈ 550 m north-south
+# OSM stops this close to a GTFS stop are duplicates of it
+_MERGE_M = 25
+
+STOP_TYPES = ("bus_stop", "train_station", "tram_stop", "ferry_terminal")
+# Preference when a stop is served by several kinds of vehicle
+_TYPE_RANK = {"train_station": 0, "tram_stop": 1, "ferry_terminal": 2, "bus_stop": 3}
+
+
+def gtfs_stop_type(route_type: int) -> str:
+    """Stop type for a stop served by GTFS *route_type* (basic or extended)."""
+    if route_type in (1, 2, 12) or route_type // 100 in (1, 4):
+        return "train_station"
+    if route_type in (0, 5) or route_type // 100 == 9:
+        return "tram_stop"
+    if route_type == 4 or route_type // 100 in (10, 12):
+        return "ferry_terminal"
+    return "bus_stop"
+
+
+class StopIndex:
+    """Grid index of transit stops (see module docstring)."""
+
+    def __init__(self, data: dict):
+        self.lat: np.ndarray = data["lat"]
+        self.lng: np.ndarray = data["lng"]
+        self.names: np.ndarray = data["names"]
+        self.types: np.ndarray = data["types"]      # uint8 index into STOP_TYPES
+        self.cell_keys: np.ndarray = data["cell_keys"]
+        self.cell_start: np.ndarray = data["cell_start"]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ── Building / persistence ──────────────────────────────────────
+
+    @classmethod
+    def build(cls, stops: list[tuple[str, float, float, str]]) -> "StopIndex":
+        """Index (name, lat, lng, stop type) tuples."""
+        lat = np.array([s[1] for s in stops], dtype=np.float64)
+        lng = np.array([s[2] for s in stops], dtype=np.float64)
+        keys = grid.cell_keys(lat, lng, _CELL_DEG)
+        order = np.argsort(keys, kind="stable")
+        cell_keys, cell_start = np.unique(keys[order], return_index=True)
+        return cls({
+            "lat": lat[order],
+            "lng": lng[order],
+            "names": np.array([stops[i][0] for i in order.tolist()], dtype=np.str_),
+            "types": np.array(
+                [STOP_TYPES.index(stops[i][3]) for i in order.tolist()], dtype=np.uint8
+            ),
+            "cell_keys": cell_keys,
+            "cell_start": np.append(cell_start, len(stops)).astype(np.int64),
+        })
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            version=np.array(_FORMAT_VERSION),
+            lat=self.lat,
+            lng=self.lng,
+            names=self.names,
+            types=self.types,
+            cell_keys=self.cell_keys,
+            cell_start=self.cell_start,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "StopIndex":
+        with np.load(path, allow_pickle=False) as f:
+            data = {k: f[k] for k in f.files}
+        if int(data.pop("version")) != _FORMAT_VERSION:
+            raise ValueError(f"{path} was built by an incompatible version; rebuild it")
+        return cls(data)
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    def within(self, lat: float, lng: float, radius_m: float) -> tuple[np.ndarray, np.ndarray]:
+        """(stop indexes, distances in metres) within *radius_m*, unsorted."""
+        idx = grid.items_near(self.cell_keys, self.cell_start, lat, lng, radius_m, _CELL_DEG)
+        if not len(idx):
+            return idx, np.empty(0)
+        dists = haversine_many(lat, lng, self.lat[idx], self.lng[idx])
+        keep = dists <= radius_m
+        return idx[keep], dists[keep]
+
+    def nearest(
+        self, lat: float, lng: float, radius_m: float, limit: int | None = 5
+    ) -> list[dict]:
+        """The nearest *limit* stops within *radius_m*, shaped like transit_stop_results."""
+        idx, dists = self.within(lat, lng, radius_m)
+        dists = np.round(dists)
+        return [
+            {
+                "name": str(self.names[idx[j]]),
+                "lat": float(self.lat[idx[j]]),
+                "lng": float(self.lng[idx[j]]),
+                "type": STOP_TYPES[self.types[idx[j]]],
+                "distance_m": float(dists[j]),
+            }
+            for j in nearest_order(dists, limit).tolist()
+        ]
+
+
+# ── Process-wide index ───────────────────────────────────────────────
+
+_index: StopIndex | None = None
+_index_mtime: float | None = None
+_index_lock = threading.Lock()
+
+
+def get_stop_index() -> StopIndex | None:
+    """The index at STOP_INDEX_PATH (reloaded when the file changes), or None."""
+    global _index, _index_mtime
+    path = current_app.config["STOP_INDEX_PATH"]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = StopIndex.load(path)
+            _index_mtime = mtime
+        return _index
+
+
+# ── Ingestion ────────────────────────────────────────────────────────
+
+
+def read_gtfs_stops(path: str) -> list[tuple[str, float, float, str]]:
+    """Boarding stops from a GTFS zip, typed by the routes serving them.
+
+    Stops no trip calls at are left out when the feed has stop_times.txt.
+    """
+    from app.services.gtfs_router import read_csv
+
+    with zipfile.ZipFile(path) as feed:
+        route_types = {
+            r["route_id"]: int(r.get("route_type") or 3) for r in read_csv(feed, "routes.txt")
+        }
+        trip_types = {
+            t["trip_id"]: route_types.get(t["route_id"], 3) for t in read_csv(feed, "trips.txt")
+        }
+        served: dict[str, str] = {}
+        for row in read_csv(feed, "stop_times.txt"):
+            stop_type = gtfs_stop_type(trip_types.get(row["trip_id"], 3))
+            current = served.get(row["stop_id"])
+            if current is None or _TYPE_RANK[stop_type] < _TYPE_RANK[current]:
+                served[row["stop_id"]] = stop_type
+
+        stops = []
+        for row in read_csv(feed, "stops.txt"):
+            if row.get("location_type", "0") not in ("", "0"):
+                continue
+            if served and row["stop_id"] not in served:
+                continue
+            stops.append((
+                row.get("stop_name") or "Unnamed stop",
+                float(row["stop_lat"]),
+                float(row["stop_lon"]),
+                served.get(row["stop_id"], "bus_stop"),
+            ))
+    return stops
+
+
+def read_osm_stops(path: str) -> list[tuple[str, float, float, str]]:
+    """Transit stop nodes from an OSM extract (.pbf or Overpass .json)."""
+    from app.services.overpass_service import matches_tag_groups
+    from app.services.poi_index import read_overpass_json, read_pbf
+    from app.services.transit_service import TRANSIT_STOP_TAGS, osm_stop_type
+
+    if path.endswith(".pbf"):
+        elements = read_pbf(path, TRANSIT_STOP_TAGS)
+    else:
+        elements = read_overpass_json(path)
+    return [
+        (el.get("tags", {}).get("name", "Unnamed stop"), el["lat"], el["lon"],
+         osm_stop_type(el.get("tags", {})))
+        for el in elements
+        if el.get("type") == "node" and el.get("lat") is not None
+        and matches_tag_groups(el.get("tags", {}), TRANSIT_STOP_TAGS)
+    ]
+
+
+def build_stop_index(gtfs: list[str], osm: str | None, output: str) -> StopIndex:
+    """Index stops from GTFS zips *gtfs* (plus OSM extract *osm*), write to *output*."""
+    stops = [s for path in gtfs for s in read_gtfs_stops(path)]
+    if not stops:
+        raise ValueError("No transit stops found in the GTFS feeds")
+    if osm:
+        gtfs_index = StopIndex.build(stops)
+        for stop in read_osm_stops(osm):
+            if not len(gtfs_index.within(stop[1], stop[2], _MERGE_M)[0]):
+                stops.append(stop)
+
+    # Many stops share the same physical location (keep the first)
+    unique = {}
+    for stop in stops:
+        unique.setdefault((round(stop[1], 5), round(stop[2], 5)), stop)
+
+    index = StopIndex.build(list(unique.values()))
+    index.save(output)
+    return index
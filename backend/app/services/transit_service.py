@@ -1,16 +1,31 @@
 """Transit service — finds nearby transit stops and computes walk-to-transit commutes.
 
 Uses Google Routes API when GOOGLE_MAPS_API_KEY is set (accurate real-world
-transit routing). Falls back to the Overpass heuristic otherwise.
+transit routing), then the local GTFS timetable when one has been built (see
+gtfs_router.py). Falls back to the Overpass heuristic otherwise.
 """
 
-import time
-import math
-import requests
+from datetime import datetime
+
+import numpy as np
 from flask import current_app
 
-# Reuse the Overpass throttle from amenities_service
-from app.services.amenities_service import _throttle_overpass, _haversine, _OVERPASS_MIN_INTERVAL
+from app.services.amenities_service import haversine_many, nearest_order
+from app.services.executor import spawn
+from app.services.overpass_service import lookup
+from app.services.poi_service import fetch_nearest_pois
+
+# Common transit stop types in OSM (same group shape as AMENITY_TAG_MAP)
+TRANSIT_STOP_TAGS: list[list[str]] = [
+    ['"public_transport"="stop_position"'],
+    ['"public_transport"="platform"'],
+    ['"railway"="station"'],
+    ['"railway"="halt"'],
+    ['"railway"="tram_stop"'],
+    ['"highway"="bus_stop"'],
+    ['"amenity"="bus_station"'],
+    ['"amenity"="ferry_terminal"'],
+]
 
 
 def find_nearest_transit_stops(
@@ -20,79 +35,83 @@ def find_nearest_transit_stops(
     Find the nearest public transit stops (bus stops, train stations, tram stops)
     within *radius_m* of (lat, lng) using the Overpass API.
 
+    Answered from the local stop index when one has been built (see
+    stop_index.py), or by a k-nearest search of the POI index with
+    POI_SOURCE=index, without touching Overpass.
+
     Returns a list of dicts: {"name", "lat", "lng", "type", "distance_m"}.
     """
-    overpass_url = current_app.config["OVERPASS_BASE_URL"]
-
-    # Query for common transit stop types in OSM
-    query = f"""
-    [out:json][timeout:10];
-    (
-      node["public_transport"="stop_position"](around:{radius_m},{lat},{lng});
-      node["public_transport"="platform"](around:{radius_m},{lat},{lng});
-      node["railway"="station"](around:{radius_m},{lat},{lng});
-      node["railway"="halt"](around:{radius_m},{lat},{lng});
-      node["railway"="tram_stop"](around:{radius_m},{lat},{lng});
-      node["highway"="bus_stop"](around:{radius_m},{lat},{lng});
-      node["amenity"="bus_station"](around:{radius_m},{lat},{lng});
-      node["amenity"="ferry_terminal"](around:{radius_m},{lat},{lng});
-    );
-    out body;
-    """
+    from app.services.stop_index import get_stop_index
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        _throttle_overpass()
-        resp = requests.post(overpass_url, data={"data": query}, timeout=15)
-        if resp.status_code == 429:
-            wait = _OVERPASS_MIN_INTERVAL * (attempt + 2)
-            time.sleep(wait)
-            continue
-        resp.raise_for_status()
-        break
-    else:
-        resp.raise_for_status()
+    index = get_stop_index()
+    if index is not None:
+        return index.nearest(lat, lng, radius_m, limit)
+    return fetch_nearest_pois(
+        transit_stop_lookup(lat, lng, radius_m), limit,
+        lambda elements: transit_stop_results(lat, lng, elements, limit),
+    )
 
-    elements = resp.json().get("elements", [])
 
-    results = []
-    seen_coords = set()  # deduplicate stops at same location
-    for el in elements:
-        el_lat = el.get("lat")
-        el_lng = el.get("lon")
-        if el_lat is None or el_lng is None:
-            continue
-
-        # Deduplicate: many stops share the same physical location
-        coord_key = (round(el_lat, 5), round(el_lng, 5))
-        if coord_key in seen_coords:
-            continue
-        seen_coords.add(coord_key)
+def transit_stop_lookup(lat: float, lng: float, radius_m: int) -> dict:
+    """Overpass lookup (see overpass_service.lookup) for transit stops."""
+    return lookup(lat, lng, radius_m, TRANSIT_STOP_TAGS, element_types=("node",))
+
+
+def transit_stop_results(
+    lat: float, lng: float, elements: list[dict], limit: int = 5
+) -> list[dict]:
+    """Deduplicate and classify raw Overpass stop nodes, nearest first.
+
+    Only the nearest *limit* unique stops are classified and returned.
+    """
+    nodes = [el for el in elements if el.get("lat") is not None and el.get("lon") is not None]
+    if not nodes:
+        return []
+    lats = np.fromiter((el["lat"] for el in nodes), dtype=float, count=len(nodes))
+    lngs = np.fromiter((el["lon"] for el in nodes), dtype=float, count=len(nodes))
 
+    # Deduplicate: many stops share the same physical location (keep the first)
+    coord_keys = np.round(np.column_stack((lats, lngs)), 5)
+    _, first = np.unique(coord_keys, axis=0, return_index=True)
+    first.sort()
+
+    dists = np.round(haversine_many(lat, lng, lats[first], lngs[first]))
+    results = []
+    for j in nearest_order(dists, limit):
+        el = nodes[first[j]]
         tags = el.get("tags", {})
-        name = tags.get("name", "Unnamed stop")
-
-        # Determine stop type
-        if tags.get("railway") in ("station", "halt"):
-            stop_type = "train_station"
-        elif tags.get("railway") == "tram_stop":
-            stop_type = "tram_stop"
-        elif tags.get("amenity") == "ferry_terminal":
-            stop_type = "ferry_terminal"
-        else:
-            stop_type = "bus_stop"
-
-        dist = _haversine(lat, lng, el_lat, el_lng)
         results.append({
-            "name": name,
-            "lat": el_lat,
-            "lng": el_lng,
-            "type": stop_type,
-            "distance_m": round(dist, 0),
+            "name": tags.get("name", "Unnamed stop"),
+            "lat": el["lat"],
+            "lng": el["lon"],
+            "type": osm_stop_type(tags),
+            "distance_m": float(dists[j]),
         })
+    return results
+
+
+def osm_stop_type(tags: dict) -> str:
+    """Stop type of an OSM transit stop from its tags."""
+    if tags.get("railway") in ("station", "halt"):
+        return "train_station"
+    if tags.get("railway") == "tram_stop":
+        return "tram_stop"
+    if tags.get("amenity") == "ferry_terminal":
+        return "ferry_terminal"
+    return "bus_stop"
+
+
+def uses_stop_heuristic() -> bool:
+    """True when commutes fall through to the nearest-stop heuristic.
 
-    results.sort(key=lambda r: r["distance_m"])
-    return results[:limit]
+    That is, neither Google nor a local GTFS timetable is available, so
+    callers should prefetch transit stops for it.
+    """
+    from app.services.gtfs_router import get_timetable
+
+    if current_app.config.get("GOOGLE_MAPS_API_KEY", ""):
+        return False
+    return get_timetable() is None
 
 
 def get_commute_walk_legs(
@@ -101,13 +120,28 @@ def get_commute_walk_legs(
     work_lat: float,
     work_lng: float,
     transit_radius_m: int = 2000,
+    home_stops: list[dict] | None = None,
+    work_stops: list[dict] | None = None,
+    geometry: bool = True,
+    home_legs: dict[tuple[float, float], dict | None] | None = None,
+    departure: datetime | None = None,
 ) -> dict | None:
     """
     Compute the walking portions of a transit commute.
 
     If GOOGLE_MAPS_API_KEY is configured, uses the Google Routes API for
-    real transit routing (correct lines, schedules, transfers).
+    real transit routing (correct lines, schedules, transfers), then the
+    local GTFS timetable if one has been built (see gtfs_router.py).
     Otherwise falls back to the Overpass heuristic (nearest stops).
+    *home_stops* / *work_stops* are pre-fetched stop lists (see
+    find_nearest_transit_stops) for the heuristic; omitted ones are queried.
+    With ``geometry=False`` no leg geometry is requested from upstreams.
+    *home_legs* maps (lat, lng) → walking leg from home, already computed
+    by a one-to-many search (see get_walking_routes); the heuristic uses
+    them for the direct walk and, without geometry, the walk to the stop.
+    *departure* (timezone-aware) is passed to the itinerary planners
+    (Google: default now; GTFS: default the next weekday morning); the
+    heuristic ignores it.
 
     Returns dict with:
         mode: "direct_walk" | "transit"
@@ -115,14 +149,17 @@ def get_commute_walk_legs(
         transit_to_work: {stop_name, stop_type, distance_km, duration_min, geometry} | None
         total_walk_min: float   (one-way total for the walking portions)
         total_walk_km: float
-        source: "google_routes_api" | "overpass_heuristic"
+        source: "google_routes_api" | "gtfs_raptor" | "overpass_heuristic"
     """
     # ── Try Google Routes API first ──────────────────────────────────
     google_key = current_app.config.get("GOOGLE_MAPS_API_KEY", "")
     if google_key:
         try:
             from app.services.google_transit_service import get_transit_route
-            result = get_transit_route(home_lat, home_lng, work_lat, work_lng)
+            result = get_transit_route(
+                home_lat, home_lng, work_lat, work_lng, geometry=geometry,
+                departure=departure,
+            )
             if result is not None:
                 return result
         except Exception as exc:
@@ -130,9 +167,26 @@ def get_commute_walk_legs(
                 "Google Routes API failed, falling back to Overpass: %s", exc
             )
 
+    # ── Then the local GTFS timetable, if built ──────────────────────
+    from app.services.gtfs_router import get_timetable, plan_commute
+    if get_timetable() is not None:
+        try:
+            result = plan_commute(
+                home_lat, home_lng, work_lat, work_lng, geometry=geometry,
+                departure=departure,
+            )
+            if result is not None:
+                return result
+        except Exception as exc:
+            current_app.logger.warning(
+                "GTFS routing failed, falling back to Overpass: %s", exc
+            )
+
     # ── Fallback: Overpass heuristic ─────────────────────────────────
     return _overpass_commute_walk_legs(
-        home_lat, home_lng, work_lat, work_lng, transit_radius_m
+        home_lat, home_lng, work_lat, work_lng, transit_radius_m,
+        home_stops=home_stops, work_stops=work_stops, geometry=geometry,
+        home_legs=home_legs,
     )
 
 
@@ -142,6 +196,10 @@ def _overpass_commute_walk_legs(
     work_lat: float,
     work_lng: float,
     transit_radius_m: int = 2000,
+    home_stops: list[dict] | None = None,
+    work_stops: list[dict] | None = None,
+    geometry: bool = True,
+    home_legs: dict[tuple[float, float], dict | None] | None = None,
 ) -> dict | None:
     """
     Original Overpass-based heuristic: find nearest transit stop to home
@@ -149,15 +207,33 @@ def _overpass_commute_walk_legs(
     """
     from app.services.routing_service import get_walking_route
 
-    # 1. Get the direct walk for comparison
-    direct = get_walking_route(home_lat, home_lng, work_lat, work_lng)
+    home_legs = home_legs or {}
+
+    # 1. Direct walk for comparison and 2. nearest transit stops to home
+    #    and work — independent, so run them concurrently
+    #    (only the direct walk's totals are used, so skip its geometry)
+    direct_task = None
+    if (work_lat, work_lng) not in home_legs:
+        direct_task = spawn(
+            get_walking_route, home_lat, home_lng, work_lat, work_lng, geometry=False
+        )
+    home_task = work_task = None
+    if home_stops is None:
+        home_task = spawn(find_nearest_transit_stops, home_lat, home_lng, transit_radius_m)
+    if work_stops is None:
+        work_task = spawn(find_nearest_transit_stops, work_lat, work_lng, transit_radius_m)
+
+    if direct_task is not None:
+        direct = direct_task.result()
+    else:
+        direct = home_legs[(work_lat, work_lng)]
+    if home_task is not None:
+        home_stops = home_task.result()
+    if work_task is not None:
+        work_stops = work_task.result()
     if direct is None:
         return None
 
-    # 2. Find nearest transit stops to home and work
-    home_stops = find_nearest_transit_stops(home_lat, home_lng, transit_radius_m)
-    work_stops = find_nearest_transit_stops(work_lat, work_lng, transit_radius_m)
-
     if not home_stops or not work_stops:
         # No transit available — fall back to direct walk
         return {
@@ -171,13 +247,22 @@ def _overpass_commute_walk_legs(
             "source": "overpass_heuristic",
         }
 
-    # 3. Walk from home to nearest transit stop
+    # 3. Walk from home to nearest transit stop and
+    # 4. walk from nearest transit stop to work (concurrently)
     home_stop = home_stops[0]
-    leg1 = get_walking_route(home_lat, home_lng, home_stop["lat"], home_stop["lng"])
-
-    # 4. Walk from nearest transit stop to work
     work_stop = work_stops[0]
-    leg2 = get_walking_route(work_stop["lat"], work_stop["lng"], work_lat, work_lng)
+    leg2_task = spawn(
+        get_walking_route, work_stop["lat"], work_stop["lng"], work_lat, work_lng,
+        geometry=geometry,
+    )
+    stop_key = (home_stop["lat"], home_stop["lng"])
+    if not geometry and stop_key in home_legs:
+        leg1 = home_legs[stop_key]
+    else:
+        leg1 = get_walking_route(
+            home_lat, home_lng, home_stop["lat"], home_stop["lng"], geometry=geometry
+        )
+    leg2 = leg2_task.result()
 
     if leg1 is None or leg2 is None:
         return {
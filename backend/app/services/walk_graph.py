@@ -0,0 +1,541 @@
+"""Local pedestrian router — walking routes on a graph built from an OSM extract.
+
+``flask build-walk-graph <extract>`` reads an Overpass JSON dump (ways with
+``nodes`` plus their nodes, e.g. ``way[highway](bbox);(._;>;);out;``) or an
+``.osm.pbf`` file (needs pyosmium), keeps every way a pedestrian may use,
+and writes a compressed-sparse-row graph to WALK_GRAPH_PATH. When that file
+exists, get_walking_route answers from it first: real footpath distances,
+no quota and no network round-trip.
+
+Layout (numpy arrays in one .npz):
+    lat, lng           node coordinates, nodes sorted by grid cell
+    cell_keys/start    slice of nodes per grid cell (grid.py), for snapping
+    offsets            CSR row pointers: edges of node v are
+    targets, weights   targets[offsets[v]:offsets[v + 1]] (metres, float32)
+    landmarks          optional (L × nodes) float32 distances from L
+                       landmark nodes (-1 = unreachable), see below
+
+Queries are A* with the straight-line distance as heuristic. With
+landmarks (``--landmarks N``, ALT preprocessing) the heuristic is also
+bounded by |d(L, target) − d(L, node)|, which is much tighter along
+winding streets, so far fewer nodes are expanded. Landmarks are spread
+over the largest connected component; nodes outside it (disconnected
+fragments) fall back to the straight-line bound.
+"""
+
+import heapq
+import math
+import os
+import threading
+
+import numpy as np
+from flask import current_app
+
+from app.services import grid
+from app.services.amenities_service import _haversine
+
+_FORMAT_VERSION = 2
+_CELL_DEG = 0.002           # ≈ 220 m north-south
+
+# highway=* values a pedestrian may use unless tagged foot=no
+_WALKABLE_HIGHWAYS = frozenset({
+    "footway", "path", "pedestrian", "steps", "corridor", "crossing",
+    "living_street", "residential", "service", "unclassified", "road", "track",
+    "tertiary", "tertiary_link", "secondary", "secondary_link",
+    "primary", "primary_link", "cycleway", "bridleway",
+})
+_FOOT_ALLOWED = frozenset({"yes", "designated", "permissive"})
+
+
+def is_walkable(tags: dict) -> bool:
+    """True if a way with *tags* can be walked."""
+    highway = tags.get("highway")
+    if highway is None:
+        return False
+    foot = tags.get("foot")
+    if foot in ("no", "private"):
+        return False
+    if tags.get("access") in ("no", "private") and foot not in _FOOT_ALLOWED:
+        return False
+    return highway in _WALKABLE_HIGHWAYS or foot in _FOOT_ALLOWED
+
+
+def _pair_haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise haversine distance (metres) between coordinate arrays."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 6_371_000 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class WalkGraph:
+    """CSR pedestrian graph (see module docstring)."""
+
+    def __init__(self, data: dict):
+        self.lat: np.ndarray = np.ascontiguousarray(data["lat"])
+        self.lng: np.ndarray = np.ascontiguousarray(data["lng"])
+        self.cell_keys: np.ndarray = data["cell_keys"]
+        self.cell_start: np.ndarray = data["cell_start"]
+        self.offsets: np.ndarray = data["offsets"]
+        self.targets: np.ndarray = data["targets"]
+        self.weights: np.ndarray = data["weights"]
+        self.landmarks: np.ndarray = data["landmarks"]
+        # Memoryviews over the arrays: element reads in the search loops
+        # return Python scalars (fast) without copying the graph into lists
+        self._lat = memoryview(self.lat)
+        self._lng = memoryview(self.lng)
+        self._offsets = memoryview(self.offsets)
+        self._targets = memoryview(self.targets)
+        self._weights = memoryview(self.weights)
+        self._landmarks = [memoryview(row) for row in self.landmarks]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ── Building / persistence ──────────────────────────────────────
+
+    @classmethod
+    def build(
+        cls,
+        nodes: dict[int, tuple[float, float]],
+        ways: list[list[int]],
+        landmarks: int = 0,
+    ) -> "WalkGraph":
+        """Graph of walkable *ways* (OSM node id lists) over *nodes* (id → lat, lng).
+
+        Every consecutive node pair becomes an edge in both directions.
+        """
+        src_ids, dst_ids = [], []
+        for refs in ways:
+            refs = [r for r in refs if r in nodes]
+            src_ids.extend(refs[:-1])
+            dst_ids.extend(refs[1:])
+        if not src_ids:
+            raise ValueError("No walkable ways found in the extract")
+
+        # Keep only nodes on some edge, ordered by grid cell for snapping
+        used = np.unique(np.array(src_ids + dst_ids, dtype=np.int64))
+        coords = np.array([nodes[i] for i in used.tolist()], dtype=np.float64)
+        keys = grid.cell_keys(coords[:, 0], coords[:, 1], _CELL_DEG)
+        order = np.argsort(keys, kind="stable")
+        # rank[k] = new position of the k-th smallest OSM id
+        rank = np.empty(len(used), dtype=np.int64)
+        rank[order] = np.arange(len(used))
+
+        def index_of(ids: list[int]) -> np.ndarray:
+            return rank[np.searchsorted(used, np.array(ids, dtype=np.int64))]
+
+        coords, keys = coords[order], keys[order]
+
+        a, b = index_of(src_ids), index_of(dst_ids)
+        keep = a != b
+        src = np.concatenate((a[keep], b[keep]))
+        dst = np.concatenate((b[keep], a[keep]))
+        lat, lng = coords[:, 0], coords[:, 1]
+        weight = _pair_haversine(lat[src], lng[src], lat[dst], lng[dst]).astype(np.float32)
+
+        by_src = np.argsort(src, kind="stable")
+        offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(used)), out=offsets[1:])
+        cell_keys, cell_start = np.unique(keys, return_index=True)
+
+        data = {
+            "lat": lat,
+            "lng": lng,
+            "cell_keys": cell_keys,
+            "cell_start": np.append(cell_start, len(used)).astype(np.int64),
+            "offsets": offsets,
+            "targets": dst[by_src].astype(np.int32),
+            "weights": weight[by_src],
+            "landmarks": np.empty((0, len(used)), dtype=np.float32),
+        }
+        if landmarks:
+            data["landmarks"] = cls(data)._landmark_distances(landmarks)
+        return cls(data)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            version=np.array(_FORMAT_VERSION),
+            lat=self.lat,
+            lng=self.lng,
+            cell_keys=self.cell_keys,
+            cell_start=self.cell_start,
+            offsets=self.offsets,
+            targets=self.targets,
+            weights=self.weights,
+            landmarks=self.landmarks,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "WalkGraph":
+        with np.load(path, allow_pickle=False) as f:
+            data = {k: f[k] for k in f.files}
+        if int(data.pop("version")) != _FORMAT_VERSION:
+            raise ValueError(f"{path} was built by an incompatible version; rebuild it")
+        return cls(data)
+
+    # ── Preprocessing ───────────────────────────────────────────────
+
+    def components(self) -> np.ndarray:
+        """Connected-component label of every node (edges run both ways)."""
+        offsets, targets = self._offsets, self._targets
+        labels = [-1] * len(self)
+        label = 0
+        for seed in range(len(self)):
+            if labels[seed] >= 0:
+                continue
+            labels[seed] = label
+            stack = [seed]
+            while stack:
+                v = stack.pop()
+                for e in range(offsets[v], offsets[v + 1]):
+                    u = targets[e]
+                    if labels[u] < 0:
+                        labels[u] = label
+                        stack.append(u)
+            label += 1
+        return np.array(labels, dtype=np.int32)
+
+    def _landmark_distances(self, count: int) -> np.ndarray:
+        """Distances from *count* landmarks picked by farthest-point selection.
+
+        Landmarks lie in the largest connected component: the first is the
+        node farthest from one of its nodes, each next one the node farthest
+        from all landmarks so far.
+        """
+        table = np.full((count, len(self)), -1.0, dtype=np.float32)
+        labels = self.components()
+        seed = int(np.argmax(labels == np.argmax(np.bincount(labels))))
+        dist = self.distances_from(seed)
+        nearest_lm = np.where(np.isfinite(dist), np.inf, -np.inf)
+        start = int(np.argmax(np.where(np.isfinite(dist), dist, -1)))
+        for j in range(count):
+            dist = self.distances_from(start)
+            table[j] = np.where(np.isfinite(dist), dist, -1)
+            nearest_lm = np.minimum(nearest_lm, dist)
+            start = int(np.argmax(nearest_lm))
+        return table
+
+    def landmark_coverage(self) -> float:
+        """Share of nodes reached by the landmarks (0 without landmarks)."""
+        if not len(self.landmarks):
+            return 0.0
+        return float(np.mean((self.landmarks >= 0).any(axis=0)))
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    def snap(self, lat: float, lng: float, max_m: float) -> tuple[int, float] | None:
+        """(nearest node, distance_m) within *max_m* of (lat, lng), or None."""
+        nodes = grid.items_near(self.cell_keys, self.cell_start, lat, lng, max_m, _CELL_DEG)
+        if not len(nodes):
+            return None
+        dists = _pair_haversine(lat, lng, self.lat[nodes], self.lng[nodes])
+        j = int(np.argmin(dists))
+        if dists[j] > max_m:
+            return None
+        return int(nodes[j]), float(dists[j])
+
+    def shortest_path(
+        self, source: int, target: int, max_m: float = math.inf
+    ) -> tuple[float, list[int]] | None:
+        """(metres, node path) from *source* to *target* by A*, or None.
+
+        Gives up once every remaining path would be longer than *max_m*.
+        """
+        offsets, targets, weights = self._offsets, self._targets, self._weights
+        lat, lng = self._lat, self._lng
+        t_lat, t_lng = lat[target], lng[target]
+        # (distances from landmark L, d(L, target)) for landmarks reaching target
+        landmarks = [(lm, lm[target]) for lm in self._landmarks if lm[target] >= 0]
+
+        def heuristic(v: int) -> float:
+            h = _haversine(lat[v], lng[v], t_lat, t_lng)
+            for lm, to_target in landmarks:
+                d = lm[v]
+                if d >= 0 and abs(to_target - d) > h:
+                    h = abs(to_target - d)
+            return h
+
+        dist = {source: 0.0}
+        prev = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            f, d, v = heapq.heappop(heap)
+            if v == target:
+                break
+            if f > max_m:
+                return None
+            if d > dist[v]:
+                continue
+            for e in range(offsets[v], offsets[v + 1]):
+                u = targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(u, math.inf):
+                    dist[u] = nd
+                    prev[u] = v
+                    heapq.heappush(heap, (nd + heuristic(u), nd, u))
+        else:
+            return None
+        return dist[target], _trace(prev, target)
+
+    def one_to_many(
+        self, source: int, targets: list[int], max_m: float = math.inf
+    ) -> tuple[dict[int, float], dict[int, int]]:
+        """Dijkstra from *source* that stops once every target is settled.
+
+        Returns (metres to each reached target, predecessor map for
+        _trace); targets farther than *max_m* or unreachable are left out.
+        """
+        offsets, edge_targets, weights = self._offsets, self._targets, self._weights
+        remaining = set(targets)
+        dist = {source: 0.0}
+        prev = {source: -1}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            d, v = heapq.heappop(heap)
+            if d > max_m:
+                break
+            if d > dist[v]:
+                continue
+            remaining.discard(v)
+            for e in range(offsets[v], offsets[v + 1]):
+                u = edge_targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(u, math.inf):
+                    dist[u] = nd
+                    prev[u] = v
+                    heapq.heappush(heap, (nd, u))
+        reached = {t: dist[t] for t in targets if t in dist and t not in remaining}
+        return reached, prev
+
+    def distances_from(self, source: int) -> np.ndarray:
+        """Dijkstra distances (metres) from *source* to every node (inf = unreachable)."""
+        offsets, targets, weights = self._offsets, self._targets, self._weights
+        dist = [math.inf] * len(self)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            for e in range(offsets[v], offsets[v + 1]):
+                u = targets[e]
+                nd = d + weights[e]
+                if nd < dist[u]:
+                    dist[u] = nd
+                    heapq.heappush(heap, (nd, u))
+        return np.array(dist)
+
+    def nearest_sources(
+        self, seeds: list[tuple[int, float]], max_m: float = math.inf
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Multi-source Dijkstra from (node, metres already walked) *seeds*.
+
+        Returns, per node, the metres to the nearest seed (inf beyond *max_m*
+        or unreachable) and that seed's position in *seeds* (-1 = none).
+        """
+        offsets, targets, weights = self._offsets, self._targets, self._weights
+        dist = [math.inf] * len(self)
+        nearest = [-1] * len(self)
+        for j, (node, offset_m) in enumerate(seeds):
+            if offset_m < dist[node]:
+                dist[node] = offset_m
+                nearest[node] = j
+        heap = [(dist[node], node) for node, _ in seeds if nearest[node] >= 0]
+        heapq.heapify(heap)
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            for e in range(offsets[v], offsets[v + 1]):
+                u = targets[e]
+                nd = d + weights[e]
+                if nd < dist[u] and nd <= max_m:
+                    dist[u] = nd
+                    nearest[u] = nearest[v]
+                    heapq.heappush(heap, (nd, u))
+        return np.array(dist), np.array(nearest, dtype=np.int32)
+
+    def route(
+        self,
+        origin_lat: float,
+        origin_lng: float,
+        dest_lat: float,
+        dest_lng: float,
+        geometry: bool = True,
+    ) -> dict | None:
+        """get_walking_route-shaped result, or None if not covered / not connected.
+
+        Both points are snapped to the nearest graph node within
+        WALK_GRAPH_SNAP_M; the straight walk to and from those nodes counts.
+        Paths longer than WALK_GRAPH_MAX_DETOUR × the straight-line distance
+        are not searched for.
+        """
+        snap_m = current_app.config["WALK_GRAPH_SNAP_M"]
+        start = self.snap(origin_lat, origin_lng, snap_m)
+        end = self.snap(dest_lat, dest_lng, snap_m)
+        if start is None or end is None:
+            return None
+        found = self.shortest_path(
+            start[0], end[0], _max_walk_m(origin_lat, origin_lng, [(dest_lat, dest_lng)])
+        )
+        if found is None:
+            return None
+        path_m, path = found
+        return self._result(
+            (origin_lat, origin_lng), (dest_lat, dest_lng),
+            start[1] + path_m + end[1], path if geometry else None,
+        )
+
+    def routes(
+        self,
+        origin_lat: float,
+        origin_lng: float,
+        destinations: list[tuple[float, float]],
+        geometry: bool = False,
+    ) -> list[dict | None]:
+        """route() to every destination with one one_to_many search.
+
+        None where a destination is not covered or not connected.
+        """
+        snap_m = current_app.config["WALK_GRAPH_SNAP_M"]
+        start = self.snap(origin_lat, origin_lng, snap_m)
+        if start is None or not destinations:
+            return [None] * len(destinations)
+        ends = [self.snap(lat, lng, snap_m) for lat, lng in destinations]
+        reached, prev = self.one_to_many(
+            start[0],
+            list({end[0] for end in ends if end is not None}),
+            _max_walk_m(origin_lat, origin_lng, destinations),
+        )
+
+        out = []
+        for dest, end in zip(destinations, ends):
+            if end is None or end[0] not in reached:
+                out.append(None)
+                continue
+            path = _trace(prev, end[0]) if geometry else None
+            out.append(self._result(
+                (origin_lat, origin_lng), dest, start[1] + reached[end[0]] + end[1], path
+            ))
+        return out
+
+    def _result(
+        self,
+        origin: tuple[float, float],
+        dest: tuple[float, float],
+        distance_m: float,
+        path: list[int] | None,
+    ) -> dict:
+        distance_km = distance_m / 1000
+        walk_speed = current_app.config.get("WALKING_SPEED_KMH", 5.0)
+        result = {
+            "distance_km": round(distance_km, 2),
+            "duration_min": round((distance_km / walk_speed) * 60, 1),
+            "source": "local_graph",
+        }
+        if path is not None:
+            result["geometry"] = (
+                [list(origin)]
+                + [[self._lat[v], self._lng[v]] for v in path]
+                + [list(dest)]
+            )
+        return result
+
+
+def _trace(prev: dict[int, int], target: int) -> list[int]:
+    """Node path ending at *target* from a predecessor map."""
+    path = [target]
+    while prev[path[-1]] != -1:
+        path.append(prev[path[-1]])
+    path.reverse()
+    return path
+
+
+def _max_walk_m(lat: float, lng: float, destinations: list[tuple[float, float]]) -> float:
+    """Search bound: WALK_GRAPH_MAX_DETOUR × the farthest straight-line distance."""
+    cfg = current_app.config
+    farthest = max(_haversine(lat, lng, d_lat, d_lng) for d_lat, d_lng in destinations)
+    return cfg["WALK_GRAPH_MAX_DETOUR"] * (farthest + 2 * cfg["WALK_GRAPH_SNAP_M"])
+
+
+# ── Process-wide graph ───────────────────────────────────────────────
+
+_graph: WalkGraph | None = None
+_graph_mtime: float | None = None
+_graph_lock = threading.Lock()
+
+
+def get_walk_graph() -> WalkGraph | None:
+    """The graph at WALK_GRAPH_PATH (reloaded when the file changes), or None."""
+    global _graph, _graph_mtime
+    path = current_app.config["WALK_GRAPH_PATH"]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _graph_lock:
+        if _graph is None or mtime != _graph_mtime:
+            _graph = WalkGraph.load(path)
+            _graph_mtime = mtime
+        return _graph
+
+
+# ── Ingestion ────────────────────────────────────────────────────────
+
+
+def read_overpass_ways(path: str) -> tuple[dict[int, tuple[float, float]], list[list[int]]]:
+    """(nodes, walkable way node lists) from an Overpass JSON dump."""
+    import json
+
+    with open(path, encoding="utf-8") as f:
+        elements = json.load(f).get("elements", [])
+
+    nodes = {el["id"]: (el["lat"], el["lon"]) for el in elements
+             if el.get("type") == "node" and "lat" in el}
+    ways = [el["nodes"] for el in elements
+            if el.get("type") == "way" and el.get("nodes") and is_walkable(el.get("tags", {}))]
+    return nodes, ways
+
+
+def read_pbf_ways(path: str) -> tuple[dict[int, tuple[float, float]], list[list[int]]]:
+    """(nodes, walkable way node lists) from an .osm.pbf extract."""
+    try:
+        import osmium
+    except ImportError as exc:
+        raise RuntimeError(
+            "Reading .pbf extracts requires pyosmium (pip install osmium)"
+        ) from exc
+
+    nodes: dict[int, tuple[float, float]] = {}
+    ways: list[list[int]] = []
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, w):
+            if not is_walkable(dict(w.tags)):
+                return
+            refs = []
+            for n in w.nodes:
+                if n.location.valid():
+                    nodes[n.ref] = (n.lat, n.lon)
+                    refs.append(n.ref)
+            ways.append(refs)
+
+    Handler().apply_file(path, locations=True)
+    return nodes, ways
+
+
+def build_walk_graph(source: str, output: str, landmarks: int = 0) -> WalkGraph:
+    """Read *source* (.json Overpass dump or .pbf) and write the graph to *output*."""
+    if source.endswith(".pbf"):
+        nodes, ways = read_pbf_ways(source)
+    else:
+        nodes, ways = read_overpass_ways(source)
+    graph = WalkGraph.build(nodes, ways, landmarks=landmarks)
+    graph.save(output)
+    return graph
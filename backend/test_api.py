@@ -59,6 +59,7 @@ print()
 # 1. Health check
 print(f"{YELLOW}--- Health ---{RESET}")
 test("Health check", "GET", "/api/health")
+test("Metrics (Prometheus text)", "GET", "/api/metrics")
 
 # 2. Geocoding
 time.sleep(1)
@@ -91,6 +92,27 @@ test(
         "destination": {"lat": 41.8240, "lng": -71.4128},
     },
 )
+test(
+    "Walk route (encoded polyline, zoom 15)",
+    "POST", "/api/route/walk",
+    {
+        "origin": {"lat": 41.8268, "lng": -71.4029},
+        "destination": {"lat": 41.8240, "lng": -71.4128},
+        "geometry_format": "polyline",
+        "zoom": 15,
+    },
+)
+test(
+    "Walk routes to many destinations (one search)",
+    "POST", "/api/route/many",
+    {
+        "origin": {"lat": 41.8268, "lng": -71.4029},
+        "destinations": [
+            {"lat": 41.8240, "lng": -71.4128},
+            {"lat": 41.8300, "lng": -71.4000},
+        ],
+    },
+)
 test(
     "Walk route (missing fields → 400)",
     "POST", "/api/route/walk",
@@ -98,6 +120,17 @@ test(
     expect_status=400,
 )
 
+test(
+    "Walk isochrone (15 min, classify gyms)",
+    "POST", "/api/route/isochrone",
+    {
+        "origin": {"lat": 41.8268, "lng": -71.4029},
+        "minutes": 15,
+        "amenity_type": "gym",
+        "geometry_format": "polyline",
+    },
+)
+
 time.sleep(3)
 print(f"{YELLOW}--- Transit / Commute ---{RESET}")
 test(
@@ -115,6 +148,26 @@ test(
     },
 )
 
+test(
+    "Commute walk legs (fixed departure time)",
+    "POST", "/api/route/commute",
+    {
+        "origin": {"lat": 41.8268, "lng": -71.4029},
+        "destination": {"lat": 41.8240, "lng": -71.4128},
+        "departure_time": "2026-10-19T08:30:00-04:00",
+    },
+)
+test(
+    "Commute walk legs (departure without UTC offset → 400)",
+    "POST", "/api/route/commute",
+    {
+        "origin": {"lat": 41.8268, "lng": -71.4029},
+        "destination": {"lat": 41.8240, "lng": -71.4128},
+        "departure_time": "2026-10-19T08:30:00",
+    },
+    expect_status=400,
+)
+
 # 4. Amenities — add delays to avoid Overpass 429 rate limits
 time.sleep(2)
 print(f"{YELLOW}--- Amenities ---{RESET}")
@@ -184,6 +237,38 @@ test(
         "amenities": [],
     },
 )
+test(
+    "Score (totals only, no geometry)",
+    "POST", "/api/score/calculate",
+    {
+        "home": {"lat": 41.8268, "lng": -71.4029},
+        "work": {"lat": 41.8240, "lng": -71.4128},
+        "amenities": [{"amenity_type": "gym", "visits_per_week": 4}],
+        "include_geometry": False,
+        "fields": ["total_weekly_walk_min", "grade", "breakdown.label"],
+    },
+)
+test(
+    "Score stream (NDJSON events)",
+    "POST", "/api/score/stream",
+    {
+        "home": {"lat": 41.8268, "lng": -71.4029},
+        "work": {"lat": 41.8240, "lng": -71.4128},
+        "amenities": [{"amenity_type": "gym", "visits_per_week": 4}],
+    },
+)
+test(
+    "Score batch (two homes, one invalid)",
+    "POST", "/api/score/batch",
+    {
+        "homes": [
+            {"id": "a", "lat": 41.8268, "lng": -71.4029},
+            {"id": "b", "lat": "not a number"},
+        ],
+        "work": {"lat": 41.8240, "lng": -71.4128},
+        "amenities": [{"amenity_type": "gym", "visits_per_week": 4}],
+    },
+)
 test(
     "Score (missing home → 400)",
     "POST", "/api/score/calculate",